@@ -0,0 +1,282 @@
+"""
+asyncio interface to a servo bus.
+
+`AsyncServoProtocol` runs the methods of a `ServoProtocol` on one dedicated
+thread and awaits their results, so no coroutine ever blocks the event loop
+on a round trip::
+
+    async with AsyncServoProtocol(backend='serial') as asp:
+        servo = AsyncServo(asp, 1)
+        await servo.write('goal_position', 512)
+        position = await servo.read('present_position')
+
+The calls of every coroutine reach the bus in the order they were made, and
+run at the priority class the event loop's thread has on the bus, see
+`ServoProtocol.priority`. Backends that never wait on a device, such as
+'loopback', are called inline.
+
+Requires Python 3.5 or newer.
+"""
+import asyncio
+import logging
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from .clock import VirtualClock
+from .servode import (
+    AX_12_TYPE, BAUDRATE_PERM, DEVICENAME, PROTOCOL_V, ServoGroup,
+    ServoProtocol
+)
+
+log = logging.getLogger('servode')
+
+
+async def _sleep(clock, seconds):
+    if isinstance(clock, VirtualClock):
+        clock.sleep(seconds)
+        await asyncio.sleep(0)
+    else:
+        await asyncio.sleep(seconds)
+
+
+class AsyncServoProtocol(object):
+    """
+    An asyncio ServoProtocol. Every method runs the `ServoProtocol` method of
+    the same name on the bus thread and awaits it.
+    """
+
+    def __init__(self, baud_rate=BAUDRATE_PERM,
+                 manufacturer=ServoProtocol.ROBOTIS, servo_type=AX_12_TYPE,
+                 protocol_version=PROTOCOL_V, device=DEVICENAME,
+                 backend=None, clock=None, cache=None, shadow=None,
+                 **backend_options):
+        """
+        The arguments are those of `ServoProtocol`.
+        """
+        super(AsyncServoProtocol, self).__init__()
+        self.sp = ServoProtocol(
+            baud_rate=baud_rate, manufacturer=manufacturer,
+            servo_type=servo_type, protocol_version=protocol_version,
+            device=device, backend=backend, clock=clock, cache=cache,
+            shadow=shadow, **backend_options)
+        self.baud_rate = baud_rate
+        self.servo_type = servo_type
+        self.registers = self.sp.registers
+        self.clock = self.sp.clock
+        self.backend = self.sp.backend
+        self._executor = None
+        self._open = False
+        self._pending = 0
+
+    async def __aenter__(self):
+        if self.backend.blocking:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._open = True
+        try:
+            await self._call(self.sp.__enter__)
+        except Exception:
+            self._shutdown()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # the calls already submitted run first
+        try:
+            await self._call(
+                self.sp.__exit__, exc_type, exc_value, traceback)
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        self._open = False
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _call(self, method, *args):
+        """
+        Run `method(*args)` on the bus thread, or inline for a backend that
+        does not block.
+
+        :return: its result
+        """
+        if not self._open:
+            raise IOError("AsyncServoProtocol used outside 'async with'")
+        if self._executor is None:
+            return method(*args)
+        self._pending += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                self._executor, self.sp.bind_priority(method), *args)
+        finally:
+            self._pending -= 1
+
+    @property
+    def pending(self):
+        """
+        The number of calls submitted to the bus thread and not yet done.
+        """
+        return self._pending
+
+    async def ping(self, servo):
+        """
+        :return: the model number of the servo, 0 if it did not answer
+        """
+        return await self._call(self.sp.ping, servo)
+
+    async def factory_reset(self, servo):
+        await self._call(self.sp.factory_reset, servo)
+
+    async def read_register(self, servo, register, max_age=None):
+        """
+        :return: a dict in the `ServoProtocol.read_register` format
+        """
+        return await self._call(
+            self.sp.read_register, servo, register, max_age)
+
+    async def read_registers(self, servo, registers, max_age=None):
+        """
+        :return: a dict in the `ServoProtocol.read_registers` format
+        """
+        return await self._call(
+            self.sp.read_registers, servo, registers, max_age)
+
+    async def write_register(self, servo, register, value, force=False):
+        """
+        :return: a dict in the `ServoProtocol.write_register` format
+        """
+        return await self._call(
+            self.sp.write_register, servo, register, value, force)
+
+    async def sync_write(self, register, value, servo_list=None,
+                         force=False):
+        """
+        Write a register on many servos in one SYNC_WRITE, see
+        `ServoProtocol.sync_write`.
+
+        :return: True if the instruction was sent, False if not
+        """
+        return await self._call(
+            self.sp.sync_write, register, value, servo_list, force)
+
+    async def bulk_read(self, read_blocks):
+        """
+        Read registers from many servos, see `ServoProtocol.bulk_read`.
+
+        :param read_blocks: blocks in the `ServoProtocol.bulk_read` format
+        :return: a dict in the `ServoProtocol.bulk_read` format
+        """
+        return await self._call(self.sp.bulk_read, read_blocks)
+
+
+class AsyncServo(object):
+    """
+    A Servo on an AsyncServoProtocol.
+    """
+
+    def __init__(self, asp, servo_id=1):
+        super(AsyncServo, self).__init__()
+        self.asp = asp
+        self.servo_id = servo_id
+
+    def __repr__(self):
+        return "AsyncServo(servo_id={0})".format(self.servo_id)
+
+    async def ping(self):
+        return await self.asp.ping(self.servo_id)
+
+    async def read(self, register, max_age=None):
+        result = await self.asp.read_register(
+            self.servo_id, register, max_age)
+        return result['value']
+
+    async def write(self, register, value, force=False):
+        return await self.asp.write_register(
+            self.servo_id, register, value, force)
+
+    async def new_id(self, new_id):
+        if (0 <= new_id <= 252) is False:
+            raise ValueError("Invalid new_id value:{0}".format(new_id))
+        await self.asp.write_register(self.servo_id, "ID", new_id)
+        self.asp.sp.invalidate(self.servo_id)
+        self.asp.sp.invalidate(new_id)
+        self.servo_id = new_id
+
+
+class AsyncServoGroup(object):
+    """
+    A group of AsyncServos, kept in order like a ServoGroup, whose bus
+    operations are awaited.
+    """
+    POSITION_MARGIN = ServoGroup.POSITION_MARGIN
+
+    def __init__(self):
+        super(AsyncServoGroup, self).__init__()
+        self.servos = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.servos)
+
+    def __getitem__(self, name):
+        return self.servos[name]
+
+    def __setitem__(self, key, val):
+        self.servos[key] = val
+
+    def __iter__(self):
+        return iter(self.servos)
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, self.servos)
+
+    def _get_sp(self):
+        for key in self.servos:
+            return self.servos[key].asp
+        return None
+
+    @property
+    def servo_ids(self):
+        return [servo.servo_id for servo in self.servos.values()]
+
+    async def write(self, register, value, force=False):
+        return await self._get_sp().sync_write(
+            register, value, self.servo_ids, force)
+
+    async def write_values(self, register, values, force=False):
+        """
+        Write one value per servo, in group order, with one SYNC_WRITE.
+        """
+        if len(values) != len(self):
+            raise ValueError(
+                "[AsyncServoGroup.write_values] {0} values for {1} "
+                "servos".format(len(values), len(self)))
+        return await self._get_sp().sync_write(
+            register, list(values), self.servo_ids, force)
+
+    async def read(self, register):
+        """
+        :return: the list of values of `register`, in group order
+        """
+        response = await self._get_sp().bulk_read({"blocks": [
+            {"servo_id": sid, "register": register}
+            for sid in self.servo_ids
+        ]})
+        return [block['value'] for block in response['blocks']]
+
+    async def goal_position(self, goal_positions, block=False,
+                            margin=POSITION_MARGIN, interval=0.05):
+        """
+        Write the goal positions and, with `block`, wait until every servo
+        is within `margin` of its goal, checking every `interval` seconds.
+        Wrap in `asyncio.wait_for` to bound the wait.
+        """
+        await self.write_values('goal_position', goal_positions)
+        if not block:
+            return
+        asp = self._get_sp()
+        while True:
+            positions = await self.read('present_position')
+            if all(pos is not None and abs(pos - goal) < margin
+                   for pos, goal in zip(positions, goal_positions)):
+                return
+            await _sleep(asp.clock, interval)
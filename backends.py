@@ -0,0 +1,621 @@
+"""
+Bus backends used by ServoProtocol.
+
+A backend moves bytes between ServoProtocol and a servo bus. Backends are
+registered by name and selected with the ``backend`` argument of
+ServoProtocol or the ``SERVODE_BACKEND`` environment variable. The ROBOTIS
+SDK is only imported when the 'robotis' backend is created. The 'emulator'
+backend drives a bus of virtual AX-12 servos, see `emulator`.
+
+Every transaction returns a `packet.Status`.
+"""
+import os
+import logging
+import functools
+
+from .packet import (
+    BROADCAST_ID, COMM_NOT_AVAILABLE, COMM_RX_TIMEOUT, COMM_SUCCESS,
+    MAX_PARAMS, PacketCodec, Status, SyncWritePacket, comm_status,
+    pack_value
+)
+
+log = logging.getLogger('servode')
+
+BACKEND_ENV = 'SERVODE_BACKEND'
+DEFAULT_BACKEND = 'robotis'
+
+# the address space of a Protocol 1.0 control table
+CONTROL_TABLE_SIZE = 256
+AX_12_MODEL_NUMBER = 12
+
+_backends = {}
+
+
+def register_backend(name, factory):
+    """
+    Register a backend factory under `name`. The factory is called with the
+    keyword arguments given to `create_backend`.
+    """
+    _backends[name] = factory
+
+
+def backend_names():
+    return sorted(_backends)
+
+
+def create_backend(name=None, **kwargs):
+    """
+    Create a backend by name. When `name` is None the ``SERVODE_BACKEND``
+    environment variable is used, falling back to the ROBOTIS SDK.
+
+    :param name: the registered name of a backend or a Backend instance
+    :return: a Backend
+    """
+    if isinstance(name, Backend):
+        return name
+    if name is None:
+        name = os.environ.get(BACKEND_ENV, DEFAULT_BACKEND)
+    try:
+        factory = _backends[name]
+    except KeyError:
+        raise ValueError("backend:'{0}' not understood. Known: {1}".format(
+            name, backend_names()))
+    log.debug("[create_backend] name:{0}".format(name))
+    return factory(**kwargs)
+
+
+def _to_bytes(value, size):
+    buf = bytearray(size)
+    pack_value(buf, 0, value, size)
+    return buf
+
+
+class Backend(object):
+    """
+    The interface every bus backend provides.
+    """
+    name = None
+    # False when transactions complete without waiting on a device
+    blocking = True
+    # True when the backend implements `bulk_read`
+    has_bulk_read = False
+
+    def __init__(self, device=None, baud_rate=None, protocol_version=1,
+                 clock=None, **kwargs):
+        super(Backend, self).__init__()
+        self.device = device
+        self.baud_rate = baud_rate
+        self.protocol_version = protocol_version
+        self.clock = clock
+
+    def open(self):
+        return True
+
+    def close(self):
+        pass
+
+    def set_baud_rate(self, baud_rate):
+        self.baud_rate = baud_rate
+        return True
+
+    def set_packet_timeout(self, timeout):
+        """
+        Wait at most `timeout` seconds for every status packet, instead of
+        the timeout the backend derives per transaction.
+
+        :param timeout: the timeout in seconds, None for the default
+        :return: True if the backend supports a fixed timeout
+        """
+        return False
+
+    def ping(self, sid):
+        """
+        :return: a Status whose value is the model number of the servo
+        """
+        raise NotImplementedError()
+
+    def read(self, sid, address, length):
+        """
+        :return: a Status whose params are the `length` bytes read
+        """
+        raise NotImplementedError()
+
+    def write(self, sid, address, data):
+        raise NotImplementedError()
+
+    def reg_write(self, sid, address, data):
+        raise NotImplementedError()
+
+    def action(self, sid=BROADCAST_ID):
+        raise NotImplementedError()
+
+    def sync_write(self, address, length, items):
+        """
+        :param items: a list of (servo_id, data) with `length` bytes of data
+            per servo
+        :return: a Status with no servo reply
+        """
+        raise NotImplementedError()
+
+    def bulk_read(self, blocks):
+        """
+        :param blocks: a list of (servo_id, address, length)
+        :return: a list of Status in the order of `blocks`
+        """
+        raise NotImplementedError(
+            "backend:'{0}' does not support bulk_read.".format(self.name))
+
+    def factory_reset(self, sid):
+        raise NotImplementedError()
+
+    def prepare_read(self, sid, address, length):
+        """
+        Prepare a read that is repeated many times.
+
+        :return: a callable taking no arguments that performs the read and
+            returns a Status
+        """
+        return functools.partial(self.read, sid, address, length)
+
+    def prepare_sync_write(self, address, size, servo_ids):
+        """
+        Prepare a sync write of one value per servo that is repeated many
+        times.
+
+        :param size: the number of bytes of every value
+        :return: an object whose `send(values)` writes the values, in the
+            order of `servo_ids`, and returns a Status
+        """
+        return SyncWriteHandle(self, address, size, servo_ids)
+
+    def prepare_bulk_read(self, blocks):
+        """
+        Prepare a bulk read that is repeated many times.
+
+        :param blocks: a list of (servo_id, address, length)
+        :return: a callable taking no arguments that returns a list of Status
+            in the order of `blocks`
+        """
+        return functools.partial(self.bulk_read, list(blocks))
+
+
+class SyncWriteHandle(object):
+    """
+    A prepared sync write for backends without a faster path: the per-servo
+    buffers are allocated once and refilled on every send.
+    """
+
+    def __init__(self, backend, address, size, servo_ids):
+        super(SyncWriteHandle, self).__init__()
+        self.backend = backend
+        self.address = address
+        self.size = size
+        self.servo_ids = list(servo_ids)
+        self._items = [(sid, bytearray(size)) for sid in self.servo_ids]
+
+    def send(self, values):
+        size = self.size
+        for (sid, data), value in zip(self._items, values):
+            pack_value(data, 0, value, size)
+        return self.backend.sync_write(self.address, size, self._items)
+
+
+class RobotisSyncWriteHandle(object):
+    """
+    A prepared sync write holding one SDK group for its whole life. The
+    parameters are added on the first send and changed in place after that.
+    """
+
+    def __init__(self, backend, address, size, servo_ids):
+        super(RobotisSyncWriteHandle, self).__init__()
+        self.backend = backend
+        self.size = size
+        self.servo_ids = list(servo_ids)
+        self.group_num = backend.dxl.groupSyncWrite(
+            backend.port_num, backend.protocol_version, address, size)
+        self._added = False
+
+    def send(self, values):
+        dxl = self.backend.dxl
+        group_num = self.group_num
+        size = self.size
+        if self._added:
+            for sid, value in zip(self.servo_ids, values):
+                dxl.groupSyncWriteChangeParam(group_num, sid, value, size, 0)
+        else:
+            for sid, value in zip(self.servo_ids, values):
+                if not dxl.groupSyncWriteAddParam(
+                        group_num, sid, value, size):
+                    log.error("[RobotisSyncWriteHandle.send] add param "
+                              "failed servo_id:{0}".format(sid))
+                    dxl.groupSyncWriteClearParam(group_num)
+                    return comm_status(COMM_NOT_AVAILABLE, sid)
+            self._added = True
+        dxl.groupSyncWriteTxPacket(group_num)
+        return self.backend._status(BROADCAST_ID)
+
+
+class SerialSyncWriteHandle(object):
+    """
+    A prepared sync write whose packets are encoded once. Each send only packs
+    the new values and the checksums.
+    """
+
+    def __init__(self, backend, address, size, servo_ids):
+        super(SerialSyncWriteHandle, self).__init__()
+        self.transport = backend.transport
+        servo_ids = list(servo_ids)
+        per_packet = (MAX_PARAMS - 2) // (1 + size)
+        self.packets = [
+            (i, SyncWritePacket(address, size, servo_ids[i:i + per_packet]))
+            for i in range(0, len(servo_ids), per_packet)
+        ]
+
+    def send(self, values):
+        status = comm_status(COMM_SUCCESS, BROADCAST_ID)
+        for start, packet in self.packets:
+            status = self.transport.transact(packet.fill(values, start), 0)
+            if status.comm_result != COMM_SUCCESS:
+                break
+        return status
+
+
+class RobotisBackend(Backend):
+    """
+    The ROBOTIS DynamixelSDK, through its ctypes `dynamixel_functions`.
+    """
+    name = 'robotis'
+    has_bulk_read = True
+
+    def __init__(self, **kwargs):
+        super(RobotisBackend, self).__init__(**kwargs)
+        from . import dynamixel_functions
+        self.dxl = dynamixel_functions
+        self.port_num = self.dxl.portHandler(self.device)
+        self.dxl.packetHandler()  # Initialize PacketHandler Structs
+        # the SDK never frees a group, so one is kept per (address, length)
+        # for sync writes and per block list for bulk reads
+        self._sync_groups = dict()
+        self._bulk_reads = dict()
+
+    def _status(self, sid, params=None):
+        dxl = self.dxl
+        comm_result = dxl.getLastTxRxResult(
+            self.port_num, self.protocol_version)
+        error = dxl.getLastRxPacketError(self.port_num, self.protocol_version)
+        return Status(comm_result, sid, error, params)
+
+    def open(self):
+        return bool(self.dxl.openPort(self.port_num))
+
+    def close(self):
+        self.dxl.closePort(self.port_num)
+
+    def set_baud_rate(self, baud_rate):
+        if self.dxl.setBaudRate(self.port_num, baud_rate):
+            self.baud_rate = baud_rate
+            return True
+        return False
+
+    def ping(self, sid):
+        model = self.dxl.pingGetModelNum(
+            self.port_num, self.protocol_version, sid)
+        return self._status(sid, _to_bytes(model, 2))
+
+    def read(self, sid, address, length):
+        dxl = self.dxl
+        if length == 1:
+            value = dxl.read1ByteTxRx(
+                self.port_num, self.protocol_version, sid, address)
+            return self._status(sid, _to_bytes(value, 1))
+        if length == 2:
+            value = dxl.read2ByteTxRx(
+                self.port_num, self.protocol_version, sid, address)
+            return self._status(sid, _to_bytes(value, 2))
+
+        dxl.readTxRx(self.port_num, self.protocol_version, sid, address,
+                     length)
+        status = self._status(sid)
+        data = bytearray(length)
+        if status.comm_result == COMM_SUCCESS:
+            for i in range(length):
+                data[i] = dxl.getDataRead(
+                    self.port_num, self.protocol_version, 1, i)
+        return status._replace(params=data)
+
+    def write(self, sid, address, data):
+        dxl = self.dxl
+        length = len(data)
+        if length == 1:
+            dxl.write1ByteTxRx(self.port_num, self.protocol_version, sid,
+                               address, data[0])
+        elif length == 2:
+            dxl.write2ByteTxRx(self.port_num, self.protocol_version, sid,
+                               address, data[0] | (data[1] << 8))
+        else:
+            for i in range(length):
+                dxl.setDataWrite(
+                    self.port_num, self.protocol_version, 1, i, data[i])
+            dxl.writeTxRx(self.port_num, self.protocol_version, sid,
+                          address, length)
+        return self._status(sid)
+
+    def reg_write(self, sid, address, data):
+        dxl = self.dxl
+        for i in range(len(data)):
+            dxl.setDataWrite(
+                self.port_num, self.protocol_version, 1, i, data[i])
+        dxl.regWriteTxRx(self.port_num, self.protocol_version, sid,
+                         address, len(data))
+        return self._status(sid)
+
+    def action(self, sid=BROADCAST_ID):
+        self.dxl.action(self.port_num, self.protocol_version, sid)
+        return self._status(sid)
+
+    def sync_write(self, address, length, items):
+        dxl = self.dxl
+        if length > 4:
+            # groupSyncWriteAddParam takes at most a 4 byte value, so build
+            # the parameters of longer blocks directly
+            pos = 0
+            for sid, data in items:
+                dxl.setDataWrite(
+                    self.port_num, self.protocol_version, 1, pos, sid)
+                for i in range(length):
+                    dxl.setDataWrite(self.port_num, self.protocol_version,
+                                     1, pos + 1 + i, data[i])
+                pos += 1 + length
+            dxl.syncWriteTxOnly(
+                self.port_num, self.protocol_version, address, length, pos)
+            return self._status(BROADCAST_ID)
+
+        group_num = self._sync_groups.get((address, length))
+        if group_num is None:
+            group_num = dxl.groupSyncWrite(
+                self.port_num, self.protocol_version, address, length)
+            self._sync_groups[(address, length)] = group_num
+        else:
+            dxl.groupSyncWriteClearParam(group_num)
+        for sid, data in items:
+            value = 0
+            for i in range(length - 1, -1, -1):
+                value = (value << 8) | data[i]
+            if not dxl.groupSyncWriteAddParam(group_num, sid, value, length):
+                log.error("[RobotisBackend.sync_write] add param failed "
+                          "servo_id:{0}".format(sid))
+                return comm_status(COMM_NOT_AVAILABLE, sid)
+        dxl.groupSyncWriteTxPacket(group_num)
+        return self._status(BROADCAST_ID)
+
+    def bulk_read(self, blocks):
+        key = tuple(blocks)
+        run = self._bulk_reads.get(key)
+        if run is None:
+            run = self.prepare_bulk_read(key)
+            self._bulk_reads[key] = run
+        return run()
+
+    def prepare_bulk_read(self, blocks):
+        dxl = self.dxl
+        blocks = list(blocks)
+        group_num = dxl.groupBulkRead(self.port_num, self.protocol_version)
+        for sid, address, length in blocks:
+            if dxl.groupBulkReadAddParam(
+                    group_num, sid, address, length) != 1:
+                dxl.groupBulkReadClearParam(group_num)
+                raise IOError(
+                    "[bulk_read] add read param fail on servo_id:{0}".format(
+                        sid))
+
+        def run():
+            dxl.groupBulkReadTxRxPacket(group_num)
+            tx_status = self._status(BROADCAST_ID)
+            results = list()
+            for sid, address, length in blocks:
+                if dxl.groupBulkReadIsAvailable(
+                        group_num, sid, address, length) != 1:
+                    results.append(comm_status(COMM_NOT_AVAILABLE, sid))
+                    continue
+                value = dxl.groupBulkReadGetData(
+                    group_num, sid, address, length)
+                results.append(Status(
+                    tx_status.comm_result, sid, 0, _to_bytes(value, length)))
+            return results
+        return run
+
+    def prepare_sync_write(self, address, size, servo_ids):
+        if size > 4:
+            return SyncWriteHandle(self, address, size, servo_ids)
+        return RobotisSyncWriteHandle(self, address, size, servo_ids)
+
+    def factory_reset(self, sid):
+        self.dxl.factoryReset(self.port_num, self.protocol_version, sid, 0x00)
+        return self._status(sid)
+
+
+class SerialBackend(Backend):
+    """
+    The native packet codec over a SerialTransport, no SDK required.
+    """
+    name = 'serial'
+
+    def __init__(self, transport=None, **kwargs):
+        """
+
+        :param transport: a transport to use instead of opening a
+            SerialTransport on `device`
+        """
+        super(SerialBackend, self).__init__(**kwargs)
+        if transport is None:
+            from .transport import SerialTransport
+            transport = SerialTransport(self.device, self.baud_rate)
+        self.transport = transport
+        self.codec = PacketCodec()
+
+    def open(self):
+        return self.transport.open()
+
+    def close(self):
+        self.transport.close()
+
+    def set_baud_rate(self, baud_rate):
+        if self.transport.set_baud_rate(baud_rate):
+            self.baud_rate = baud_rate
+            return True
+        return False
+
+    def set_packet_timeout(self, timeout):
+        self.transport.timeout = timeout
+        return True
+
+    def ping(self, sid):
+        status = self.transport.transact(self.codec.ping(sid), 0)
+        if status.comm_result != COMM_SUCCESS:
+            return status
+        return self.read(sid, 0, 2)
+
+    def read(self, sid, address, length):
+        return self.transport.transact(
+            self.codec.read_data(sid, address, length), length)
+
+    def write(self, sid, address, data):
+        return self.transport.transact(
+            self.codec.write_data(sid, address, data), 0)
+
+    def reg_write(self, sid, address, data):
+        return self.transport.transact(
+            self.codec.reg_write(sid, address, data), 0)
+
+    def action(self, sid=BROADCAST_ID):
+        return self.transport.transact(self.codec.action(sid), 0)
+
+    def sync_write_packets(self, address, length, items):
+        """
+        Encode a sync write into as many packets as the servos need. Each
+        packet is only valid until the next one is encoded.
+        """
+        per_packet = (MAX_PARAMS - 2) // (1 + length)
+        items = list(items)
+        for i in range(0, len(items), per_packet):
+            yield self.codec.sync_write(
+                address, length, items[i:i + per_packet])
+
+    def sync_write(self, address, length, items):
+        status = comm_status(COMM_SUCCESS, BROADCAST_ID)
+        for packet in self.sync_write_packets(address, length, items):
+            status = self.transport.transact(packet, 0)
+            if status.comm_result != COMM_SUCCESS:
+                break
+        return status
+
+    def factory_reset(self, sid):
+        return self.transport.transact(self.codec.reset(sid), 0)
+
+    def prepare_read(self, sid, address, length):
+        packet = bytes(self.codec.read_data(sid, address, length))
+        return functools.partial(self.transport.transact, packet, length)
+
+    def prepare_sync_write(self, address, size, servo_ids):
+        if size not in (1, 2, 4):
+            return SyncWriteHandle(self, address, size, servo_ids)
+        return SerialSyncWriteHandle(self, address, size, servo_ids)
+
+
+class LoopbackBackend(Backend):
+    """
+    An in-memory bus: every servo ID answers and reads return what was last
+    written. Useful to exercise and measure everything above the bus.
+    """
+    name = 'loopback'
+    blocking = False
+    has_bulk_read = True
+
+    def __init__(self, servo_ids=None, model_number=AX_12_MODEL_NUMBER,
+                 **kwargs):
+        """
+
+        :param servo_ids: the IDs present on the bus, None for every ID
+        :param model_number: the model number reported by every servo
+        """
+        super(LoopbackBackend, self).__init__(**kwargs)
+        self.servo_ids = None if servo_ids is None else set(servo_ids)
+        self.model_number = model_number
+        self.memory = dict()
+        self.registered = dict()
+
+    def _table(self, sid):
+        if self.servo_ids is not None and sid not in self.servo_ids:
+            return None
+        table = self.memory.get(sid)
+        if table is None:
+            table = bytearray(CONTROL_TABLE_SIZE)
+            pack_value(table, 0, self.model_number, 2)
+            table[3] = sid
+            self.memory[sid] = table
+        return table
+
+    def _missing(self, sid):
+        return comm_status(COMM_RX_TIMEOUT, sid)
+
+    def ping(self, sid):
+        table = self._table(sid)
+        if table is None:
+            return self._missing(sid)
+        return Status(COMM_SUCCESS, sid, 0, memoryview(table)[0:2])
+
+    def read(self, sid, address, length):
+        table = self._table(sid)
+        if table is None:
+            return self._missing(sid)
+        return Status(COMM_SUCCESS, sid, 0,
+                      memoryview(table)[address:address + length])
+
+    def write(self, sid, address, data):
+        table = self._table(sid)
+        if table is None:
+            return self._missing(sid)
+        table[address:address + len(data)] = data
+        return Status(COMM_SUCCESS, sid, 0, None)
+
+    def reg_write(self, sid, address, data):
+        if self._table(sid) is None:
+            return self._missing(sid)
+        self.registered[sid] = (address, bytearray(data))
+        return Status(COMM_SUCCESS, sid, 0, None)
+
+    def action(self, sid=BROADCAST_ID):
+        for rsid in list(self.registered):
+            if sid in (BROADCAST_ID, rsid):
+                address, data = self.registered.pop(rsid)
+                self.write(rsid, address, data)
+        return comm_status(COMM_SUCCESS, sid)
+
+    def sync_write(self, address, length, items):
+        for sid, data in items:
+            table = self._table(sid)
+            if table is not None:
+                table[address:address + length] = data
+        return comm_status(COMM_SUCCESS, BROADCAST_ID)
+
+    def bulk_read(self, blocks):
+        return [self.read(sid, address, length)
+                for sid, address, length in blocks]
+
+    def factory_reset(self, sid):
+        if self._table(sid) is None:
+            return self._missing(sid)
+        del self.memory[sid]
+        return Status(COMM_SUCCESS, sid, 0, None)
+
+
+def _emulator_backend(**kwargs):
+    from .emulator import emulator_backend
+    return emulator_backend(**kwargs)
+
+
+register_backend(RobotisBackend.name, RobotisBackend)
+register_backend(SerialBackend.name, SerialBackend)
+register_backend(LoopbackBackend.name, LoopbackBackend)
+register_backend('null', LoopbackBackend)
+register_backend('emulator', _emulator_backend)
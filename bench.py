@@ -0,0 +1,264 @@
+"""
+Benchmarks for per-transaction and group operation throughput.
+
+Every operation is run against groups of servos of increasing size and
+reported as transactions per second, p50/p95/p99 latency per call, host CPU
+per transaction and bus utilisation. Results are plain dicts so they can be
+written as JSON and compared between releases.
+
+Run against real hardware with any backend, or against a simulated bus with
+the 'emulator' backend::
+
+    $ ./servode.py bench --backend emulator --sizes 1 16 253 -o bench.json
+"""
+import sys
+import json
+import math
+import time
+import platform
+import datetime
+import collections
+
+from .transport import byte_time
+
+_monotonic = getattr(time, 'monotonic', time.time)
+_process_time = getattr(time, 'process_time', None) or time.clock
+
+DEFAULT_SIZES = (1, 2, 4, 8, 16, 32, 64, 128, 253)
+DEFAULT_ITERATIONS = 100
+DEFAULT_WARMUP = 5
+
+# name: (setup(sp, group) returning a callable, transactions per call)
+OPERATIONS = collections.OrderedDict()
+
+
+def operation(name, transactions):
+    """
+    Register a benchmark operation.
+
+    :param name: the name the operation is reported and selected by
+    :param transactions: a callable taking the group size and returning the
+        number of bus transactions one call makes
+    """
+    def register(setup):
+        OPERATIONS[name] = (setup, transactions)
+        return setup
+    return register
+
+
+@operation('read_register', lambda n: n)
+def _read_register(sp, group):
+    ids = group.servo_ids
+
+    def run():
+        for sid in ids:
+            sp.read_register(sid, 'present_position')
+    return run
+
+
+@operation('write_register', lambda n: n)
+def _write_register(sp, group):
+    ids = group.servo_ids
+
+    def run():
+        for sid in ids:
+            sp.write_register(sid, 'goal_position', 512)
+    return run
+
+
+@operation('sync_write', lambda n: 1)
+def _sync_write(sp, group):
+    ids = group.servo_ids
+
+    def run():
+        sp.sync_write('goal_position', 512, ids)
+    return run
+
+
+@operation('bulk_read', lambda n: n)
+def _bulk_read(sp, group):
+    read_blocks = {"blocks": [
+        {"servo_id": sid, "register": 'present_position'}
+        for sid in group.servo_ids
+    ]}
+
+    def run():
+        sp.bulk_read(read_blocks)
+    return run
+
+
+@operation('prepared_sync_write', lambda n: 1)
+def _prepared_sync_write(sp, group):
+    plan = sp.prepare_sync_write('goal_position', group.servo_ids)
+    values = [512] * len(group)
+
+    def run():
+        plan.run(values)
+    return run
+
+
+@operation('prepared_bulk_read', lambda n: n)
+def _prepared_bulk_read(sp, group):
+    plan = sp.prepare_bulk_read({"blocks": [
+        {"servo_id": sid, "register": 'present_position'}
+        for sid in group.servo_ids
+    ]})
+    return plan.run
+
+
+@operation('write_values', lambda n: 1)
+def _write_values(sp, group):
+    values = [512] * len(group)
+
+    def run():
+        group.write_values('goal_position', values)
+    return run
+
+
+@operation('goal_position', lambda n: 1)
+def _goal_position(sp, group):
+    values = [512] * len(group)
+
+    def run():
+        group.goal_position(values)
+    return run
+
+
+def percentile(ordered, fraction):
+    """
+    :param ordered: a sorted list of samples
+    :param fraction: the percentile as a fraction, e.g. 0.99
+    :return: the nearest-rank percentile of `ordered`
+    """
+    if not ordered:
+        return None
+    index = int(math.ceil(fraction * len(ordered))) - 1
+    return ordered[min(max(index, 0), len(ordered) - 1)]
+
+
+def _wire_bytes(sp):
+    transport = getattr(sp.backend, 'transport', None)
+    if transport is None or not hasattr(transport, 'tx_bytes'):
+        return None
+    return transport.tx_bytes + transport.rx_bytes
+
+
+def measure(sp, name, group, iterations=DEFAULT_ITERATIONS,
+            warmup=DEFAULT_WARMUP):
+    """
+    Measure one operation against one group.
+
+    :return: a result dict
+    """
+    setup, transactions = OPERATIONS[name]
+    result = collections.OrderedDict([
+        ("operation", name),
+        ("servos", len(group)),
+        ("iterations", iterations),
+    ])
+    try:
+        run = setup(sp, group)
+        for _ in range(warmup):
+            run()
+    except NotImplementedError as e:
+        result["error"] = str(e)
+        return result
+
+    latencies = list()
+    wire_start = _wire_bytes(sp)
+    cpu_start = _process_time()
+    start = _monotonic()
+    for _ in range(iterations):
+        t0 = _monotonic()
+        run()
+        latencies.append(_monotonic() - t0)
+    elapsed = _monotonic() - start
+    cpu = _process_time() - cpu_start
+    wire_end = _wire_bytes(sp)
+
+    count = transactions(len(group)) * iterations
+    latencies.sort()
+    result["transactions"] = count
+    result["elapsed"] = elapsed
+    result["tps"] = count / elapsed if elapsed else None
+    result["latency"] = collections.OrderedDict([
+        ("mean", sum(latencies) / len(latencies)),
+        ("p50", percentile(latencies, 0.50)),
+        ("p95", percentile(latencies, 0.95)),
+        ("p99", percentile(latencies, 0.99)),
+        ("max", latencies[-1]),
+    ])
+    result["cpu_per_transaction"] = cpu / count
+    if wire_start is not None and elapsed:
+        wire = (wire_end - wire_start) * byte_time(sp.baud_rate)
+        result["bus_utilisation"] = wire / elapsed
+    else:
+        result["bus_utilisation"] = None
+    return result
+
+
+def run_benchmarks(sp, operations=None, sizes=DEFAULT_SIZES,
+                   iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP,
+                   first_id=1):
+    """
+    Run every operation against groups of each size.
+
+    :param sp: an entered ServoProtocol
+    :param operations: the names of the operations to run, all by default
+    :param sizes: the group sizes, servo IDs are consecutive from first_id
+    :return: a report dict suitable for JSON
+    """
+    from .servode import Servo, ServoGroup, __version__
+
+    report = collections.OrderedDict([
+        ("version", __version__),
+        ("timestamp", datetime.datetime.now().isoformat()),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("backend", sp.backend.name),
+        ("baud_rate", sp.baud_rate),
+        ("results", []),
+    ])
+    for size in sizes:
+        group = ServoGroup()
+        for sid in range(first_id, first_id + size):
+            group[sid] = Servo(sp, sid)
+        for name in operations or OPERATIONS:
+            result = measure(sp, name, group, iterations, warmup)
+            report["results"].append(result)
+    return report
+
+
+def format_report(report):
+    """
+    :return: the report as a human readable table
+    """
+    lines = [
+        "{0:<19} {1:>6} {2:>10} {3:>9} {4:>9} {5:>9} {6:>9} "
+        "{7:>6}".format(
+            "operation", "servos", "tps", "p50 ms", "p95 ms", "p99 ms",
+            "cpu us/tx", "bus %")]
+    for r in report["results"]:
+        if "error" in r:
+            lines.append("{0:<19} {1:>6} {2}".format(
+                r["operation"], r["servos"], r["error"]))
+            continue
+        lat = r["latency"]
+        util = r["bus_utilisation"]
+        lines.append(
+            "{0:<19} {1:>6} {2:>10.1f} {3:>9.3f} {4:>9.3f} {5:>9.3f} "
+            "{6:>9.1f} {7:>6}".format(
+                r["operation"], r["servos"], r["tps"], lat["p50"] * 1e3,
+                lat["p95"] * 1e3, lat["p99"] * 1e3,
+                r["cpu_per_transaction"] * 1e6,
+                "-" if util is None else "{0:.1f}".format(util * 100)))
+    return "\n".join(lines)
+
+
+def write_report(report, path):
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
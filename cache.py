@@ -0,0 +1,165 @@
+"""
+Host-side copies of servo registers driven by the control table's
+volatility.
+
+`RegisterCache` serves reads. EEPROM and non-volatile RAM registers only
+change when they are written, so their values are kept until a write, an ID
+change or a factory reset invalidates them. Volatile registers
+(``present_*``, ``moving``, ...) change on their own and are kept for a short
+per-register time to live.
+
+`ShadowRegisters` suppresses writes. It holds the value last written to or
+read from every writable, non-volatile register so that writing the same
+value again can be skipped.
+"""
+import threading
+
+from .clock import SYSTEM_CLOCK
+
+# seconds a volatile register value is served from the cache
+DEFAULT_TTL = 0.02
+DEFAULT_TTLS = {
+    'present_voltage': 1.0,
+    'present_temperature': 1.0,
+}
+
+
+class RegisterStore(object):
+    """
+    Register entries by servo ID and address. The first item of every entry
+    is its Register.
+    """
+
+    def __init__(self):
+        super(RegisterStore, self).__init__()
+        # servo_id: {address: (Register, ...)}
+        self._servos = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._servos.values())
+
+    def invalidate(self, sid=None, address=None, length=1):
+        """
+        Drop entries.
+
+        :param sid: the servo ID, None for every servo
+        :param address: the first address written, None for every register
+        :param length: the number of bytes written from `address`
+        """
+        with self._lock:
+            if sid is None:
+                self._servos.clear()
+                return
+            if address is None:
+                self._servos.pop(sid, None)
+                return
+            entries = self._servos.get(sid)
+            if not entries:
+                return
+            end = address + length
+            for start in list(entries):
+                if start < end and address < entries[start][0].end:
+                    del entries[start]
+
+
+class RegisterCache(RegisterStore):
+    """
+    Register values by servo ID and address, each stored with the time it
+    was read.
+    """
+
+    def __init__(self, clock=None, ttl=DEFAULT_TTL, ttls=None):
+        """
+
+        :param clock: the clock ages are measured with
+        :param ttl: the time to live in seconds of volatile registers
+        :param ttls: a dict of register name to time to live overriding
+            `ttl`, merged over `DEFAULT_TTLS`. None means never expire.
+        """
+        super(RegisterCache, self).__init__()
+        self.clock = clock or SYSTEM_CLOCK
+        self.ttl = ttl
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_of(self, reg):
+        """
+        :return: the time to live of `reg` in seconds, None if it is kept
+            until invalidated
+        """
+        if not reg.volatile:
+            return None
+        return self.ttls.get(reg.name, self.ttl)
+
+    def get(self, sid, reg, max_age=None):
+        """
+        :param sid: the servo ID
+        :param reg: the Register
+        :param max_age: the oldest value in seconds the caller accepts, on
+            top of the register's own time to live
+        :return: the cached value or None if there is no fresh value
+        """
+        entry = self._servos.get(sid, {}).get(reg.address)
+        if entry is None or entry[0] is not reg:
+            self.misses += 1
+            return None
+        limit = self.ttl_of(reg)
+        if max_age is not None and (limit is None or max_age < limit):
+            limit = max_age
+        if limit is not None and self.clock.monotonic() - entry[2] >= limit:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, sid, reg, value):
+        now = self.clock.monotonic()
+        with self._lock:
+            self._servos.setdefault(sid, dict())[reg.address] = (
+                reg, value, now)
+
+
+class ShadowRegisters(RegisterStore):
+    """
+    The value last written to or read from each writable, non-volatile
+    register of every servo. Volatile registers such as ``torque_enable``
+    can be changed by the servo itself, so they are never shadowed.
+    """
+
+    def __init__(self):
+        super(ShadowRegisters, self).__init__()
+        self.suppressed = 0
+
+    @staticmethod
+    def tracks(reg):
+        return reg.writable and not reg.volatile
+
+    def get(self, sid, reg):
+        """
+        :return: the shadowed value of `reg` or None if it is unknown
+        """
+        entry = self._servos.get(sid, {}).get(reg.address)
+        if entry is None or entry[0] is not reg:
+            return None
+        return entry[1]
+
+    def unchanged(self, sid, reg, value):
+        """
+        :return: True if writing `value` to `reg` would change nothing, which
+            is counted as a suppressed write
+        """
+        entry = self._servos.get(sid, {}).get(reg.address)
+        if entry is not None and entry[0] is reg and entry[1] == value:
+            self.suppressed += 1
+            return True
+        return False
+
+    def put(self, sid, reg, value):
+        if not self.tracks(reg):
+            return
+        with self._lock:
+            self._servos.setdefault(sid, dict())[reg.address] = (reg, value)
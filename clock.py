@@ -0,0 +1,86 @@
+"""
+Clocks used by servode for every sleep and timeout.
+
+`SystemClock` is the real monotonic clock. `VirtualClock` only moves when it
+is slept on or advanced, so that together with the emulator's motion model
+hours of servo motion run in as long as it takes to compute them.
+"""
+import time
+import threading
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# VirtualClock.wait: the real seconds to block on the event, and the virtual
+# seconds to move forward, between two looks at it
+WAIT_SLICE = 0.001
+WAIT_STEP = 0.01
+
+
+class SystemClock(object):
+    """
+    Wall time from the monotonic clock.
+    """
+
+    def monotonic(self):
+        return _monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        """
+        Wait for a `threading.Event` for at most `timeout` seconds.
+
+        :return: True if the event is set
+        """
+        return event.wait(timeout)
+
+
+class VirtualClock(object):
+    """
+    A clock whose time only passes when `sleep` or `advance` is called.
+    Sleeping returns immediately after moving time forward, which makes every
+    run deterministic.
+    """
+
+    def __init__(self, start=0.0):
+        super(VirtualClock, self).__init__()
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return self._now
+
+    def advance(self, seconds):
+        with self._lock:
+            self._now += seconds
+            return self._now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance(seconds)
+
+    def wait(self, event, timeout=None):
+        """
+        Wait for a `threading.Event` set by another thread. Time moves
+        forward by WAIT_STEP for every WAIT_SLICE of real time the event
+        stays clear, until `timeout` virtual seconds have passed. Without a
+        timeout this blocks until the event is set.
+
+        :return: True if the event is set
+        """
+        if timeout is None:
+            return event.wait()
+        deadline = self._now + timeout
+        while not event.is_set():
+            remaining = deadline - self._now
+            if remaining <= 0:
+                break
+            if event.wait(WAIT_SLICE):
+                break
+            self.advance(min(WAIT_STEP, remaining))
+        return event.is_set()
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,251 @@
+"""
+Fixed-rate control loops.
+
+A `ControlLoop` runs sense, compute and actuate phases once per tick on a
+ServoGroup: one prepared bulk read of the sensed registers, a user callback,
+and one prepared SYNC_WRITE of what it returns::
+
+    def hold(sensed, now):
+        return [512 + (512 - p) // 4 for p in sensed['present_position']]
+
+    loop = ControlLoop(sg, hold, sense=['present_position'],
+                       actuate='goal_position', rate=100)
+    with loop:
+        ...
+    print(loop.stats()['tick'])
+
+Ticks are scheduled against the monotonic clock from the start of the loop,
+so they do not drift. A tick that ends past the start of the next one is an
+overrun, handled by the loop's policy: SKIP the ticks already missed and
+keep the schedule, DELAY the schedule to start again from now, or STOP the
+loop. Every phase is timed into a `Histogram`.
+"""
+import bisect
+import logging
+import collections
+
+from .scheduler import MOTION
+from .telemetry import DEFAULT_RATE, SamplingLoop
+
+log = logging.getLogger('servode')
+
+# overrun policies
+SKIP = 'skip'
+DELAY = 'delay'
+STOP = 'stop'
+OVERRUN_POLICIES = (SKIP, DELAY, STOP)
+
+PHASES = ('sense', 'compute', 'actuate', 'tick', 'late')
+# histogram bucket upper bounds in seconds, 10us doubling up to ~1.3s
+BUCKET_BOUNDS = tuple(0.00001 * 2 ** i for i in range(18))
+
+
+class Histogram(object):
+    """
+    Counts of durations in fixed buckets, with their min, max and mean.
+    """
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        super(Histogram, self).__init__()
+        self.bounds = bounds
+        # the last bucket counts everything above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """
+        :param p: the percentile, 0 to 100
+        :return: the upper bound of the bucket holding the percentile, the
+            max for the last bucket
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if i < len(self.bounds):
+                    return min(self.bounds[i], self.max)
+                break
+        return self.max
+
+    def as_dict(self):
+        return collections.OrderedDict([
+            ("count", self.count),
+            ("min", self.min or 0.0),
+            ("mean", self.mean),
+            ("p50", self.percentile(50)),
+            ("p99", self.percentile(99)),
+            ("max", self.max or 0.0),
+        ])
+
+
+class ControlLoop(SamplingLoop):
+    """
+    Runs sense, compute and actuate on a ServoGroup at a fixed rate.
+    """
+    thread_name = 'ControlLoop'
+
+    def __init__(self, group, compute, sense=(), actuate=None,
+                 rate=DEFAULT_RATE, overrun=SKIP, priority=MOTION,
+                 clock=None):
+        """
+
+        :param group: the ServoGroup to control, on a single bus
+        :param compute: a callable taking `sensed`, a dict of register name
+            to the list of values read in servo order (None where a read
+            failed), and `now`, the scheduled monotonic time of the tick. It
+            returns the values to actuate in servo order, or None to write
+            nothing this tick.
+        :param sense: the names of the registers read on every servo
+        :param actuate: the name of the register written, or a list of
+            contiguous registers written together with one row of values
+            per servo, see `ServoProtocol.prepare_sync_write`
+        :param rate: ticks per second
+        :param overrun: SKIP, DELAY or STOP
+        :param priority: the bus priority class of the loop's transactions
+        :param clock: the clock ticks are timed with, the ServoProtocol's
+            clock by default
+        """
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError("overrun:{0!r} not one of {1}".format(
+                overrun, OVERRUN_POLICIES))
+        sp = group._single_bus('ControlLoop')
+        super(ControlLoop, self).__init__(rate, clock or sp.clock)
+        self.sp = sp
+        self.group = group
+        self.compute = compute
+        self.sense = list(sense)
+        self.overrun = overrun
+        self.priority = priority
+        self.servo_ids = group.servo_ids
+        self.errors = 0
+
+        self._read = None
+        if self.sense:
+            self._read = sp.prepare_bulk_read({"blocks": [
+                {"servo_id": sid, "register": register}
+                for register in self.sense for sid in self.servo_ids
+            ]})
+        self._write = None
+        if actuate is not None:
+            self._write = sp.prepare_sync_write(actuate, self.servo_ids)
+        self.histograms = collections.OrderedDict(
+            (phase, Histogram()) for phase in PHASES)
+
+    def stats(self):
+        """
+        :return: a dict of phase name to its timing statistics in seconds.
+            'tick' times the three phases together and 'late' how long
+            after its scheduled time each tick started.
+        """
+        return collections.OrderedDict(
+            (phase, histogram.as_dict())
+            for phase, histogram in self.histograms.items())
+
+    def _sensed(self):
+        if self._read is None:
+            return dict()
+        values = self._read.run()
+        count = len(self.servo_ids)
+        return dict(
+            (register, values[i * count:(i + 1) * count])
+            for i, register in enumerate(self.sense))
+
+    def tick(self, now=None):
+        """
+        Run the three phases once.
+
+        :param now: the scheduled time of the tick, the current time by
+            default
+        """
+        clock = self.clock
+        histograms = self.histograms
+        start = clock.monotonic()
+        if now is None:
+            now = start
+        with self.sp.priority(self.priority):
+            sensed = self._sensed()
+            sensed_at = clock.monotonic()
+            histograms['sense'].add(sensed_at - start)
+
+            values = self.compute(sensed, now)
+            computed_at = clock.monotonic()
+            histograms['compute'].add(computed_at - sensed_at)
+
+            if values is not None and self._write is not None:
+                if not self._write.run(values, force=True):
+                    self.errors += 1
+            end = clock.monotonic()
+            histograms['actuate'].add(end - computed_at)
+        histograms['tick'].add(end - start)
+        self.ticks += 1
+
+    def poll_once(self):
+        self.tick()
+
+    def _run(self, ticks=None):
+        clock = self.clock
+        period = self.period
+        # failed ticks count too, or a compute that always raises would
+        # never let the loop end
+        attempted = 0
+        next_tick = clock.monotonic()
+        while not self._stop.is_set():
+            self.histograms['late'].add(
+                max(clock.monotonic() - next_tick, 0.0))
+            try:
+                self.tick(next_tick)
+            except Exception:
+                self.errors += 1
+                log.exception("[ControlLoop] tick failed")
+            attempted += 1
+            if ticks is not None and attempted >= ticks:
+                break
+            next_tick += period
+            delay = next_tick - clock.monotonic()
+            if delay < 0:
+                self.overruns += 1
+                if self.overrun == STOP:
+                    log.error("[ControlLoop] overrun by {0:.4f}s, "
+                              "stopping".format(-delay))
+                    self._stop.set()
+                    break
+                if self.overrun == SKIP:
+                    missed = int(-delay / period) + 1
+                    next_tick += missed * period
+                else:
+                    next_tick = clock.monotonic()
+                log.debug("[ControlLoop] overrun by {0:.4f}s".format(-delay))
+                delay = next_tick - clock.monotonic()
+            clock.wait(self._stop, max(delay, 0.0))
+
+    def run(self, ticks=None):
+        """
+        Run the loop on the calling thread, until `stop` is called from
+        another thread or `ticks` more ticks have run, failed ones included.
+        """
+        self._stop.clear()
+        self._run(ticks)
+
+    def start(self):
+        super(ControlLoop, self).start()
+        log.debug("[ControlLoop.start] servos:{0} rate:{1} overrun:{2}".format(
+            len(self.servo_ids), 1.0 / self.period, self.overrun))
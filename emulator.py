@@ -0,0 +1,709 @@
+"""
+A virtual bus of AX-12 servos.
+
+Every `VirtualServo` keeps a control table laid out like `dxl_control`,
+with the same EEPROM/RAM areas, access rights and byte widths, and answers
+Protocol 1.0 instruction packets the way the servo firmware does, including
+status_return_level, REG_WRITE/ACTION and RESET.
+
+The bus is available two ways:
+
+- in-process, as an `EmulatedTransport` for the 'serial' backend, or the
+  'emulator' backend which wires the two together, and
+- behind a pseudo-terminal with `PtyBus`, so that any backend that opens a
+  tty path can drive it unchanged.
+
+With `realtime` enabled the bus holds every reply for the wire time of the
+instruction and status packets at the bus baud rate plus the servo's
+return_delay.
+"""
+import os
+import tty
+import select
+import logging
+import threading
+import collections
+
+from .packet import (
+    BROADCAST_ID, COMM_RX_TIMEOUT, COMM_SUCCESS, ERROR_BITS, INST_ACTION,
+    INST_PING, INST_READ, INST_REG_WRITE, INST_RESET, INST_SYNC_WRITE,
+    INST_WRITE, MAX_PACKET_LEN, PACKET_OVERHEAD, checksum, comm_status,
+    find_header, parse_instruction, parse_status
+)
+from .clock import SYSTEM_CLOCK
+from .registers import MAX_RPM, SPEED_UNIT_RPM, UNITS_PER_RPM
+from .transport import byte_time
+
+log = logging.getLogger('servode')
+
+CONTROL_TABLE_SIZE = 50
+AX_12_MODEL_NUMBER = 12
+AX_12_FIRMWARE = 24
+EEPROM_END = 24
+
+# factory default control table of an AX-12, address: (value, bytes)
+AX_12_DEFAULTS = {
+    0: (AX_12_MODEL_NUMBER, 2),  # model_number
+    2: (AX_12_FIRMWARE, 1),  # firmware_version
+    3: (1, 1),  # ID
+    4: (1, 1),  # baud_rate, 1 Mbps
+    5: (250, 1),  # return_delay, 500 usec
+    6: (0, 2),  # cw_angle_limit
+    8: (1023, 2),  # ccw_angle_limit
+    11: (70, 1),  # highest_limit_temperature
+    12: (60, 1),  # lowest_limit_voltage
+    13: (140, 1),  # highest_limit_voltage
+    14: (1023, 2),  # max_torque
+    16: (2, 1),  # status_return_level
+    17: (36, 1),  # alarm_LED
+    18: (36, 1),  # alarm_shutdown
+    26: (1, 1),  # cw_compliance_margin
+    27: (1, 1),  # ccw_compliance_margin
+    28: (32, 1),  # cw_compliance_slope
+    29: (32, 1),  # ccw_compliance_slope
+    30: (512, 2),  # goal_position
+    34: (1023, 2),  # torque_limit
+    36: (512, 2),  # present_position
+    42: (120, 1),  # present_voltage, 12.0V
+    43: (32, 1),  # present_temperature
+    48: (32, 2),  # punch
+}
+
+ADDR_ID = 3
+ADDR_BAUD_RATE = 4
+ADDR_RETURN_DELAY = 5
+ADDR_CW_ANGLE_LIMIT = 6
+ADDR_CCW_ANGLE_LIMIT = 8
+ADDR_MAX_TORQUE = 14
+ADDR_STATUS_RETURN_LEVEL = 16
+ADDR_TORQUE_ENABLE = 24
+ADDR_CW_COMPLIANCE_MARGIN = 26
+ADDR_CCW_COMPLIANCE_MARGIN = 27
+ADDR_GOAL_POSITION = 30
+ADDR_MOVING_SPEED = 32
+ADDR_TORQUE_LIMIT = 34
+ADDR_PRESENT_POSITION = 36
+ADDR_PRESENT_SPEED = 38
+ADDR_PRESENT_LOAD = 40
+ADDR_REGISTERED = 44
+ADDR_MOVING = 46
+ADDR_LOCK = 47
+
+RANGE_ERROR = ERROR_BITS['range_error']
+INSTR_ERROR = ERROR_BITS['instr_error']
+ANGLE_LIMIT_ERROR = ERROR_BITS['angle_limit_error']
+
+# a servo follows the bus when its baud rate is within this tolerance
+BAUD_TOLERANCE = 0.03
+
+
+def _writable_map(control_table):
+    writable = bytearray(CONTROL_TABLE_SIZE)
+    for reg in control_table.values():
+        if 'w' in reg['access']:
+            for i in range(reg['comm_bytes']):
+                writable[reg['address'] + i] = 1
+    return writable
+
+
+def dxl_baud_rate(value):
+    """
+    :return: the baud rate selected by the `baud_rate` register value
+    """
+    return 2000000.0 / (value + 1)
+
+
+class VirtualServo(object):
+    """
+    One emulated AX-12 and its control table.
+    """
+
+    def __init__(self, servo_id=1, control_table=None, **defaults):
+        """
+
+        :param servo_id: the servo ID
+        :param control_table: the register layout, `dxl_control` by default
+        :param defaults: initial register values by name, e.g.
+            return_delay=0
+        """
+        super(VirtualServo, self).__init__()
+        if control_table is None:
+            from .servode import dxl_control
+            control_table = dxl_control
+        self.control_table = control_table
+        self.writable = _writable_map(control_table)
+        self.memory = bytearray(CONTROL_TABLE_SIZE)
+        self.registered = None
+        self.defaults = dict(defaults)
+        self.reset()
+        self.memory[ADDR_ID] = servo_id
+
+    @property
+    def servo_id(self):
+        return self.memory[ADDR_ID]
+
+    @property
+    def baud_rate(self):
+        return dxl_baud_rate(self.memory[ADDR_BAUD_RATE])
+
+    @property
+    def return_delay(self):
+        """
+        :return: the return delay in seconds
+        """
+        return self.memory[ADDR_RETURN_DELAY] * 2e-6
+
+    @property
+    def status_return_level(self):
+        return self.memory[ADDR_STATUS_RETURN_LEVEL]
+
+    def __getitem__(self, register):
+        reg = self.control_table[register]
+        return self.get(reg['address'], reg['comm_bytes'])
+
+    def __setitem__(self, register, value):
+        reg = self.control_table[register]
+        self.set(reg['address'], value, reg['comm_bytes'])
+
+    def get(self, address, size):
+        value = 0
+        for i in range(size - 1, -1, -1):
+            value = (value << 8) | self.memory[address + i]
+        return value
+
+    def set(self, address, value, size):
+        for i in range(size):
+            self.memory[address + i] = (value >> (8 * i)) & 0xFF
+
+    def reset(self):
+        """
+        Restore the factory default control table, as the RESET instruction.
+        """
+        self.memory[:] = bytearray(CONTROL_TABLE_SIZE)
+        for address, (value, size) in AX_12_DEFAULTS.items():
+            self.set(address, value, size)
+        for register, value in self.defaults.items():
+            self[register] = value
+        self.registered = None
+
+    def read(self, address, length):
+        """
+        :return: (error, data)
+        """
+        if length == 0 or address + length > CONTROL_TABLE_SIZE:
+            return RANGE_ERROR, None
+        return 0, self.memory[address:address + length]
+
+    def check_write(self, address, data):
+        """
+        :return: the error bits a write of `data` at `address` would raise
+        """
+        end = address + len(data)
+        if len(data) == 0 or end > CONTROL_TABLE_SIZE:
+            return RANGE_ERROR
+        if address < EEPROM_END and self.memory[ADDR_LOCK]:
+            return RANGE_ERROR
+        for i in range(address, end):
+            if not self.writable[i]:
+                return RANGE_ERROR
+        return 0
+
+    def write(self, address, data):
+        """
+        :return: the error bits of the write
+        """
+        error = self.check_write(address, data)
+        if error:
+            return error
+        self.memory[address:address + len(data)] = data
+        self.on_write(address, len(data))
+        return 0
+
+    def on_write(self, address, length):
+        """
+        Called after a successful write of `length` bytes at `address`.
+        """
+        pass
+
+    def update(self, now):
+        """
+        Called before the servo handles an instruction, with the bus time.
+        """
+        pass
+
+
+class SimulatedServo(VirtualServo):
+    """
+    A VirtualServo that moves. On every instruction the servo advances from
+    the previous bus time to the current one: towards `goal_position` at
+    `moving_speed`, slowed or stalled by `external_load` against
+    `torque_limit`, within the angle limits, or continuously in wheel mode.
+    `present_position`, `present_speed`, `present_load` and `moving` follow.
+    """
+
+    def __init__(self, servo_id=1, control_table=None, external_load=0.0,
+                 **defaults):
+        """
+
+        :param external_load: the load opposing motion as a fraction of the
+            maximum torque, 0.0 to 1.0
+        """
+        self.external_load = external_load
+        self._position = 0.0
+        self._velocity = 0.0
+        self._last = None
+        super(SimulatedServo, self).__init__(
+            servo_id=servo_id, control_table=control_table, **defaults)
+
+    def reset(self):
+        super(SimulatedServo, self).reset()
+        self._position = float(self.get(ADDR_PRESENT_POSITION, 2))
+        self._velocity = 0.0
+
+    @property
+    def wheel_mode(self):
+        return self.get(ADDR_CW_ANGLE_LIMIT, 2) == 0 and \
+            self.get(ADDR_CCW_ANGLE_LIMIT, 2) == 0
+
+    def write(self, address, data):
+        error = super(SimulatedServo, self).write(address, data)
+        if error or not address <= ADDR_GOAL_POSITION < address + len(data):
+            return error
+
+        # writing a goal enables torque, goals outside the limits are held
+        # at the limit and flagged
+        self.memory[ADDR_TORQUE_ENABLE] = 1
+        if not self.wheel_mode:
+            goal = self.get(ADDR_GOAL_POSITION, 2)
+            cw = self.get(ADDR_CW_ANGLE_LIMIT, 2)
+            ccw = self.get(ADDR_CCW_ANGLE_LIMIT, 2)
+            if not cw <= goal <= ccw:
+                self.set(ADDR_GOAL_POSITION, min(max(goal, cw), ccw), 2)
+                return ANGLE_LIMIT_ERROR
+        return error
+
+    def _torque(self):
+        """
+        :return: the usable torque as a fraction of the maximum
+        """
+        if not self.memory[ADDR_TORQUE_ENABLE]:
+            return 0.0
+        return min(self.get(ADDR_TORQUE_LIMIT, 2),
+                   self.get(ADDR_MAX_TORQUE, 2)) / 1023.0
+
+    def update(self, now):
+        if self._last is None:
+            self._last = now
+            return
+        dt = now - self._last
+        if dt <= 0:
+            return
+        self._last = now
+
+        torque = self._torque()
+        available = 0.0
+        if torque > 0:
+            available = max(0.0, 1.0 - self.external_load / torque)
+        speed = self.get(ADDR_MOVING_SPEED, 2)
+
+        if self.wheel_mode:
+            rpm = min((speed & 0x3FF) * SPEED_UNIT_RPM, MAX_RPM)
+            direction = -1.0 if speed & 0x400 else 1.0
+            self._velocity = direction * rpm * UNITS_PER_RPM * available
+            self._position = (self._position + self._velocity * dt) % 1024
+            moving = self._velocity != 0
+        else:
+            rpm = MAX_RPM if speed == 0 else min(speed * SPEED_UNIT_RPM,
+                                                  MAX_RPM)
+            step = rpm * UNITS_PER_RPM * available * dt
+            goal = self.get(ADDR_GOAL_POSITION, 2)
+            remaining = goal - self._position
+            if abs(remaining) <= step:
+                self._position = float(goal)
+                self._velocity = remaining / dt
+            else:
+                self._position += step if remaining > 0 else -step
+                self._velocity = step / dt if remaining > 0 else -step / dt
+            if remaining > 0:
+                margin = self.memory[ADDR_CCW_COMPLIANCE_MARGIN]
+            else:
+                margin = self.memory[ADDR_CW_COMPLIANCE_MARGIN]
+            moving = abs(goal - self._position) > margin
+
+        self.set(ADDR_PRESENT_POSITION,
+                 min(max(int(round(self._position)), 0), 1023), 2)
+        units = min(int(round(
+            abs(self._velocity) / UNITS_PER_RPM / SPEED_UNIT_RPM)), 1023)
+        cw = 0x400 if self._velocity < 0 else 0
+        self.set(ADDR_PRESENT_SPEED, units | cw if units else 0, 2)
+        load = min(self.external_load, torque)
+        units = min(int(round(load * 1023)), 1023)
+        self.set(ADDR_PRESENT_LOAD, units | cw if units else 0, 2)
+        self.memory[ADDR_MOVING] = 1 if moving else 0
+
+
+class VirtualBus(object):
+    """
+    A set of virtual servos sharing one half-duplex bus.
+    """
+
+    def __init__(self, servo_ids=(), baud_rate=1000000, servo_factory=None,
+                 clock=None):
+        """
+
+        :param servo_ids: the IDs of the servos to create on the bus
+        :param baud_rate: the baud rate the host talks at
+        :param servo_factory: a callable taking a servo ID and returning a
+            VirtualServo, `VirtualServo` by default
+        :param clock: the clock servo state advances on, `SYSTEM_CLOCK` by
+            default
+        """
+        super(VirtualBus, self).__init__()
+        self.servos = collections.OrderedDict()
+        self.baud_rate = baud_rate
+        self.servo_factory = servo_factory or VirtualServo
+        self.clock = clock or SYSTEM_CLOCK
+        self.tx = bytearray(MAX_PACKET_LEN)
+        self.tx[0] = 0xFF
+        self.tx[1] = 0xFF
+        self._tx_view = memoryview(self.tx)
+        self.lock = threading.Lock()
+        for sid in servo_ids:
+            self.add(self.servo_factory(sid))
+
+    def __len__(self):
+        return len(self.servos)
+
+    def __getitem__(self, servo_id):
+        return self.servos[servo_id]
+
+    def add(self, servo):
+        self.servos[servo.servo_id] = servo
+        return servo
+
+    def _listening(self, servo):
+        return abs(servo.baud_rate - self.baud_rate) <= \
+            BAUD_TOLERANCE * self.baud_rate
+
+    def wire_time(self, byte_count):
+        return byte_count * byte_time(self.baud_rate)
+
+    def _status(self, servo, error, data=None):
+        """
+        Encode a status packet from `servo` into the bus reply buffer.
+        """
+        tx = self.tx
+        tx[2] = servo.servo_id
+        n = 0 if data is None else len(data)
+        tx[3] = n + 2
+        tx[4] = error
+        if n:
+            tx[5:5 + n] = data
+        tx[5 + n] = checksum(tx, 2, 5 + n)
+        return self._tx_view[:n + PACKET_OVERHEAD]
+
+    def execute(self, packet):
+        """
+        Handle one instruction packet.
+
+        :param packet: the bytes of an instruction packet
+        :return: (reply, return_delay) where reply is a memoryview of the
+            status packet, or None when no servo answers
+        """
+        inst = parse_instruction(packet)
+        if inst is None:
+            return None, 0
+        with self.lock:
+            return self._execute(inst)
+
+    def _execute(self, inst):
+        now = self.clock.monotonic()
+        sid = inst.servo_id
+        code = inst.instruction
+        params = inst.params
+
+        if code == INST_SYNC_WRITE:
+            if sid != BROADCAST_ID or len(params) < 2:
+                return None, 0
+            address, length = params[0], params[1]
+            pos = 2
+            while pos + 1 + length <= len(params):
+                servo = self.servos.get(params[pos])
+                if servo is not None and self._listening(servo):
+                    servo.update(now)
+                    servo.write(address, params[pos + 1:pos + 1 + length])
+                pos += 1 + length
+            return None, 0
+
+        if sid == BROADCAST_ID:
+            targets = [s for s in self.servos.values() if self._listening(s)]
+        else:
+            servo = self.servos.get(sid)
+            if servo is None or not self._listening(servo):
+                return None, 0
+            targets = [servo]
+
+        for servo in targets:
+            servo.update(now)
+
+        reply = None
+        for servo in targets:
+            reply = self._handle(servo, code, params)
+        if sid == BROADCAST_ID or reply is None:
+            return None, 0
+        return reply, targets[0].return_delay
+
+    def _handle(self, servo, code, params):
+        level = servo.status_return_level
+        if code == INST_PING:
+            return self._status(servo, 0)
+
+        if code == INST_READ:
+            if len(params) != 2:
+                return self._status(servo, INSTR_ERROR) if level else None
+            error, data = servo.read(params[0], params[1])
+            if level == 0:
+                return None
+            return self._status(servo, error, data)
+
+        if code in (INST_WRITE, INST_REG_WRITE):
+            if len(params) < 2:
+                error = INSTR_ERROR
+            elif code == INST_WRITE:
+                old_id = servo.servo_id
+                error = servo.write(params[0], params[1:])
+                if servo.servo_id != old_id:
+                    self._move(servo, old_id)
+            else:
+                error = servo.check_write(params[0], params[1:])
+                if not error:
+                    servo.registered = (params[0], bytearray(params[1:]))
+                    servo.memory[ADDR_REGISTERED] = 1
+        elif code == INST_ACTION:
+            error = 0
+            if servo.registered is not None:
+                address, data = servo.registered
+                servo.registered = None
+                servo.memory[ADDR_REGISTERED] = 0
+                old_id = servo.servo_id
+                servo.write(address, data)
+                if servo.servo_id != old_id:
+                    self._move(servo, old_id)
+        elif code == INST_RESET:
+            old_id = servo.servo_id
+            servo.reset()
+            if servo.servo_id != old_id:
+                self._move(servo, old_id)
+            error = 0
+        else:
+            error = INSTR_ERROR
+
+        if level < 2:
+            return None
+        return self._status(servo, error)
+
+    def _move(self, servo, old_id):
+        if self.servos.get(old_id) is servo:
+            del self.servos[old_id]
+        self.servos[servo.servo_id] = servo
+
+
+class EmulatedTransport(object):
+    """
+    A transport, interchangeable with `transport.SerialTransport`, that
+    hands packets directly to a VirtualBus.
+    """
+
+    def __init__(self, bus, realtime=True, latency=0.0, timeout=None):
+        """
+
+        :param bus: the VirtualBus
+        :param realtime: hold every transaction for its wire time and the
+            servo's return_delay
+        :param latency: fixed time in seconds added to every transaction
+        :param timeout: the time in seconds a transaction to a missing servo
+            takes, by default the wire time plus 2ms
+        """
+        super(EmulatedTransport, self).__init__()
+        self.bus = bus
+        self.realtime = realtime
+        self.latency = latency
+        self.timeout = timeout
+        self.sleep = bus.clock.sleep
+        self.rx = bytearray(MAX_PACKET_LEN)
+        self.is_open = False
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+
+    @property
+    def baud_rate(self):
+        return self.bus.baud_rate
+
+    def open(self):
+        self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def set_baud_rate(self, baud_rate):
+        self.bus.baud_rate = baud_rate
+        return True
+
+    def timeout_for(self, tx_len, rx_len):
+        if self.timeout is not None:
+            return self.timeout
+        return self.bus.wire_time(tx_len + rx_len) + 0.002
+
+    def exchange(self, packet, param_count=0):
+        """
+        Execute a packet on the bus without waiting.
+
+        :return: (status, the time in seconds the transaction takes on a
+            real bus)
+        """
+        reply, return_delay = self.bus.execute(packet)
+        self.tx_bytes += len(packet)
+        if reply is None:
+            if packet[2] == BROADCAST_ID:
+                hold = self.bus.wire_time(len(packet)) + self.latency
+                return comm_status(COMM_SUCCESS, BROADCAST_ID), hold
+            hold = self.timeout_for(len(packet), param_count + PACKET_OVERHEAD)
+            return comm_status(COMM_RX_TIMEOUT), hold
+
+        n = len(reply)
+        self.rx[0:n] = reply
+        self.rx_bytes += n
+        hold = self.bus.wire_time(len(packet) + n) + return_delay + \
+            self.latency
+        return parse_status(self.rx, n), hold
+
+    def transact(self, packet, param_count=0):
+        status, hold = self.exchange(packet, param_count)
+        if self.realtime:
+            self.sleep(hold)
+        return status
+
+
+class PtyBus(object):
+    """
+    Serve a VirtualBus on a pseudo-terminal. `device` is the path to open,
+    for example with ``ServoProtocol(backend='serial', device=...)``.
+    """
+
+    def __init__(self, bus, realtime=True):
+        super(PtyBus, self).__init__()
+        self.bus = bus
+        self.realtime = realtime
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+        self._rx = bytearray(MAX_PACKET_LEN * 4)
+        self._have = 0
+        self._running = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(
+            target=self._serve, name='PtyBus:{0}'.format(self.device))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _serve(self):
+        while self._running.is_set():
+            if not select.select([self.master], [], [], 0.05)[0]:
+                continue
+            try:
+                data = os.read(self.master, MAX_PACKET_LEN)
+            except OSError:
+                break
+            self._feed(data)
+
+    def _feed(self, data):
+        rx = self._rx
+        n = len(data)
+        if self._have + n > len(rx):
+            self._have = 0
+        rx[self._have:self._have + n] = data
+        self._have += n
+
+        while self._have:
+            start = find_header(rx, 0, self._have)
+            if start < 0:
+                keep = 1 if rx[self._have - 1] == 0xFF else 0
+                rx[0:keep] = rx[self._have - keep:self._have]
+                self._have = keep
+                return
+            if start > 0:
+                rx[0:self._have - start] = rx[start:self._have]
+                self._have -= start
+            if self._have < 4:
+                return
+            end = rx[3] + 4
+            if self._have < end:
+                return
+            inst = parse_instruction(rx, end)
+            if inst is None:
+                # corrupt, drop the header and resync
+                rx[0:self._have - 1] = rx[1:self._have]
+                self._have -= 1
+                continue
+            packet = bytes(rx[:end])
+            rx[0:self._have - end] = rx[end:self._have]
+            self._have -= end
+            self._answer(packet)
+
+    def _answer(self, packet):
+        reply, return_delay = self.bus.execute(packet)
+        if reply is None:
+            return
+        reply = bytes(reply)
+        if self.realtime:
+            self.bus.clock.sleep(
+                self.bus.wire_time(len(packet) + len(reply)) + return_delay)
+        os.write(self.master, reply)
+
+
+def emulator_backend(servo_ids=range(1, 254), realtime=False,
+                     baud_rate=1000000, bus=None, motion=False, clock=None,
+                     **kwargs):
+    """
+    Create a 'serial' backend on an in-process VirtualBus.
+
+    :param servo_ids: the IDs of the virtual servos
+    :param realtime: hold transactions for their wire time
+    :param bus: an existing VirtualBus to use instead of creating one
+    :param motion: create SimulatedServos that move instead of
+        VirtualServos
+    :param clock: the clock the bus runs on
+    """
+    from .backends import SerialBackend
+    if bus is None:
+        bus = VirtualBus(
+            servo_ids, baud_rate=baud_rate, clock=clock,
+            servo_factory=SimulatedServo if motion else VirtualServo)
+    backend = SerialBackend(
+        transport=EmulatedTransport(bus, realtime=realtime),
+        baud_rate=baud_rate, **kwargs)
+    backend.name = 'emulator'
+    backend.bus = bus
+    return backend
@@ -0,0 +1,324 @@
+"""
+Motion completion for ServoGroup moves.
+
+A `MotionHandle` watches a group move to its goal positions. Every pass reads
+``present_position`` and ``moving`` of the whole group with one prepared bulk
+read, and the time to the next pass shrinks as the servos approach their
+goals, so a move is seen to finish within a few milliseconds of the last
+servo arriving. Servos that stop short of their goal, or still move but make
+no progress, are reported as stalled instead of being waited on forever::
+
+    handle = sg.goal_position([100, 200, 300], background=True)
+    ...
+    if not handle.wait(timeout=2.0):
+        handle.cancel(halt=True)
+    elif handle.stalled:
+        log.warning("stalled:{0}".format(handle.stalled))
+"""
+import logging
+import threading
+
+log = logging.getLogger('servode')
+
+# the shortest and longest time in seconds between two passes
+MIN_INTERVAL = 0.005
+MAX_INTERVAL = 0.1
+# a servo outside its margin whose moving register reads 0 for STALL_TIME
+# seconds has stalled
+STALL_TIME = 0.25
+# a servo that reads as moving but travels slower than STALL_SPEED units per
+# second has stalled, measured over long enough to expect STALL_DELTA units
+# and at least STALL_TIME. The slowest moving_speed of an AX-12 is about 2.3
+# units per second.
+STALL_SPEED = 1.0
+STALL_DELTA = 2
+
+
+class MotionHandle(object):
+    """
+    The completion of one move, see `ServoGroup.goal_position`.
+
+    `arrived` lists the ids of the servos within margin of their goal,
+    `stalled` those that stopped short of it and `positions` the last
+    position read of every servo, in servo_ids order.
+    """
+
+    def __init__(self, sp, servo_ids, goals, margin, timeout=None,
+                 should_run=None, stall_time=STALL_TIME,
+                 stall_speed=STALL_SPEED, min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL, plan=None, group=None):
+        """
+
+        :param sp: the ServoProtocol of the group
+        :param servo_ids: the ids of the servos moving
+        :param goals: the goal position of each servo, in servo_ids order
+        :param margin: the distance from the goal that counts as arrived
+        :param timeout: the most seconds to watch the move, None for no limit
+        :param should_run: a `threading.Event` that cancels the watch when
+            cleared. It is cleared when the move completes.
+        :param stall_time: the seconds a servo outside its margin may read
+            as not moving before it counts as stalled
+        :param stall_speed: the units per second below which a servo that
+            reads as moving counts as stalled
+        :param plan: a bulk read plan of ``present_position`` and ``moving``
+            on every servo, in servo_ids order, to reuse
+        :param group: the ServoGroup moving, halted through its buses by
+            `cancel`
+        """
+        super(MotionHandle, self).__init__()
+        self.sp = sp
+        self.clock = sp.clock
+        self.servo_ids = list(servo_ids)
+        self.goals = list(goals)[:len(self.servo_ids)]
+        self.margin = margin
+        self.timeout = timeout
+        self.should_run = should_run
+        self.stall_time = stall_time
+        self.stall_speed = stall_speed
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.group = group
+
+        if plan is None:
+            blocks = list()
+            for sid in self.servo_ids:
+                blocks.append(
+                    {"servo_id": sid, "register": 'present_position'})
+                blocks.append({"servo_id": sid, "register": 'moving'})
+            plan = sp.prepare_bulk_read({"blocks": blocks})
+        self.plan = plan
+
+        self.positions = [None] * len(self.servo_ids)
+        # group indexes, servo ids may repeat on different buses
+        self._arrived = set()
+        self._stalled = list()
+        self.cancelled = False
+        self.timed_out = False
+        self.passes = 0
+        self.started = self.clock.monotonic()
+        self.finished = None
+        self._last = dict()
+        self._still_since = dict()
+        # group index: (position, time) progress is measured from
+        self._progress = dict()
+        self._done = threading.Event()
+        self._callbacks = list()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        state = 'running'
+        if self.cancelled:
+            state = 'cancelled'
+        elif self.timed_out:
+            state = 'timed out'
+        elif self.done():
+            state = 'done'
+        return ("MotionHandle({0}, servos={1}, arrived={2}, "
+                "stalled={3})".format(state, len(self.servo_ids),
+                                      len(self.arrived), self.stalled))
+
+    @property
+    def arrived(self):
+        return [self.servo_ids[i] for i in sorted(self._arrived)]
+
+    @property
+    def stalled(self):
+        return [self.servo_ids[i] for i in self._stalled]
+
+    @property
+    def ok(self):
+        """
+        True once every servo arrived at its goal.
+        """
+        return self._done.is_set() and len(self._arrived) == len(self.goals)
+
+    @property
+    def elapsed(self):
+        end = self.finished
+        if end is None:
+            end = self.clock.monotonic()
+        return end - self.started
+
+    def _finish(self):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.finished = self.clock.monotonic()
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, list()
+        if self.should_run is not None:
+            self.should_run.clear()
+        if self.stalled:
+            log.warning("[MotionHandle] stalled servo_ids:{0}".format(
+                self.stalled))
+        log.debug("[MotionHandle] done in {0:.3f}s passes:{1} arrived:{2} "
+                  "stalled:{3}".format(self.elapsed, self.passes,
+                                       len(self._arrived), len(self._stalled)))
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                log.exception("[MotionHandle] done callback failed")
+
+    def step(self):
+        """
+        Read the group once and update the state of every servo.
+
+        :return: the seconds to wait before the next pass, None when the
+            watch is over
+        """
+        if self._done.is_set():
+            return None
+        if self.cancelled or (self.should_run is not None and
+                              not self.should_run.is_set()):
+            self.cancelled = True
+            self._finish()
+            return None
+
+        values = self.plan.run()
+        now = self.clock.monotonic()
+        self.passes += 1
+        eta = None
+        for i, goal in enumerate(self.goals):
+            if i in self._arrived or i in self._stalled:
+                continue
+            pos, moving = values[2 * i], values[2 * i + 1]
+            if pos is None:
+                continue
+            self.positions[i] = pos
+            distance = abs(goal - pos)
+            if distance < self.margin:
+                self._arrived.add(i)
+                continue
+
+            last = self._last.get(i)
+            self._last[i] = (pos, now)
+            if not moving:
+                self._progress.pop(i, None)
+                since = self._still_since.setdefault(
+                    i, now if last is None else last[1])
+                if now - since >= self.stall_time:
+                    self._stalled.append(i)
+                continue
+            self._still_since.pop(i, None)
+
+            start = self._progress.setdefault(i, (pos, now))
+            span = now - start[1]
+            if span >= max(self.stall_time, STALL_DELTA / self.stall_speed):
+                if abs(pos - start[0]) < self.stall_speed * span:
+                    self._stalled.append(i)
+                    continue
+                self._progress[i] = (pos, now)
+            if last is None:
+                continue
+            delta = abs(pos - last[0])
+            dt = now - last[1]
+            if delta > 0 and dt > 0:
+                # time for this servo to come within its margin
+                remaining = (distance - self.margin) * dt / delta
+                eta = remaining if eta is None else min(eta, remaining)
+
+        log.debug("[MotionHandle] pass:{0} positions:{1}".format(
+            self.passes, self.positions))
+        if len(self._arrived) + len(self._stalled) == len(self.goals):
+            self._finish()
+            return None
+        if self.timeout is not None and now - self.started >= self.timeout:
+            self.timed_out = True
+            self._finish()
+            return None
+        if eta is None:
+            return self.min_interval * 4
+        return min(max(eta / 2, self.min_interval), self.max_interval)
+
+    def _run(self, deadline=None):
+        clock = self.clock
+        while True:
+            interval = self.step()
+            if interval is None:
+                return True
+            if deadline is not None:
+                remaining = deadline - clock.monotonic()
+                if remaining <= 0:
+                    return False
+                interval = min(interval, remaining)
+            clock.sleep(interval)
+
+    def start(self):
+        """
+        Watch the move on a background thread.
+        """
+        if self._thread is not None or self._done.is_set():
+            return self
+        self._thread = threading.Thread(
+            target=self._run, name='MotionHandle')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def done(self):
+        """
+        :return: True once the watch is over. Without a background thread
+            this reads the group once.
+        """
+        if self._thread is None and not self._done.is_set():
+            self.step()
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the watch to end, on the background thread if one was
+        started and by polling from the calling thread otherwise.
+
+        :param timeout: the most seconds to wait
+        :return: True if the watch is over
+        """
+        if self._thread is not None:
+            return self.clock.wait(self._done, timeout)
+        deadline = None
+        if timeout is not None:
+            deadline = self.clock.monotonic() + timeout
+        return self._run(deadline)
+
+    def result(self, timeout=None):
+        """
+        Wait for the watch to end.
+
+        :return: True if every servo arrived at its goal
+        """
+        self.wait(timeout)
+        return self.ok
+
+    def cancel(self, halt=False):
+        """
+        Stop watching the move.
+
+        :param halt: also stop the servos where they are, by writing their
+            last read positions as their goals
+        """
+        self.cancelled = True
+        if halt and any(pos is not None for pos in self.positions):
+            # servos not read yet are held at their goal
+            positions = [goal if pos is None else pos
+                         for pos, goal in zip(self.positions, self.goals)]
+            if self.group is not None:
+                self.group.write_values('goal_position', positions)
+            else:
+                self.sp.sync_write(
+                    'goal_position', dict(zip(self.servo_ids, positions)))
+        if self._thread is None:
+            self._finish()
+        elif self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def add_done_callback(self, callback):
+        """
+        Call `callback(handle)` when the watch ends, at once if it already
+        has.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
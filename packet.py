@@ -0,0 +1,440 @@
+"""
+Native Dynamixel Protocol 1.0 packet codec.
+
+Instruction packets are encoded into a single preallocated ``bytearray``
+owned by the codec and handed back as a ``memoryview`` of the bytes to put on
+the wire. Status packets are parsed in place; the parameters of a parsed
+``Status`` are a ``memoryview`` into the receive buffer, so they are only
+valid until that buffer is reused for the next transaction.
+
+Packet layout::
+
+    instruction: 0xFF 0xFF ID LENGTH INSTRUCTION PARAM_1 ... PARAM_N CHECKSUM
+    status:      0xFF 0xFF ID LENGTH ERROR       PARAM_1 ... PARAM_N CHECKSUM
+
+where LENGTH is N + 2 and CHECKSUM is ~(ID + LENGTH + INSTRUCTION/ERROR +
+PARAM_1 + ... + PARAM_N) & 0xFF.
+"""
+import struct
+import collections
+
+HEADER = b'\xff\xff'
+HEADER_LEN = 2
+# header + id + length + instruction/error + checksum
+PACKET_OVERHEAD = 6
+STATUS_MIN_LEN = PACKET_OVERHEAD
+MAX_PARAMS = 253
+MAX_PACKET_LEN = MAX_PARAMS + PACKET_OVERHEAD
+
+BROADCAST_ID = 0xFE
+MAX_ID = 0xFD
+
+# Instructions
+INST_PING = 0x01
+INST_READ = 0x02
+INST_WRITE = 0x03
+INST_REG_WRITE = 0x04
+INST_ACTION = 0x05
+INST_RESET = 0x06
+INST_SYNC_WRITE = 0x83
+INST_BULK_READ = 0x92
+
+# Communication results, values shared with the ROBOTIS SDK
+COMM_SUCCESS = 0  # Communication Success result value
+COMM_PORT_BUSY = -1000  # Port is in use
+COMM_TX_FAIL = -1001  # Communication Tx Failed
+COMM_RX_FAIL = -1002  # Communication Rx Failed
+COMM_TX_ERROR = -2000  # Incorrect instruction packet
+COMM_RX_WAITING = -3000  # Now receiving status packet
+COMM_RX_TIMEOUT = -3001  # There is no status packet
+COMM_RX_CORRUPT = -3002  # Incorrect status packet
+COMM_NOT_AVAILABLE = -9000
+
+COMM_RESULT_TEXT = {
+    COMM_SUCCESS: "[TxRxResult] Communication success!",
+    COMM_PORT_BUSY: "[TxRxResult] Port is in use!",
+    COMM_TX_FAIL: "[TxRxResult] Failed transmit instruction packet!",
+    COMM_RX_FAIL: "[TxRxResult] Failed get status packet from device!",
+    COMM_TX_ERROR: "[TxRxResult] Incorrect instruction packet!",
+    COMM_RX_WAITING: "[TxRxResult] Now receiving status packet!",
+    COMM_RX_TIMEOUT: "[TxRxResult] There is no status packet!",
+    COMM_RX_CORRUPT: "[TxRxResult] Incorrect status packet!",
+    COMM_NOT_AVAILABLE: "[TxRxResult] Protocol does not support This "
+                        "function!",
+}
+
+# Status packet error bits
+ERROR_BITS = collections.OrderedDict([
+    ("instr_error",       int('01000000', 2)),
+    ("overload_error",    int('00100000', 2)),
+    ("checksum_error",    int('00010000', 2)),
+    ("range_error",       int('00001000', 2)),
+    ("overheat_error",    int('00000100', 2)),
+    ("angle_limit_error", int('00000010', 2)),
+    ("input_volt_error",  int('00000001', 2))
+])
+
+
+class PacketError(ValueError):
+    """
+    Raised when an instruction packet cannot be encoded.
+    """
+    pass
+
+
+def comm_result_text(comm_result):
+    """
+    :return: a readable description of a communication result
+    """
+    return COMM_RESULT_TEXT.get(
+        comm_result, "[TxRxResult] Unknown result:{0}".format(comm_result))
+
+
+def unpack_value(buf, offset, size):
+    """
+    Decode a little-endian unsigned value of `size` bytes from `buf`.
+
+    :param buf: a bytearray or memoryview
+    :param offset: the offset of the least significant byte
+    :param size: the number of bytes in the value
+    :return: the integer value
+    """
+    if size == 1:
+        return buf[offset]
+    if size == 2:
+        return buf[offset] | (buf[offset + 1] << 8)
+    value = 0
+    for i in range(size - 1, -1, -1):
+        value = (value << 8) | buf[offset + i]
+    return value
+
+
+def pack_value(buf, offset, value, size):
+    """
+    Encode `value` as a little-endian unsigned value of `size` bytes into
+    `buf` at `offset`.
+
+    :return: the offset following the encoded value
+    """
+    if value < 0 or value >> (8 * size):
+        raise PacketError("value:{0} does not fit in {1} byte(s)".format(
+            value, size))
+    for i in range(size):
+        buf[offset + i] = (value >> (8 * i)) & 0xFF
+    return offset + size
+
+
+def checksum(buf, start, end):
+    """
+    Compute the Protocol 1.0 checksum of ``buf[start:end]``.
+    """
+    total = 0
+    for i in range(start, end):
+        total += buf[i]
+    return (~total) & 0xFF
+
+
+def status_length(param_count):
+    """
+    :param param_count: the number of parameters expected in a status packet
+    :return: the total length in bytes of that status packet
+    """
+    return param_count + PACKET_OVERHEAD
+
+
+def find_header(buf, start=0, end=None):
+    """
+    Find the next 0xFF 0xFF header in ``buf[start:end]``.
+
+    A run of three or more 0xFF bytes resolves to the last pair, as an ID of
+    0xFF is never valid.
+
+    :return: the offset of the header or -1 if no header is present
+    """
+    if end is None:
+        end = len(buf)
+    i = start
+    while i < end - 1:
+        if buf[i] == 0xFF and buf[i + 1] == 0xFF:
+            while i + 2 < end and buf[i + 2] == 0xFF:
+                i += 1
+            return i
+        i += 1
+    return -1
+
+
+class Status(collections.namedtuple(
+        'Status', ['comm_result', 'servo_id', 'error', 'params'])):
+    """
+    The single result of a transaction: the communication result, the servo
+    that answered, the error bits of the status packet and its parameters.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.comm_result == COMM_SUCCESS and not self.error
+
+    @property
+    def has_params(self):
+        """
+        True when the transaction succeeded and the status packet carried
+        parameters. A servo that sets error bits, such as instr_error, may
+        answer a READ_DATA without any.
+        """
+        return self.comm_result == COMM_SUCCESS and bool(self.params)
+
+    @property
+    def value(self):
+        """
+        The parameters decoded as one little-endian unsigned value, or None
+        when the status packet carried no parameters.
+        """
+        if self.params is None or len(self.params) == 0:
+            return None
+        return unpack_value(self.params, 0, len(self.params))
+
+    def error_status(self):
+        """
+        :return: a dict of error bit name to bool
+        """
+        return dict(
+            (key, bool(self.error & bit)) for key, bit in ERROR_BITS.items())
+
+
+def comm_status(comm_result, servo_id=None):
+    """
+    :return: a `Status` for a transaction that did not produce a status
+        packet.
+    """
+    return Status(comm_result, servo_id, 0, None)
+
+
+def _parse(buf, offset, end):
+    """
+    :return: (comm_result, servo_id, instruction or error byte, params,
+        offset following the packet)
+    """
+    start = find_header(buf, offset, end)
+    if start < 0 or end - start < STATUS_MIN_LEN:
+        return COMM_RX_CORRUPT, None, 0, None, end
+
+    sid = buf[start + 2]
+    pkt_len = buf[start + 3]
+    if pkt_len < 2 or start + 4 + pkt_len > end:
+        return COMM_RX_CORRUPT, sid, 0, None, end
+
+    chk_pos = start + 3 + pkt_len
+    if checksum(buf, start + 2, chk_pos) != buf[chk_pos]:
+        return COMM_RX_CORRUPT, sid, 0, None, chk_pos + 1
+
+    params = memoryview(buf)[start + 5:chk_pos]
+    return COMM_SUCCESS, sid, buf[start + 4], params, chk_pos + 1
+
+
+def parse_status(buf, length=None, offset=0):
+    """
+    Parse one status packet out of ``buf[offset:offset + length]`` without
+    copying. Leading noise before the header is skipped.
+
+    :param buf: a bytearray holding the received bytes
+    :param length: the number of valid bytes in `buf` after offset
+    :param offset: where to begin looking for the header
+    :return: a `Status`; params is a memoryview into `buf`
+    """
+    end = len(buf) if length is None else offset + length
+    comm_result, sid, error, params, _ = _parse(buf, offset, end)
+    return Status(comm_result, sid, error, params)
+
+
+Instruction = collections.namedtuple(
+    'Instruction', ['servo_id', 'instruction', 'params', 'end'])
+
+
+def parse_instruction(buf, length=None, offset=0):
+    """
+    Parse one instruction packet out of ``buf[offset:offset + length]``, the
+    device side counterpart of `parse_status`.
+
+    :return: an `Instruction` or None when no complete, valid packet is
+        present. `end` is the offset following the packet.
+    """
+    end = len(buf) if length is None else offset + length
+    comm_result, sid, instruction, params, pkt_end = _parse(buf, offset, end)
+    if comm_result != COMM_SUCCESS:
+        return None
+    return Instruction(sid, instruction, params, pkt_end)
+
+
+class PacketCodec(object):
+    """
+    Encodes Protocol 1.0 instruction packets into one reusable buffer.
+
+    Every encode method returns a memoryview of the encoded packet. The
+    view shares the codec's buffer, so it must be written to the bus before
+    the next packet is encoded.
+    """
+
+    def __init__(self):
+        super(PacketCodec, self).__init__()
+        self.tx = bytearray(MAX_PACKET_LEN)
+        self._tx_view = memoryview(self.tx)
+        self.tx[0] = 0xFF
+        self.tx[1] = 0xFF
+
+    def _begin(self, sid, instruction):
+        if (0 <= sid <= MAX_ID or sid == BROADCAST_ID) is False:
+            raise PacketError("Invalid servo_id:{0}".format(sid))
+        self.tx[2] = sid
+        self.tx[4] = instruction
+        return 5
+
+    def _finish(self, end):
+        param_count = end - 5
+        if param_count > MAX_PARAMS:
+            raise PacketError("Too many parameters:{0}".format(param_count))
+        self.tx[3] = param_count + 2
+        self.tx[end] = checksum(self.tx, 2, end)
+        return self._tx_view[:end + 1]
+
+    def _copy(self, pos, data):
+        n = len(data)
+        if pos + n >= MAX_PACKET_LEN:
+            raise PacketError("Too many parameters:{0}".format(pos + n - 5))
+        self.tx[pos:pos + n] = data
+        return pos + n
+
+    def ping(self, sid):
+        return self._finish(self._begin(sid, INST_PING))
+
+    def read_data(self, sid, address, length):
+        pos = self._begin(sid, INST_READ)
+        self.tx[pos] = address
+        self.tx[pos + 1] = length
+        return self._finish(pos + 2)
+
+    def write_data(self, sid, address, data):
+        """
+        :param data: the bytes to write starting at `address`
+        """
+        pos = self._begin(sid, INST_WRITE)
+        self.tx[pos] = address
+        return self._finish(self._copy(pos + 1, data))
+
+    def write_value(self, sid, address, value, size):
+        pos = self._begin(sid, INST_WRITE)
+        self.tx[pos] = address
+        return self._finish(pack_value(self.tx, pos + 1, value, size))
+
+    def reg_write(self, sid, address, data):
+        pos = self._begin(sid, INST_REG_WRITE)
+        self.tx[pos] = address
+        return self._finish(self._copy(pos + 1, data))
+
+    def action(self, sid=BROADCAST_ID):
+        return self._finish(self._begin(sid, INST_ACTION))
+
+    def reset(self, sid):
+        return self._finish(self._begin(sid, INST_RESET))
+
+    def sync_write(self, address, length, items):
+        """
+        :param address: the first address written on every servo
+        :param length: the number of bytes written on every servo
+        :param items: an iterable of (servo_id, data) where data is `length`
+            bytes
+        """
+        pos = self._begin(BROADCAST_ID, INST_SYNC_WRITE)
+        self.tx[pos] = address
+        self.tx[pos + 1] = length
+        pos += 2
+        for sid, data in items:
+            if len(data) != length:
+                raise PacketError(
+                    "servo_id:{0} data length:{1} expected:{2}".format(
+                        sid, len(data), length))
+            if pos + 1 + length >= MAX_PACKET_LEN:
+                raise PacketError("Too many servos in sync_write")
+            self.tx[pos] = sid
+            pos = self._copy(pos + 1, data)
+        return self._finish(pos)
+
+    def sync_write_values(self, address, size, items):
+        """
+        :param items: an iterable of (servo_id, value) where value is encoded
+            as `size` little-endian bytes
+        """
+        pos = self._begin(BROADCAST_ID, INST_SYNC_WRITE)
+        self.tx[pos] = address
+        self.tx[pos + 1] = size
+        pos += 2
+        for sid, value in items:
+            if pos + 1 + size >= MAX_PACKET_LEN:
+                raise PacketError("Too many servos in sync_write")
+            self.tx[pos] = sid
+            pos = pack_value(self.tx, pos + 1, value, size)
+        return self._finish(pos)
+
+
+_VALUE_STRUCTS = {
+    1: struct.Struct('<B'),
+    2: struct.Struct('<H'),
+    4: struct.Struct('<I'),
+}
+
+
+class SyncWritePacket(object):
+    """
+    A SYNC_WRITE packet compiled once for a fixed address, value size and
+    list of servos. Only the values and the checksum are rewritten each
+    time it is filled.
+    """
+
+    def __init__(self, address, size, servo_ids):
+        """
+
+        :param address: the address written on every servo
+        :param size: the number of bytes of every value, 1, 2 or 4
+        :param servo_ids: the servos, in the order values will be given
+        """
+        super(SyncWritePacket, self).__init__()
+        servo_ids = list(servo_ids)
+        param_count = 2 + len(servo_ids) * (1 + size)
+        if param_count > MAX_PARAMS:
+            raise PacketError("Too many servos in sync_write:{0}".format(
+                len(servo_ids)))
+        self.servo_ids = servo_ids
+        self.size = size
+        self._struct = _VALUE_STRUCTS[size]
+        self.buf = bytearray(param_count + PACKET_OVERHEAD)
+        self.view = memoryview(self.buf)
+        buf = self.buf
+        buf[0] = 0xFF
+        buf[1] = 0xFF
+        buf[2] = BROADCAST_ID
+        buf[3] = param_count + 2
+        buf[4] = INST_SYNC_WRITE
+        buf[5] = address
+        buf[6] = size
+        self._offsets = list()
+        pos = 7
+        for sid in servo_ids:
+            buf[pos] = sid
+            self._offsets.append(pos + 1)
+            pos += 1 + size
+        self._chk_pos = pos
+
+    def __len__(self):
+        return len(self.servo_ids)
+
+    def fill(self, values, start=0):
+        """
+        :param values: the values in servo order, from index `start`
+        :return: a memoryview of the packet ready to send
+        """
+        pack_into = self._struct.pack_into
+        buf = self.buf
+        for offset, value in zip(self._offsets, values[start:]):
+            pack_into(buf, offset, value)
+        buf[self._chk_pos] = checksum(buf, 2, self._chk_pos)
+        return self.view
@@ -0,0 +1,225 @@
+"""
+Several servo buses driven in parallel.
+
+A `ServoBusPool` owns one ServoProtocol per device, each with its own lock
+and a `BusWorker` thread that runs the transactions handed to its bus in
+order. A ServoGroup whose servos live on different buses of a pool splits
+its reads and writes per bus and runs them on the workers at the same time,
+so three buses move three times the data of one::
+
+    with ServoBusPool({'left': '/dev/ttyUSB0', 'right': '/dev/ttyUSB1'},
+                      backend='serial') as pool:
+        legs = ServoGroup()
+        legs['l1'] = pool.servo('left', 1)
+        legs['r1'] = pool.servo('right', 1)
+        legs.write_values('goal_position', [300, 700])
+        positions = legs.read('present_position')
+"""
+import logging
+import threading
+import collections
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .servode import Servo, ServoProtocol
+
+log = logging.getLogger('servode')
+
+
+class Job(object):
+    """
+    The pending result of a call submitted to a BusWorker.
+    """
+
+    def __init__(self, fn, args, kwargs):
+        super(Job, self).__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self._value = None
+        self._error = None
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            self._value = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self._error = e
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the call to complete.
+
+        :return: what the call returned
+        :raise: what the call raised, or IOError on timeout
+        """
+        if not self._done.wait(timeout):
+            raise IOError("[Job.result] timed out after {0}s".format(timeout))
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class BusWorker(object):
+    """
+    A thread running the calls submitted for one bus, in order.
+    """
+
+    def __init__(self, name='BusWorker'):
+        super(BusWorker, self).__init__()
+        self.name = name
+        self._jobs = queue.Queue()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            job.run()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._jobs.put(None)
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` on the worker thread, or at once on the
+        calling thread when the worker is not running.
+
+        :return: a Job
+        """
+        job = Job(fn, args, kwargs)
+        if self._thread is None or self._thread is threading.current_thread():
+            job.run()
+        else:
+            self._jobs.put(job)
+        return job
+
+
+class ServoBusPool(object):
+    """
+    A ServoProtocol and a BusWorker per servo bus, opened and closed
+    together.
+    """
+
+    def __init__(self, buses=None, **options):
+        """
+
+        :param buses: a dict of bus name to its device path, or to a dict of
+            ServoProtocol keyword arguments for that bus
+        :param options: ServoProtocol keyword arguments for every bus
+        """
+        super(ServoBusPool, self).__init__()
+        self.options = options
+        self.buses = collections.OrderedDict()
+        self._open = False
+        for name, bus in (buses or dict()).items():
+            if isinstance(bus, dict):
+                self.add(name, **bus)
+            else:
+                self.add(name, device=bus)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, name):
+        return self.buses[name]
+
+    def __iter__(self):
+        return iter(self.buses)
+
+    def __len__(self):
+        return len(self.buses)
+
+    def add(self, name, sp=None, **options):
+        """
+        Add a bus to the pool, opening it if the pool is open.
+
+        :param name: the name of the bus
+        :param sp: a ServoProtocol to add, created from `options` and the
+            pool's options when None
+        :return: the ServoProtocol of the bus
+        """
+        if name in self.buses:
+            raise ValueError("bus:'{0}' already in the pool".format(name))
+        if sp is None:
+            kwargs = dict(self.options)
+            kwargs.update(options)
+            sp = ServoProtocol(**kwargs)
+        sp.executor = BusWorker(name='BusWorker-{0}'.format(name))
+        self.buses[name] = sp
+        if self._open:
+            sp.__enter__()
+            sp.executor.start()
+        log.debug("[ServoBusPool.add] bus:'{0}' device:{1}".format(
+            name, sp.device))
+        return sp
+
+    def servo(self, name, servo_id):
+        """
+        :return: a Servo with `servo_id` on the bus `name`
+        """
+        return Servo(self.buses[name], servo_id)
+
+    def open(self):
+        if self._open:
+            return
+        opened = list()
+        try:
+            for sp in self.buses.values():
+                sp.__enter__()
+                opened.append(sp)
+                sp.executor.start()
+        except Exception:
+            for sp in opened:
+                sp.executor.stop()
+                sp.__exit__(None, None, None)
+            raise
+        self._open = True
+
+    def close(self):
+        if not self._open:
+            return
+        self._open = False
+        for sp in self.buses.values():
+            sp.executor.stop()
+            sp.__exit__(None, None, None)
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Call `fn(sp, *args, **kwargs)` for every bus, on the buses' workers
+        at the same time.
+
+        :return: a dict of bus name to what `fn` returned
+        """
+        jobs = [(name, sp.executor.submit(fn, sp, *args, **kwargs))
+                for name, sp in self.buses.items()]
+        return collections.OrderedDict(
+            (name, job.result()) for name, job in jobs)
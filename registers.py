@@ -0,0 +1,252 @@
+"""
+Compiled servo control tables.
+
+The control table of every supported model is loaded from a JSON data file
+in ``tables/`` and compiled once into immutable `Register` descriptors,
+indexed by name and by address. A descriptor carries everything a
+transaction needs — address, width, a precompiled struct, value range,
+access and volatility — so no per-call lookups or string comparisons are
+left on the bus path.
+"""
+import os
+import json
+import struct
+import collections
+
+from .packet import MAX_PARAMS
+
+TABLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'tables')
+
+# servo_type: data file
+MODEL_TABLES = {
+    'AX-12': 'ax12.json',
+    'MX': 'mx.json',
+}
+
+_STRUCTS = {
+    1: struct.Struct('<B'),
+    2: struct.Struct('<H'),
+    4: struct.Struct('<I'),
+}
+
+# Merge two registers into one READ_DATA when at most this many unwanted
+# bytes lie between them; a second transaction costs far more on the wire.
+MAX_READ_GAP = 12
+
+# AX-12 units: 0.29 degrees per position unit, 0.111 rpm per moving_speed
+# unit and a no-load speed of 114 rpm at 12V
+POSITION_UNIT_DEG = 0.29
+SPEED_UNIT_RPM = 0.111
+MAX_RPM = 114.0
+UNITS_PER_RPM = 360.0 / 60.0 / POSITION_UNIT_DEG
+
+
+class Register(object):
+    """
+    An immutable control table register.
+    """
+    __slots__ = ('name', 'address', 'size', 'addr_type', 'volatile',
+                 'access', 'readable', 'writable', 'min', 'max', 'struct',
+                 'end')
+
+    def __init__(self, name, address, comm_bytes, access, addr_type,
+                 volatile, min=0, max=None):
+        if max is None:
+            max = (1 << (8 * comm_bytes)) - 1
+        values = dict(
+            name=name, address=address, size=comm_bytes, access=access,
+            addr_type=addr_type, volatile=volatile, readable='r' in access,
+            writable='w' in access, min=min, max=max,
+            struct=_STRUCTS[comm_bytes], end=address + comm_bytes)
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Register:'{0}' is immutable".format(self.name))
+
+    def __repr__(self):
+        return "Register({0!r}, address={1}, size={2}, access={3!r})".format(
+            self.name, self.address, self.size, self.access)
+
+    @property
+    def fmt(self):
+        return self.struct.format
+
+    def validate(self, value):
+        """
+        :raise ValueError: if `value` is outside the register's range
+        """
+        if not self.min <= value <= self.max:
+            raise ValueError(
+                "register:'{0}' value:{1} outside range {2}-{3}".format(
+                    self.name, value, self.min, self.max))
+        return value
+
+    def encode(self, value):
+        """
+        :return: the validated value as little-endian bytes
+        """
+        self.validate(value)
+        return self.struct.pack(value)
+
+    def pack_into(self, buf, offset, value):
+        self.validate(value)
+        self.struct.pack_into(buf, offset, value)
+
+    def decode(self, buf, offset=0):
+        return self.struct.unpack_from(buf, offset)[0]
+
+    def as_dict(self):
+        """
+        :return: the register in the `dxl_control` dict format
+        """
+        return {
+            "addr_type": self.addr_type,
+            "volatile": self.volatile,
+            "address": self.address,
+            "comm_bytes": self.size,
+            "access": self.access,
+        }
+
+
+class RegisterTable(object):
+    """
+    The compiled control table of one servo model.
+    """
+
+    def __init__(self, model, registers, model_numbers=(), size=None):
+        """
+
+        :param model: the servo type, e.g. 'AX-12'
+        :param registers: an iterable of Register
+        :param model_numbers: the model_number values of this model
+        :param size: the size of the control table in bytes
+        """
+        super(RegisterTable, self).__init__()
+        self.model = model
+        self.model_numbers = tuple(model_numbers)
+        self.by_name = collections.OrderedDict()
+        self.by_address = dict()
+        for reg in sorted(registers, key=lambda r: r.address):
+            self.by_name[reg.name] = reg
+            self.by_address[reg.address] = reg
+        if size is None:
+            size = max(reg.end for reg in self.by_name.values())
+        self.size = size
+
+    def __getitem__(self, key):
+        """
+        :param key: a register name, address or Register
+        :return: the Register
+        """
+        if isinstance(key, Register):
+            return key
+        try:
+            return self.by_name[key]
+        except KeyError:
+            if isinstance(key, int) and key in self.by_address:
+                return self.by_address[key]
+            raise
+
+    def __contains__(self, key):
+        if isinstance(key, Register):
+            return self.by_name.get(key.name) is key
+        return key in self.by_name or key in self.by_address
+
+    def __iter__(self):
+        return iter(self.by_name)
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __repr__(self):
+        return "RegisterTable({0!r}, registers={1})".format(
+            self.model, len(self))
+
+    def values(self):
+        return self.by_name.values()
+
+    def span(self, start, count):
+        """
+        :param start: the name or Register of the first register
+        :param count: the number of registers
+        :return: the `count` registers that follow each other without gaps
+            in the table, starting with `start`
+        """
+        regs = [self[start]]
+        while len(regs) < count:
+            reg = self.by_address.get(regs[-1].end)
+            if reg is None:
+                raise ValueError(
+                    "no register at address:{0} following '{1}'".format(
+                        regs[-1].end, regs[-1].name))
+            regs.append(reg)
+        return regs
+
+    def as_dict(self):
+        """
+        :return: the table in the `dxl_control` dict-of-dicts format
+        """
+        return dict((name, reg.as_dict())
+                    for name, reg in self.by_name.items())
+
+    def plan_reads(self, registers, max_gap=MAX_READ_GAP,
+                   max_length=MAX_PARAMS):
+        """
+        Plan the smallest set of contiguous range reads that cover
+        `registers`.
+
+        :param registers: register names or Registers to read
+        :param max_gap: the most unwanted bytes allowed between two registers
+            read by the same transaction
+        :param max_length: the most bytes a single read may return
+        :return: a list of (address, length, members) where members is a list
+            of (Register, offset) within the range
+        """
+        ordered = sorted(set(self[r] for r in registers),
+                         key=lambda r: r.address)
+        plan = list()
+        for reg in ordered:
+            if plan:
+                start, length, members = plan[-1]
+                if reg.address - (start + length) <= max_gap and \
+                        reg.end - start <= max_length:
+                    members.append((reg, reg.address - start))
+                    plan[-1] = (start, max(length, reg.end - start), members)
+                    continue
+            plan.append((reg.address, reg.size, [(reg, 0)]))
+        return plan
+
+
+def load_table(path, model=None):
+    """
+    Load and compile a control table data file.
+    """
+    with open(path) as f:
+        data = json.load(f, object_pairs_hook=collections.OrderedDict)
+    registers = [
+        Register(name, **spec) for name, spec in data['registers'].items()
+    ]
+    return RegisterTable(
+        model or data['model'], registers,
+        model_numbers=data.get('model_numbers', ()), size=data.get('size'))
+
+
+_tables = dict()
+
+
+def get_table(servo_type):
+    """
+    :return: the compiled RegisterTable of `servo_type`, loaded on first use
+    """
+    table = _tables.get(servo_type)
+    if table is None:
+        try:
+            fname = MODEL_TABLES[servo_type]
+        except KeyError:
+            raise NotImplementedError(
+                "servo_type:{0} not understood.".format(servo_type))
+        table = load_table(os.path.join(TABLES_DIR, fname), servo_type)
+        _tables[servo_type] = table
+    return table
@@ -0,0 +1,115 @@
+"""
+Fast servo discovery.
+
+`scan` probes every servo ID of a bus with one READ_DATA of model_number and
+firmware_version, so a servo that answers is identified in the same round
+trip that finds it. Each probe waits only for the wire time of the exchange
+at the bus baud rate plus the longest return delay a servo may have, instead
+of the generous default timeout, and the bus is searched at several baud
+rates in turn. `scan_pool` scans every bus of a `pool.ServoBusPool` at the
+same time::
+
+    with ServoProtocol() as sp:
+        for found in scan(sp):
+            print(found.servo_id, found.baud_rate, found.model_number)
+
+Backends that cannot bound the status timeout, such as the ROBOTIS SDK,
+scan with their own timeouts.
+"""
+import logging
+import collections
+
+from .packet import COMM_SUCCESS, status_length
+from .servode import BAUDRATE_PERM, BAUDRATE_TEMP
+from .transport import byte_time
+
+log = logging.getLogger('servode')
+
+# the AX-12 default, then the MX default and the common rates between
+DEFAULT_BAUD_RATES = (BAUDRATE_PERM, BAUDRATE_TEMP, 115200, 57600)
+MAX_SERVO_ID = 252
+# the longest return delay a servo can be set to, 254 * 2 usec
+MAX_RETURN_DELAY = 0.000508
+# allowance for the adapter and host scheduling
+SCAN_LATENCY = 0.001
+# READ_DATA instruction packet length
+READ_PACKET_LEN = 8
+
+Found = collections.namedtuple(
+    'Found', ['servo_id', 'baud_rate', 'model_number', 'firmware_version'])
+Found.__doc__ = """
+A servo found by `scan`, and the baud rate it answered at.
+"""
+
+
+def probe_timeout(baud_rate, param_count=3, return_delay=MAX_RETURN_DELAY,
+                  latency=SCAN_LATENCY):
+    """
+    :return: the seconds to wait for the status of a READ_DATA of
+        `param_count` bytes at `baud_rate`
+    """
+    wire = (READ_PACKET_LEN + status_length(param_count)) * byte_time(
+        baud_rate)
+    return wire + return_delay + latency
+
+
+def scan(sp, servo_ids=None, baud_rates=DEFAULT_BAUD_RATES,
+         return_delay=MAX_RETURN_DELAY, latency=SCAN_LATENCY):
+    """
+    Find the servos on a bus. The host is returned to its baud rate
+    afterwards.
+
+    :param sp: an open ServoProtocol
+    :param servo_ids: the IDs to probe, 0 to 252 by default
+    :param baud_rates: the rates to search, in order. A servo found at one
+        rate is not probed at the next.
+    :param return_delay: the longest return delay of any servo, in seconds
+    :param latency: the allowance added to every probe timeout
+    :return: a list of Found, by servo ID
+    """
+    if servo_ids is None:
+        servo_ids = range(MAX_SERVO_ID + 1)
+    first = sp.registers['model_number']
+    regs = sp.registers.span(first, 2)
+    length = regs[-1].end - first.address
+
+    backend = sp.backend
+    host_rate = sp.baud_rate
+    found = dict()
+    try:
+        for baud_rate in baud_rates:
+            if not backend.set_baud_rate(baud_rate):
+                log.warning("[scan] baud_rate:{0} not supported, "
+                            "skipped".format(baud_rate))
+                continue
+            backend.set_packet_timeout(probe_timeout(
+                baud_rate, length, return_delay, latency))
+            for sid in servo_ids:
+                if sid in found:
+                    continue
+                with sp.lock:
+                    status = backend.read(sid, first.address, length)
+                    if not status.has_params:
+                        continue
+                    params = status.params
+                    found[sid] = Found(
+                        sid, baud_rate,
+                        *[reg.decode(params, reg.address - first.address)
+                          for reg in regs])
+                log.debug("[scan] found {0}".format(found[sid]))
+    finally:
+        backend.set_packet_timeout(None)
+        backend.set_baud_rate(host_rate)
+    log.info("[scan] device:{0} found {1} servos".format(
+        sp.device, len(found)))
+    return [found[sid] for sid in sorted(found)]
+
+
+def scan_pool(pool, servo_ids=None, baud_rates=DEFAULT_BAUD_RATES,
+              return_delay=MAX_RETURN_DELAY, latency=SCAN_LATENCY):
+    """
+    Scan every bus of a ServoBusPool at the same time.
+
+    :return: a dict of bus name to its list of Found
+    """
+    return pool.run(scan, servo_ids, baud_rates, return_delay, latency)
@@ -0,0 +1,265 @@
+"""
+Priority scheduling of bus transactions.
+
+A `BusScheduler` takes the place of the ServoProtocol lock. Instead of
+handing the bus to whichever thread asks first, it hands it to the waiting
+request with the highest priority class, first come first served within a
+class::
+
+    sp = ServoProtocol(lock=BusScheduler())
+    with sp.priority(EMERGENCY):
+        sg.write('torque_enable', 0)
+    with sp.priority(TELEMETRY, deadline=0.010):
+        sp.read_register(1, 'present_temperature')
+
+A request that is not granted before its deadline is dropped, raising
+`DeadlineExpired`, or with ``expired=DEFER`` demoted behind every other
+request and left waiting. The bus is never taken from a transaction that
+holds it, and a sweep holding it across many transactions, such as a group
+read, calls `handoff` between them to let a waiting request of a higher
+class go first. The worst wait of a request is thus the longest single
+transaction of a lower class plus the transactions of its own and higher
+classes.
+"""
+import time
+import heapq
+import itertools
+import threading
+import contextlib
+import collections
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# priority classes, lower runs first
+EMERGENCY = 0
+MOTION = 1
+TELEMETRY = 2
+DIAGNOSTICS = 3
+PRIORITY_NAMES = collections.OrderedDict([
+    (EMERGENCY, 'emergency'),
+    (MOTION, 'motion'),
+    (TELEMETRY, 'telemetry'),
+    (DIAGNOSTICS, 'diagnostics'),
+])
+DEFAULT_PRIORITY = MOTION
+# the class expired requests are deferred to
+DEFERRED = DIAGNOSTICS + 1
+
+# what happens to a request whose deadline passes before it gets the bus
+DROP = 'drop'
+DEFER = 'defer'
+
+
+class DeadlineExpired(IOError):
+    """
+    Raised when a request is dropped because its deadline passed before it
+    was granted the bus.
+    """
+
+
+class ClassStats(object):
+    """
+    Queue wait statistics of one priority class.
+    """
+    __slots__ = ('requests', 'waited', 'total_wait', 'max_wait', 'dropped',
+                 'deferred')
+
+    def __init__(self):
+        self.requests = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.dropped = 0
+        self.deferred = 0
+
+    def record(self, wait):
+        self.requests += 1
+        if wait > 0:
+            self.waited += 1
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    def as_dict(self):
+        return collections.OrderedDict([
+            ("requests", self.requests),
+            ("waited", self.waited),
+            ("mean_wait", self.total_wait / self.requests
+                if self.requests else 0.0),
+            ("max_wait", self.max_wait),
+            ("dropped", self.dropped),
+            ("deferred", self.deferred),
+        ])
+
+
+class BusScheduler(object):
+    """
+    A reentrant, priority ordered lock for a servo bus. Entering it with
+    ``with`` uses the priority, deadline and expiry policy set for the
+    calling thread by `using`.
+    """
+
+    def __init__(self):
+        super(BusScheduler, self).__init__()
+        self._cond = threading.Condition(threading.Lock())
+        self._owner = None
+        self._depth = 0
+        self._priority = None
+        self._waiting = list()
+        self._seq = itertools.count()
+        self._local = threading.local()
+        self._stats = dict(
+            (priority, ClassStats()) for priority in PRIORITY_NAMES)
+
+    def __enter__(self):
+        self.acquire(*self.current())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    @contextlib.contextmanager
+    def using(self, priority, deadline=None, expired=DROP):
+        """
+        Set the priority class of every request the calling thread makes
+        inside the ``with`` block.
+
+        :param priority: EMERGENCY, MOTION, TELEMETRY or DIAGNOSTICS
+        :param deadline: the most seconds each request may wait for the bus
+        :param expired: DROP to raise DeadlineExpired when the deadline
+            passes, DEFER to keep waiting behind every other request
+        """
+        local = self._local
+        saved = self.current()
+        local.priority, local.deadline, local.expired = (
+            priority, deadline, expired)
+        try:
+            yield self
+        finally:
+            local.priority, local.deadline, local.expired = saved
+
+    def current(self):
+        """
+        :return: the (priority, deadline, expired) set for the calling thread
+            by `using`, to carry over to another thread
+        """
+        local = self._local
+        return (getattr(local, 'priority', DEFAULT_PRIORITY),
+                getattr(local, 'deadline', None),
+                getattr(local, 'expired', DROP))
+
+    @property
+    def queued(self):
+        """
+        The number of requests waiting for the bus.
+        """
+        return len(self._waiting)
+
+    def _class_stats(self, priority):
+        stats = self._stats.get(priority)
+        if stats is None:
+            stats = self._stats[priority] = ClassStats()
+        return stats
+
+    def _grant(self, me, priority, start):
+        self._owner = me
+        self._depth = 1
+        self._priority = priority
+        self._class_stats(priority).record(_monotonic() - start)
+
+    def acquire(self, priority=DEFAULT_PRIORITY, deadline=None,
+                expired=DROP):
+        """
+        Wait for the bus.
+
+        :param priority: the priority class of the request
+        :param deadline: the most seconds to wait, None to wait forever
+        :param expired: DROP or DEFER, see `using`
+        :raise DeadlineExpired: when dropped
+        """
+        me = threading.current_thread()
+        start = _monotonic()
+        with self._cond:
+            if self._owner is me:
+                self._depth += 1
+                return True
+            if self._owner is None and not self._waiting:
+                self._grant(me, priority, start)
+                return True
+
+            ticket = [priority, next(self._seq)]
+            heapq.heappush(self._waiting, ticket)
+            expires = None if deadline is None else start + deadline
+            while True:
+                if self._owner is None and self._waiting[0] is ticket:
+                    heapq.heappop(self._waiting)
+                    self._grant(me, priority, start)
+                    return True
+                timeout = None
+                if expires is not None:
+                    timeout = expires - _monotonic()
+                    if timeout <= 0:
+                        self._waiting.remove(ticket)
+                        if expired == DEFER:
+                            self._class_stats(priority).deferred += 1
+                            ticket[0] = DEFERRED
+                            heapq.heapify(self._waiting)
+                            heapq.heappush(self._waiting, ticket)
+                            expires = None
+                            timeout = None
+                        else:
+                            heapq.heapify(self._waiting)
+                            self._class_stats(priority).dropped += 1
+                            self._cond.notify_all()
+                            raise DeadlineExpired(
+                                "[BusScheduler] {0} request dropped after "
+                                "{1:.4f}s".format(
+                                    PRIORITY_NAMES.get(priority, priority),
+                                    deadline))
+                self._cond.wait(timeout)
+
+    def handoff(self):
+        """
+        Between two transactions of a longer hold of the bus, give it up to
+        the waiting requests of a higher priority class than the holder's,
+        then wait for it again at the holder's class.
+
+        :return: True if the bus was handed off
+        """
+        me = threading.current_thread()
+        with self._cond:
+            if self._owner is not me:
+                raise RuntimeError("[BusScheduler] handoff of unheld bus")
+            priority = self._priority
+            if not self._waiting or self._waiting[0][0] >= priority:
+                return False
+            depth = self._depth
+            self._owner = None
+            self._cond.notify_all()
+            ticket = [priority, next(self._seq)]
+            heapq.heappush(self._waiting, ticket)
+            while not (self._owner is None and self._waiting[0] is ticket):
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._owner = me
+            self._depth = depth
+            self._priority = priority
+            return True
+
+    def release(self):
+        with self._cond:
+            if self._owner is not threading.current_thread():
+                raise RuntimeError("[BusScheduler] release of unheld bus")
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._cond.notify_all()
+
+    def stats(self):
+        """
+        :return: a dict of priority class name to its queue wait statistics,
+            times in seconds
+        """
+        return collections.OrderedDict(
+            (name, self._stats[priority].as_dict())
+            for priority, name in PRIORITY_NAMES.items())
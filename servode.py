@@ -2,13 +2,21 @@
 
 from __future__ import print_function
 
-import time
 import logging
 import datetime
 import argparse
 import threading
+import contextlib
 import collections
-from .dynamixel_functions import *
+from .backends import create_backend
+from .cache import RegisterCache, ShadowRegisters
+from .clock import SYSTEM_CLOCK
+from .motion import MotionHandle
+from .registers import MODEL_TABLES, get_table
+from .scheduler import DIAGNOSTICS, DROP
+from .snapshot import warm_start
+from .subscriptions import SubscriptionHub
+from .packet import COMM_SUCCESS, COMM_TX_FAIL, comm_result_text
 
 __version__ = '0.1.0'
 
@@ -32,236 +40,9 @@ OFF = 0
 # ex) Windows: "COM1"   Linux: "/dev/ttyUSB0"
 DEVICENAME = "/dev/ttyUSB0".encode('utf-8')
 
-COMM_SUCCESS = 0  # Communication Success result value
-COMM_TX_FAIL = -1001  # Communication Tx Failed
-
-# Dynamixel control table addresses
-dxl_control = {
-    "model_number": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 0,
-        "comm_bytes": 2,
-        "access": "r"
-    },
-    "firmware_version": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 2,
-        "comm_bytes": 1,
-        "access": "r"
-    },
-    "ID": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 3,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "baud_rate": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 4,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "return_delay": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 5,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "cw_angle_limit": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 6,
-        "comm_bytes": 2,
-        "access": "rw"
-    },
-    "ccw_angle_limit": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 8,
-        "comm_bytes": 2,
-        "access": "rw"
-    },
-    "highest_limit_temperature": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 11,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "lowest_limit_voltage": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 12,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "highest_limit_voltage": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 13,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "max_torque": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 14,
-        "comm_bytes": 2,
-        "access": "rw"
-    },
-    "status_return_level": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 16,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "alarm_LED": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 17,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "alarm_shutdown": {
-        "addr_type": "EEPROM",
-        "volatile": False,
-        "address": 18,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "torque_enable": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 24,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "LED": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 25,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "cw_compliance_margin": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 26,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "ccw_compliance_margin": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 27,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "cw_compliance_slope": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 28,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "ccw_compliance_slope": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 29,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "goal_position": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 30,
-        "comm_bytes": 2,
-        "access": "rw"
-    },
-    "moving_speed": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 32,
-        "comm_bytes": 2,
-        "access": "rw"
-    },
-    "torque_limit": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 34,
-        "comm_bytes": 2,
-        "access": "rw"
-    },
-    "present_position": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 36,
-        "comm_bytes": 2,
-        "access": "r"
-    },
-    "present_speed": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 38,
-        "comm_bytes": 2,
-        "access": "r"
-    },
-    "present_load": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 40,
-        "comm_bytes": 2,
-        "access": "r"
-    },
-    "present_voltage": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 42,
-        "comm_bytes": 1,
-        "access": "r"
-    },
-    "present_temperature": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 43,
-        "comm_bytes": 1,
-        "access": "r"
-    },
-    "registered_instruction": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 44,
-        "comm_bytes": 1,
-        "access": "r"
-    },
-    "moving": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 46,
-        "comm_bytes": 1,
-        "access": "r"
-    },
-    "lock": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 47,
-        "comm_bytes": 1,
-        "access": "rw"
-    },
-    "punch": {
-        "addr_type": "RAM",
-        "volatile": True,
-        "address": 48,
-        "comm_bytes": 2,
-        "access": "rw"
-    }
-}
+# Dynamixel control table addresses, in the form of a dict of dicts. The
+# compiled table used on the bus path is `registers.get_table(AX_12_TYPE)`.
+dxl_control = get_table(AX_12_TYPE).as_dict()
 
 
 class Servo(object):
@@ -338,21 +119,55 @@ class Servo(object):
         if (0 <= new_id <= 252) is False:
             raise ValueError("Invalid new_id value:{0}".format(new_id))
         self.sp.write_register(self.servo_id, "ID", new_id)
+        self.sp.invalidate(self.servo_id)
+        self.sp.invalidate(new_id)
         log.info("[new_id] servo_id:{0} given new_id value:{1}".format(
             self.servo_id, new_id))
         self.servo_id = new_id
 
-    def read(self, register):
-        result = self.sp.read_register(self.servo_id, register)
+    def read(self, register, max_age=None):
+        """
+        :param register: the name of the register to read
+        :param max_age: the oldest cached value in seconds to accept, 0 to
+            always read from the servo
+        :return: the value of the register
+        """
+        result = self.sp.read_register(self.servo_id, register, max_age)
         # self._fill_status(result)
         if self.read_cache is not None:
             self.read_cache[register] = result['value']
         return result['value']
 
-    def write(self, register, value):
-        result = self.sp.write_register(self.servo_id, register, value)
+    def read_many(self, registers):
+        """
+        Read several registers with as few transactions as possible.
+
+        :param registers: the names of the registers to read
+        :return: a dict of register name to value, in the order given
+        """
+        result = self.sp.read_registers(self.servo_id, registers)
+        if self.read_cache is not None:
+            self.read_cache.update(result['values'])
+        return result['values']
+
+    def write(self, register, value, force=False):
+        """
+        :param force: write even if the shadow register file shows the servo
+            already holds `value`
+        """
+        result = self.sp.write_register(self.servo_id, register, value, force)
         # self._fill_status(result)
 
+    def subscribe(self, register, callback=None, queue=None, **trigger):
+        """
+        Be notified of changes of a register of this servo, see
+        `subscriptions.SubscriptionHub.subscribe` for the triggers.
+
+        :return: a Subscription
+        """
+        return self.sp.subscriptions.subscribe(
+            [self.servo_id], register, callback, queue, **trigger)
+
     def __getitem__(self, name):
         return self.read(name)
 
@@ -371,6 +186,10 @@ class ServoGroup(object):
         super(ServoGroup, self).__init__()
         self.servos = collections.OrderedDict()
         self._wheel_mode = False
+        # (ServoProtocol, register, servo ids): SyncWritePlan
+        self._write_plans = dict()
+        # (registers, ((ServoProtocol, servo ids), ...)): GroupReadPlan
+        self._read_plans = dict()
 
     def __len__(self):
         return len(self.servos)
@@ -407,6 +226,65 @@ class ServoGroup(object):
             ids.append(self.servos[key].servo_id)
         return ids
 
+    def _buses(self, count=None):
+        """
+        :param count: the number of servos to take, in group order
+        :return: a list of (ServoProtocol, [(group index, servo id), ...])
+            for every bus the servos are on, in order of first appearance
+        """
+        buses = collections.OrderedDict()
+        for i, key in enumerate(self.servos):
+            if count is not None and i >= count:
+                break
+            servo = self.servos[key]
+            buses.setdefault(servo.sp, list()).append((i, servo.servo_id))
+        return list(buses.items())
+
+    def _single_bus(self, caller):
+        """
+        :param caller: the name to report errors under
+        :return: the ServoProtocol all servos of the group are on
+        :raise ValueError: when the servos are on several buses
+        """
+        buses = self._buses()
+        if len(buses) > 1:
+            raise ValueError(
+                "[{0}] the group spans {1} buses, use one group per "
+                "bus".format(caller, len(buses)))
+        return self._get_sp()
+
+    @staticmethod
+    def _fan_out(calls):
+        """
+        Run one (ServoProtocol, fn, args) call per bus, at the same time on
+        the buses that have a worker.
+
+        :return: the list of results, in call order
+        """
+        if len(calls) == 1:
+            sp, fn, args = calls[0]
+            return [fn(*args)]
+        # the priority class of the caller is per thread, carry it over to
+        # the workers
+        jobs = [sp.executor.submit(sp.bind_priority(fn), *args)
+                if sp.executor is not None else None
+                for sp, fn, args in calls]
+        return [fn(*args) if job is None else job.result()
+                for job, (sp, fn, args) in zip(jobs, calls)]
+
+    def subscribe(self, register, callback=None, queue=None, **trigger):
+        """
+        Be notified of changes of a register on every servo in the group,
+        see `subscriptions.SubscriptionHub.subscribe` for the triggers. The
+        changes of all servos in one sample arrive together.
+
+        :return: a Subscription
+        :raise ValueError: when the servos are on several buses
+        """
+        sp = self._single_bus('ServoGroup.subscribe')
+        return sp.subscriptions.subscribe(
+            self.servo_ids, register, callback, queue, **trigger)
+
     def wheel_mode(self, enable=True):
         if self._wheel_mode == enable:
             return
@@ -445,57 +323,153 @@ class ServoGroup(object):
         log.info("[ServoGroup.wheel_speed] wrote speed value:{0}".format(
             set_speed))
 
-    def write(self, register, value):
+    def write(self, register, value, force=False):
         """
         Write the value into the register on all the servos in the group.
 
         :param register: the register to write
         :param value: the value to write to the register
+        :param force: write to every servo even if the shadow register file
+            shows it already holds `value`
         :return: True if success, False if not
         """
         log.debug(
             '[ServoGroup.write] register:{0} value:{1} servo count:{2}'.format(
                 register, value, len(self)))
-        sp = self._get_sp()
-        return sp.sync_write(
-            register=register,
-            value=value,
-            servo_list=self.servo_ids
-        )
+        return all(self._fan_out([
+            (sp, sp.sync_write,
+             (register, value, [sid for i, sid in servos], force))
+            for sp, servos in self._buses()
+        ]))
 
-    def write_values(self, register, values):
+    def write_values(self, register, values, force=False):
         """
         Write the list of values to the register on every servo in the
-        ServoGroup.
+        ServoGroup, with one SYNC_WRITE instruction.
         Note: the length of the values list should equal the length of the
         ServoGroup
 
         :param register:
         :param values: the list of values to write in servo order
-        :return: None
+        :param force: write to every servo even if the shadow register file
+            shows it already holds its value
+        :return: True if success, False if not
         """
-        t = 0
         log.debug(
             '[ServoGroup.write_values] len(self):{0} len(values):{1}'.format(
                 len(self), len(values)))
 
-        for servo in self.servos.values():
-            if t < min(len(self), len(values)):
-                log.info(
-                    "[ServoGroup.write_values] servo:{0} values[{1}]:{2}".format(
-                        servo, t, values[t]
-                    ))
-                servo.write(register, values[t])
-            else:
-                log.warn(
-                    "[ServoGroup.write_values] more group members than values.")
-            t += 1
+        count = min(len(self), len(values))
+        if len(self) > len(values):
+            log.warn(
+                "[ServoGroup.write_values] more group members than values.")
+
+        log.debug("[ServoGroup.write_values] servo_ids:{0} values:{1}".format(
+            self.servo_ids[:count], values[:count]))
+        calls = list()
+        for sp, servos in self._buses(count):
+            servo_ids = [sid for i, sid in servos]
+            key = (sp, register, tuple(servo_ids))
+            plan = self._write_plans.get(key)
+            if plan is None:
+                plan = sp.prepare_sync_write(register, servo_ids)
+                self._write_plans[key] = plan
+            calls.append((sp, plan.run,
+                          ([values[i] for i, sid in servos], force)))
+        return all(self._fan_out(calls))
+
+    def read(self, register):
+        """
+        Read a register on every servo in the group, with one prepared
+        read per bus.
+
+        :param register: the name of the register to read
+        :return: the list of values in servo order, None where a read failed
+        """
+        return self._read_plan([register]).run()
+
+    def warm_start(self, path):
+        """
+        Load and check the EEPROM snapshot of every bus the group spans, or
+        read the servos of a bus in full when its snapshot does not match.
+        See `ServoProtocol.warm_start`.
+
+        :param path: the snapshot file. A group that spans several buses
+            needs a '{device}' placeholder in it, filled with the device
+            name of each bus with '/' replaced by '_'.
+        :return: the list of Snapshots, one per bus
+        """
+        buses = self._buses()
+        if len(buses) > 1 and '{device}' not in path:
+            raise ValueError("[ServoGroup.warm_start] path:{0} needs a "
+                             "'{{device}}' placeholder for {1} buses".format(
+                                 path, len(buses)))
+        calls = list()
+        for sp, servos in buses:
+            device = sp.device.decode('utf-8').strip('/').replace('/', '_')
+            calls.append((sp, sp.warm_start, (
+                path.format(device=device), [sid for i, sid in servos])))
+        return self._fan_out(calls)
+
+    def _read_plan(self, registers, count=None):
+        buses = self._buses(count)
+        key = (tuple(registers), tuple(
+            (sp, tuple(sid for i, sid in servos)) for sp, servos in buses))
+        plan = self._read_plans.get(key)
+        if plan is None:
+            plan = GroupReadPlan(buses, registers)
+            self._read_plans[key] = plan
+        return plan
+
+    def write_block(self, register_values, force=False):
+        """
+        Write several contiguous registers on every servo in the group with
+        one SYNC_WRITE instruction, e.g.::
+
+            sg.write_block({
+                'goal_position': [100, 200, 300],
+                'moving_speed': [50, 50, 100],
+            })
+
+        :param register_values: a dict of register to the list of values to
+            write in servo order. The registers must follow each other in
+            the control table without gaps.
+        :param force: write to every servo even if the shadow register file
+            shows it already holds its values
+        :return: True if success, False if not
+        """
+        sp = self._get_sp()
+        regs = sorted((sp.registers[r] for r in register_values),
+                      key=lambda reg: reg.address)
+        if sp.registers.span(regs[0], len(regs)) != regs:
+            raise ValueError(
+                "[ServoGroup.write_block] registers:{0} are not "
+                "contiguous".format([reg.name for reg in regs]))
+        columns = [register_values[r.name] if r.name in register_values
+                   else register_values[r] for r in regs]
+        for reg, column in zip(regs, columns):
+            if len(column) != len(self):
+                raise ValueError(
+                    "[ServoGroup.write_block] register:'{0}' has {1} values "
+                    "for {2} servos".format(reg.name, len(column), len(self)))
+
+        calls = list()
+        for bus, servos in self._buses():
+            rows = [(sid, [column[i] for column in columns])
+                    for i, sid in servos]
+            calls.append(
+                (bus, bus.sync_write_block, (regs[0].name, rows, force)))
+        return all(self._fan_out(calls))
 
     def goal_position(self, goal_positions,
                       block=False,
                       should_run=None,
-                      margin=POSITION_MARGIN):
+                      margin=POSITION_MARGIN,
+                      timeout=None,
+                      background=False):
         """
+        Move every servo to its goal position and watch for the move to
+        complete, see `motion.MotionHandle`.
 
         :param goal_positions: the list of goal position values to write in
             servo order
@@ -503,51 +477,27 @@ class ServoGroup(object):
             `margin` of the goal position. Block until validation occurs.
         :param should_run: `threading.Event` used to interrupt block if
             necessary, will be cleared when goal position is met.
-        :param margin:
-        :return:
+        :param margin: the distance from the goal that counts as arrived
+        :param timeout: the most seconds to watch the move
+        :param background: watch the move on a background thread
+        :return: a MotionHandle
         """
-        log.info("[goal_position] requested positions:{0}".format(
+        log.debug("[goal_position] requested positions:{0}".format(
             goal_positions))
 
         self.write_values('goal_position', goal_positions)
 
-        event = should_run
-        if block is True and event is None:
-            log.info("[goal_position] using local event")
-            event = threading.Event()
-            event.clear()
-            event.set()
+        count = len(goal_positions)
+        handle = MotionHandle(
+            self._get_sp(), self.servo_ids[:count], goal_positions, margin,
+            timeout=timeout, should_run=should_run, group=self,
+            plan=self._read_plan(['present_position', 'moving'], count))
 
         if block:
-            while event.is_set():
-                close = dict()
-                i = 0
-                for servo in self.servos:
-                    s = self.servos[servo]
-                    pos = s['present_position']
-                    goal = goal_positions[i]
-                    log.debug(
-                        "[goal_position] 'present_position' id:{0} is:{1}".format(
-                            s.servo_id, pos))
-
-                    horseshoes = margin + goal
-                    hand_grenades = goal - margin
-                    if hand_grenades < 0:
-                        hand_grenades = 0
-
-                    # we are close enough when servo position is between
-                    # horseshoes and hand grenades
-                    if horseshoes > pos > hand_grenades:
-                        close[servo] = pos
-                    i += 1
-
-                if len(close) == len(self.servos):
-                    # all servos close when the dict has a value per servo
-                    event.clear()
-
-                log.info("[goal_position] actual close positions:{0}".format(
-                    close))
-                time.sleep(0.5)
+            handle.wait()
+        elif background:
+            handle.start()
+        return handle
 
 
 class ServoProtocol(object):
@@ -584,19 +534,55 @@ class ServoProtocol(object):
         log.debug("[result_to_status] status:{0}".format(status))
         return status
 
+    def _check_status(self, method, status):
+        """
+        Log the communication result and error bits of a transaction.
+
+        :return: the dict of status bit states, empty when no error occurred
+        """
+        if status.comm_result != COMM_SUCCESS:
+            log.error("[{0}] Comm unsuccessful:{1}".format(
+                method, comm_result_text(status.comm_result)))
+
+        # Comms might be successful but we could still be in an error
+        # state. So, check for error packet after every transaction
+        if status.error:
+            log.error("[{0}] Error:{1}".format(method, status.error))
+            return self._result_to_status(status.error)
+        return {}
+
     def __init__(self, baud_rate=BAUDRATE_PERM, manufacturer=ROBOTIS,
                  servo_type=AX_12_TYPE, protocol_version=PROTOCOL_V,
-                 lock=threading.Lock()):
+                 lock=None, device=DEVICENAME, backend=None,
+                 clock=None, cache=None, shadow=None, **backend_options):
         """
 
         :param baud_rate:
         :param manufacturer:
         :param servo_type:
         :param protocol_version:
+        :param lock: the lock serialising transactions, or a
+            `scheduler.BusScheduler` to grant the bus by priority class, see
+            `priority`. A new lock per instance by default.
+        :param device: the path of the port the servo bus is connected to
+        :param backend: the name of a registered bus backend or a Backend
+            instance. Defaults to the ``SERVODE_BACKEND`` environment variable
+            and then the ROBOTIS SDK.
+        :param clock: the clock used for every sleep and timeout,
+            `clock.SYSTEM_CLOCK` by default. Pass a `clock.VirtualClock` with
+            the 'emulator' backend to run faster than real time.
+        :param cache: a `cache.RegisterCache` serving `read_register` and
+            `read_registers`, or True to create one on `clock`. Disabled
+            by default.
+        :param shadow: a `cache.ShadowRegisters`, or True to create one, used
+            to skip writes of values the servos already hold. Disabled by
+            default.
+        :param backend_options: extra keyword arguments for the backend
         """
         super(ServoProtocol, self).__init__()
-        if servo_type == AX_12_TYPE:
+        if servo_type in MODEL_TABLES:
             self.servo_type = servo_type
+            self.registers = get_table(servo_type)
         else:
             raise NotImplementedError("servo_type:{0} not understood.".format(
                 servo_type))
@@ -606,24 +592,46 @@ class ServoProtocol(object):
             raise NotImplementedError("protocol_version:{0} not supported.".format(
                 protocol_version))
 
+        if lock is None:
+            lock = threading.Lock()
         self.lock = lock
+        # the pool.BusWorker running this bus's share of ServoGroup calls
+        # that span several buses, set by pool.ServoBusPool
+        self.executor = None
         self.baud_rate = baud_rate
         self.manufacturer = manufacturer
-        self.port_num = portHandler(DEVICENAME)
-        packetHandler()  # Initialize PacketHandler Structs
+        if not isinstance(device, bytes):
+            device = device.encode('utf-8')
+        self.device = device
+        self.clock = clock or SYSTEM_CLOCK
+        if cache is True:
+            cache = RegisterCache(clock=self.clock)
+        elif cache is False:
+            cache = None
+        self.cache = cache
+        if shadow is True:
+            shadow = ShadowRegisters()
+        elif shadow is False:
+            shadow = None
+        self.shadow = shadow
+        self._subscriptions = None
+        self.backend = create_backend(
+            backend, device=device, baud_rate=baud_rate,
+            protocol_version=protocol_version, clock=self.clock,
+            **backend_options)
 
     def __enter__(self):
         log.debug("[ServoProtocol.__enter__] Connection information")
 
         # Open port
-        if openPort(self.port_num):
+        if self.backend.open():
             log.debug("[ServoProtocol.__enter__] opened port:{0}".format(
-                self.port_num))
+                self.device))
         else:
             raise IOError("[ServoProtocol.__enter__] Failed to open the port!")
 
         # Set port baudrate to PERM
-        if setBaudRate(self.port_num, self.baud_rate):
+        if self.backend.set_baud_rate(self.baud_rate):
             log.debug("[ServoProtocol.__enter__] Set baud rate to: {0}".format(
                 self.baud_rate))
         else:
@@ -635,9 +643,132 @@ class ServoProtocol(object):
 
     def __exit__(self, exc_type, exc_value, traceback):
         log.debug("[ServoProtocol.__exit__] closing dxl port")
-        closePort(self.port_num)
+        if self._subscriptions is not None:
+            self._subscriptions.stop()
+        self.backend.close()
         # self.lock.release()
 
+    def priority(self, priority, deadline=None, expired=DROP):
+        """
+        Run the transactions the calling thread makes inside the ``with``
+        block at a priority class, when the lock is a
+        `scheduler.BusScheduler`. With any other lock this does nothing.
+
+        :param priority: a `scheduler` priority class
+        :param deadline: the most seconds each transaction may wait for the
+            bus
+        :param expired: `scheduler.DROP` or `scheduler.DEFER`
+        """
+        using = getattr(self.lock, 'using', None)
+        if using is None:
+            return _no_priority()
+        return using(priority, deadline, expired)
+
+    def handoff(self):
+        """
+        Between two transactions of a longer hold of the bus lock, let the
+        waiting requests of a higher priority class go first, when the lock
+        is a `scheduler.BusScheduler`. With any other lock this does nothing.
+        """
+        handoff = getattr(self.lock, 'handoff', None)
+        if handoff is not None:
+            handoff()
+
+    def bind_priority(self, fn):
+        """
+        :return: `fn` wrapped to run at the priority class, deadline and
+            expiry policy the calling thread has on this bus, to hand it to
+            another thread. `fn` itself when the lock is not a
+            `scheduler.BusScheduler`.
+        """
+        current = getattr(self.lock, 'current', None)
+        if current is None:
+            return fn
+        settings = current()
+
+        def bound(*args, **kwargs):
+            with self.lock.using(*settings):
+                return fn(*args, **kwargs)
+        return bound
+
+    @property
+    def subscriptions(self):
+        """
+        The SubscriptionHub shared by every subscription on this bus.
+        """
+        if self._subscriptions is None:
+            self._subscriptions = SubscriptionHub(self)
+        return self._subscriptions
+
+    def invalidate(self, servo=None, register=None):
+        """
+        Drop cached register values.
+
+        :param servo: the servo or servo id, None for every servo
+        :param register: the register name or Register, None for every
+            register
+        """
+        if isinstance(servo, Servo):
+            servo = servo.servo_id
+        for store in (self.cache, self.shadow):
+            if store is None:
+                continue
+            if register is None:
+                store.invalidate(servo)
+            else:
+                reg = self.registers[register]
+                store.invalidate(servo, reg.address, reg.size)
+
+    def warm_start(self, path, servo_ids=None):
+        """
+        Load the EEPROM snapshot of this bus from `path` and check it with
+        one READ_DATA of the EEPROM area per servo. When the file is missing
+        or damaged, or any value on any servo differs, read the EEPROM of
+        every servo and save a new snapshot. Either way the values are put
+        in the cache and shadow register file.
+
+        :param path: the snapshot file
+        :param servo_ids: the servos expected on the bus, those of the
+            snapshot when None
+        :return: a `snapshot.Snapshot`, with `warm` False after a full read
+        """
+        return warm_start(self, path, servo_ids)
+
+    def _written(self, sids, address, length):
+        if self.cache is None:
+            return
+        for sid in sids:
+            self.cache.invalidate(sid, address, length)
+
+    def _shadow_written(self, items, regs, ok):
+        """
+        Bring the shadow register file up to date after a write.
+
+        :param items: a list of (servo_id, values) with one value per register
+        :param ok: False when the servos may not hold the values written
+        """
+        shadow = self.shadow
+        if shadow is None:
+            return
+        for sid, values in items:
+            for reg, value in zip(regs, values):
+                if ok:
+                    shadow.put(sid, reg, value)
+                else:
+                    shadow.invalidate(sid, reg.address, reg.size)
+
+    def _unchanged(self, sid, regs, values, force):
+        """
+        :return: True if the shadow register file shows the servo already
+            holds every value
+        """
+        if force or self.shadow is None:
+            return False
+        for reg, value in zip(regs, values):
+            if not self.shadow.unchanged(sid, reg, value):
+                return False
+        return True
+
     def factory_reset(self, servo):
         """
 
@@ -650,31 +781,25 @@ class ServoProtocol(object):
             sid = servo
 
         log.debug("[factory_reset] Try reset:{0}".format(sid))
-        factoryReset(self.port_num, self.protocol_version, sid, 0x00)
         with self.lock:
-            last_result = getLastTxRxResult(
-                self.port_num, self.protocol_version)
-            if last_result != COMM_SUCCESS:
+            status = self.backend.factory_reset(sid)
+            if status.comm_result != COMM_SUCCESS:
                 log.error("[factory_reset] Aborted")
-                printTxRxResult(self.protocol_version, last_result)
-
-            error_result = getLastRxPacketError(
-                self.port_num, self.protocol_version)
-            if error_result:
-                self._result_to_status(error_result)
-                printRxPacketError(self.protocol_version, error_result)
-                log.error("[factory_reset] Error:{0}".format(error_result))
+            self._check_status('factory_reset', status)
+        # the servo comes back with ID 1 and the default control table
+        self.invalidate(sid)
+        self.invalidate(1)
 
         # Wait for reset
         log.debug("[factory_reset] Wait for reset...")
-        time.sleep(1)
+        self.clock.sleep(1)
         log.debug("[factory_reset] Reset complete.")
 
     def ping(self, servo):
         """
 
         :param servo: the servo or servo id to be pinged
-        :return: None
+        :return: the model number of the servo
         """
         if isinstance(servo, Servo):
             sid = servo.servo_id
@@ -682,38 +807,75 @@ class ServoProtocol(object):
             sid = servo
 
         with self.lock:
-            dxl_model_number = pingGetModelNum(
-                self.port_num, self.protocol_version, sid)
+            status = self.backend.ping(sid)
+            self._check_status('ping', status)
+            # the status points into the transport's receive buffer, decode
+            # it before the next transaction can reuse that
+            if status.comm_result != COMM_SUCCESS:
+                return 0
+            return status.value
+
+    def read_register(self, servo, register, max_age=None):
+        """
+
+        :param servo: a Servo object or an integer servo_id
+        :param register: the register name or Register from which to read a
+            value
+        :param max_age: the oldest cached value in seconds to accept, 0 to
+            always read from the servo
+        :return: a dict containing:
+            { "value": <the value read from the register>,
+              "status": <a dict containing the status bit states>
+            }
+        """
+        result = {
+            "value": '',
+            "status": {}
+        }
 
-            last_result = getLastTxRxResult(self.port_num,
-                                                self.protocol_version)
-            if last_result != COMM_SUCCESS:
-                printTxRxResult(self.protocol_version, last_result)
-                log.error(
-                    "[ping] Communication unsuccessful:{0}".format(last_result))
+        if isinstance(servo, Servo):
+            sid = servo.servo_id
+        else:
+            sid = servo
 
-            error_result = getLastRxPacketError(
-                self.port_num, self.protocol_version)
-            if error_result:
-                self._result_to_status(error_result)
-                printRxPacketError(self.protocol_version, error_result)
-                log.error("[ping] Error:{0}".format(error_result))
+        reg = self.registers[register]
+        cache = self.cache
+        if cache is not None:
+            value = cache.get(sid, reg, max_age)
+            if value is not None:
+                result['value'] = value
+                return result
 
-        return dxl_model_number
+        with self.lock:
+            status = self.backend.read(sid, reg.address, reg.size)
+            result['status'] = self._check_status('read_register', status)
+            if status.has_params:
+                result['value'] = reg.decode(status.params)
+                if cache is not None:
+                    cache.put(sid, reg, result['value'])
+                if self.shadow is not None:
+                    self.shadow.put(sid, reg, result['value'])
+
+        return result
 
-    def read_register(self, servo, register):
+    def read_registers(self, servo, registers, max_age=None):
         """
+        Read several registers of one servo, coalescing registers that are
+        close in the control table into single range reads.
 
         :param servo: a Servo object or an integer servo_id
-        :param register: the register from which to read a value
+        :param registers: the names or Registers of the registers to read
+        :param max_age: the oldest cached value in seconds to accept, 0 to
+            always read from the servo
         :return: a dict containing:
-            { "value": <the value read from the register>,
+            { "values": <an OrderedDict of register name to value read>,
               "status": <a dict containing the status bit states>
             }
         """
-        value = ''
+        regs = [self.registers[r] for r in registers]
+        values = collections.OrderedDict((reg.name, '') for reg in regs)
         result = {
-            "value": value,
+            "values": values,
             "status": {}
         }
 
@@ -722,41 +884,46 @@ class ServoProtocol(object):
         else:
             sid = servo
 
-        with self.lock:
-            if dxl_control[register]['comm_bytes'] == 1:
-                value = read1ByteTxRx(
-                    self.port_num, self.protocol_version, sid,
-                    dxl_control[register]['address']
-                )
-            elif dxl_control[register]['comm_bytes'] == 2:
-                value = read2ByteTxRx(
-                    self.port_num, self.protocol_version, sid,
-                    dxl_control[register]['address']
-                )
-
-            last_result = getLastTxRxResult(
-                self.port_num, self.protocol_version
-            )
-            if last_result != COMM_SUCCESS:
-                printTxRxResult(self.protocol_version, last_result)
-                log.error("[read_register] Comm unsuccessful:{0}".format(
-                    last_result))
-
-            # Comms might be successful but we could still be in an error
-            # state. So, check for error packet after every read
-            error_result = getLastRxPacketError(
-                self.port_num, self.protocol_version)
-            if error_result:
-                result['status'] = self._result_to_status(error_result)
-                printRxPacketError(self.protocol_version, error_result)
-                log.error("[read_register] Error:{0}".format(error_result))
-            else:
-                log.debug(
-                    "[read_register] error_result:{0}".format(error_result))
+        cache = self.cache
+        if cache is not None:
+            missing = list()
+            for reg in regs:
+                value = cache.get(sid, reg, max_age)
+                if value is None:
+                    missing.append(reg)
+                else:
+                    values[reg.name] = value
+            regs = missing
 
-        result['value'] = value
+        plan = self.registers.plan_reads(regs)
+        with self.lock:
+            for index, (address, length, members) in enumerate(plan):
+                if index:
+                    self.handoff()
+                status = self.backend.read(sid, address, length)
+                result['status'].update(
+                    self._check_status('read_registers', status))
+                if not status.has_params:
+                    continue
+                for reg, offset in members:
+                    values[reg.name] = reg.decode(status.params, offset)
+                    if cache is not None:
+                        cache.put(sid, reg, values[reg.name])
+                    if self.shadow is not None:
+                        self.shadow.put(sid, reg, values[reg.name])
+
+        log.debug("[read_registers] servo id:{0} reads:{1}".format(
+            sid, len(plan)))
         return result
 
+    @property
+    def uses_bulk_read(self):
+        """
+        True when bulk reads go out as one BULK_READ instruction: the servos
+        have one and the backend can send it.
+        """
+        return self.servo_type != AX_12_TYPE and self.backend.has_bulk_read
+
     def bulk_read(self, read_blocks):
         """
 
@@ -777,78 +944,77 @@ class ServoProtocol(object):
                 ...
             ]
          }
+        AX-12 servos have no BULK_READ instruction, so for them, and on
+        backends that cannot send one, the blocks are read with `group_read`
+        instead.
         """
-        if self.servo_type == AX_12_TYPE and \
-                self.protocol_version == PROTOCOL_V:
-            raise NotImplementedError("AX-12 Servos do not support bulk_read.")
+        if not self.uses_bulk_read:
+            return self.group_read(read_blocks)
 
-        response = {"blocks": []}
-        group_num = groupBulkRead(self.port_num, self.protocol_version)
-        log.info("[bulk_read] read group_num:{0}".format(group_num))
-
-        for block in read_blocks['blocks']:
-            # loop through blocks to add each as a param to the bulk_read group
-            sid = block['servo_id']
-            register = block['register']
-            last_result = groupBulkReadAddParam(
-                group_num, sid,
-                dxl_control[register]['address'],
-                dxl_control[register]['comm_bytes']
-            )
-            if last_result != 1:
-                err = "[bulk_read] add read param fail on servo_id:{0}".format(
-                    sid
-                )
-                log.error(err)
-                raise IOError(err)
-
-        groupBulkReadTxRxPacket(group_num)
-        ts = datetime.datetime.now().isoformat()
-
-        last_result = getLastTxRxResult(self.port_num,
-                                            self.protocol_version)
-        if last_result != COMM_SUCCESS:
-            printTxRxResult(self.protocol_version, last_result)
-
-        for block in read_blocks['blocks']:
-            # loop through each block to see if the bulk result is available
-            sid = block['servo_id']
-            register = block['register']
-            last_result = groupBulkReadIsAvailable(
-                group_num, sid,
-                dxl_control[register]['address'],
-                dxl_control[register]['comm_bytes']
-            )
-            if last_result != 1:
-                err = "[bulk_read] bulk_read not available servo_id:{0}".format(
-                    sid
-                )
-                log.error(err)
-                raise IOError(err)
-
-        blocks = list()
-        for block in read_blocks['blocks']:
-            sid = block['servo_id']
-            register = block['register']
-            val = groupBulkReadGetData(
-                group_num, sid,
-                dxl_control[register]['address'],
-                dxl_control[register]['comm_bytes']
-            )
-            blocks.append({
-                "servo_id": sid, "register": register,
-                "value": val, "ts": ts
-            })
+        return BulkReadPlan(self, read_blocks, group=False).response(
+            strict=True)
 
-        response['blocks'] = blocks
-        return response
+    def group_read(self, read_blocks):
+        """
+        Read registers from many servos with back-to-back READ_DATA
+        transactions under a single hold of the bus lock. The registers of
+        each servo are coalesced into as few range reads as possible.
+        Failures are reported per block instead of raised.
+
+        :param read_blocks: blocks in the `bulk_read` format
+        :return: new read_blocks dict now with values included.
+        { "blocks": [
+            { "servo_id": sid, "register": register,
+                "value": value, "ts": timestamp,
+                "status": <a dict containing the status bit states>,
+                "error": <None or a description of the failure> },
+                ...
+            ]
+         }
+        """
+        return BulkReadPlan(self, read_blocks, group=True).response()
+
+    def prepare_bulk_read(self, read_blocks):
+        """
+        Compile `read_blocks` once into a plan that can be run repeatedly,
+        e.g. from a polling loop. The range reads, packets and result lists
+        are all built here, leaving only the transactions to each run::
+
+            plan = sp.prepare_bulk_read(read_blocks)
+            while polling:
+                positions = plan.run()
 
-    def write_register(self, servo, register, value):
+        :param read_blocks: blocks in the `bulk_read` format
+        :return: a BulkReadPlan
+        """
+        return BulkReadPlan(self, read_blocks)
+
+    def prepare_sync_write(self, register, servo_ids):
+        """
+        Compile a SYNC_WRITE of `register` on `servo_ids` once into a plan
+        that can be run repeatedly with new values::
+
+            plan = sp.prepare_sync_write('goal_position', [1, 2, 3])
+            plan.run([100, 200, 300])
+            plan = sp.prepare_sync_write(
+                ['goal_position', 'moving_speed'], [1, 2, 3])
+            plan.run([(100, 50), (200, 50), (300, 80)])
+
+        :param register: the register name or Register to write, or a list
+            of contiguous registers to write together
+        :param servo_ids: the servos or servo ids, in the order of the values
+        :return: a SyncWritePlan
+        """
+        return SyncWritePlan(self, register, servo_ids)
+
+    def write_register(self, servo, register, value, force=False):
         """
 
         :param servo: a Servo object or an integer servo_id
-        :param register: the register from which to read a value
+        :param register: the register name or Register to write
         :param value: the value to write to the register
+        :param force: write even if the shadow register file shows the servo
+            already holds `value`
         :return: a dict containing:
             { "error": <the error, if an error exists>,
               "status": <a dict containing the status bit states>
@@ -861,111 +1027,452 @@ class ServoProtocol(object):
         else:
             sid = servo
 
+        reg = self.registers[register]
         log.debug("[write_register] servo id:{0} reg:'{1}' reg_addr:{2}".format(
-            sid, register, dxl_control[register]['address']))
+            sid, reg.name, reg.address))
+
+        if not reg.writable:
+            raise IOError(
+                "register:'{0}' cannot be written".format(reg.name))
+
+        data = reg.encode(value)
+        if self._unchanged(sid, (reg,), (value,), force):
+            log.debug("[write_register] register:'{0}' unchanged".format(
+                reg.name))
+            return result
 
         with self.lock:
-            if dxl_control[register]['access'] == "r":
-                raise IOError(
-                    "register:'{0}' cannot be written".format(register))
-
-            if dxl_control[register]['comm_bytes'] == 1:
-                write1ByteTxRx(
-                    self.port_num, self.protocol_version, sid,
-                    dxl_control[register]['address'], value)
-            elif dxl_control[register]['comm_bytes'] == 2:
-                write2ByteTxRx(
-                    self.port_num, self.protocol_version, sid,
-                    dxl_control[register]['address'], value)
-
-            last_result = getLastTxRxResult(
-                self.port_num, self.protocol_version
-            )
-            if last_result != COMM_SUCCESS:
-                printTxRxResult(self.protocol_version, last_result)
-                log.error("[write_register] Comm unsuccessful:{0}".format(
-                    last_result))
-
-            # Comms might be successful but we could still be in an error
-            # state. So, check for error packet after every read
-            error_result = getLastRxPacketError(
-                self.port_num, self.protocol_version)
-            if error_result:
-                result['status'] = self._result_to_status(error_result)
-                printRxPacketError(self.protocol_version, error_result)
-                log.error("[write_register] Error:{0}".format(error_result))
-            else:
+            status = self.backend.write(sid, reg.address, data)
+            self._written((sid,), reg.address, reg.size)
+            self._shadow_written(
+                ((sid, (value,)),), (reg,),
+                status.comm_result == COMM_SUCCESS and not status.error)
+            result['status'] = self._check_status('write_register', status)
+            if not result['status']:
                 log.debug(
-                    "[write_register] register:'{0}' written".format(register))
+                    "[write_register] register:'{0}' written".format(reg.name))
 
         return result
 
-    def sync_write(self, register, value, servo_list):
+    def sync_write(self, register, value, servo_list=None, force=False):
         """
-        Write the same value to the same register, synchronously to every Servo
-        in the servo_list.
+        Write values to the same register, synchronously to every Servo in
+        the servo_list, in one SYNC_WRITE instruction without status replies.
+
+        :param register: the register name or Register to write
+        :param value: one value written to every servo, a sequence of values
+            in servo_list order, or a mapping of servo or servo id to value
+        :param servo_list: the servos or servo ids to write. May be omitted
+            when value is a mapping.
+        :param force: write to every servo even if the shadow register file
+            shows it already holds its value
+        :return: True if the instruction was sent, False if not
+        """
+        log.debug("[sync_write] reg:'{0}' value:{1}".format(register, value))
+        log.debug("[sync_write] servo_list:{0}".format(servo_list))
 
-        :param register:
-        :param value:
-        :param servo_list:
-        :return:
+        reg = self.registers[register]
+        items, written = self._sync_items(reg, value, servo_list, force)
+        if not items:
+            log.debug("[sync_write] reg:'{0}' unchanged".format(reg.name))
+            return True
+
+        with self.lock:
+            status = self.backend.sync_write(reg.address, reg.size, items)
+            self._written((sid for sid, _ in items), reg.address, reg.size)
+            self._shadow_written(
+                written, (reg,), status.comm_result == COMM_SUCCESS)
+
+            if status.comm_result != COMM_SUCCESS:
+                log.error("[sync_write] Comm unsuccessful:{0}".format(
+                    comm_result_text(status.comm_result)))
+                return False
+
+        return True
+
+    def _sync_items(self, reg, value, servo_list, force):
+        """
+        :return: (items, written) where items is the list of (servo_id,
+            data) to send and written the list of (servo_id, (value,)) for
+            the shadow register file
+        """
+        if not reg.writable:
+            raise IOError(
+                "register:'{0}' cannot be written".format(reg.name))
+
+        if hasattr(value, 'items'):
+            if servo_list is None:
+                pairs = list(value.items())
+            else:
+                pairs = [(servo, value[servo]) for servo in servo_list]
+        elif isinstance(value, (list, tuple)):
+            if servo_list is None or len(value) != len(servo_list):
+                raise ValueError(
+                    "[sync_write] {0} values for {1} servos".format(
+                        len(value), servo_list and len(servo_list)))
+            pairs = list(zip(servo_list, value))
+        else:
+            pairs = [(servo, value) for servo in servo_list]
+
+        items = list()
+        written = list()
+        for servo, val in pairs:
+            sid = getattr(servo, 'servo_id', servo)
+            if self._unchanged(sid, (reg,), (val,), force):
+                continue
+            items.append((sid, reg.encode(val)))
+            written.append((sid, (val,)))
+        return items, written
+
+    def sync_write_block(self, start_register, rows, force=False):
+        """
+        Write a contiguous span of registers, with different values for
+        every servo, in one SYNC_WRITE instruction.
+
+        :param start_register: the name or Register of the first register
+        :param rows: a mapping of servo or servo id to the list of values for
+            the registers from start_register on, or a list of
+            (servo, values). Every servo must have the same number of values.
+        :param force: write to every servo even if the shadow register file
+            shows it already holds its values
+        :return: True if the instruction was sent, False if not
         """
-        result = False
+        if hasattr(rows, 'items'):
+            rows = list(rows.items())
+        if not rows:
+            return True
+
+        count = len(rows[0][1])
+        regs = self.registers.span(start_register, count)
+        for reg in regs:
+            if not reg.writable:
+                raise IOError(
+                    "register:'{0}' cannot be written".format(reg.name))
+        address = regs[0].address
+        length = regs[-1].end - address
+
+        items = list()
+        written = list()
+        for servo, values in rows:
+            if len(values) != count:
+                raise ValueError(
+                    "[sync_write_block] servo:{0} has {1} values "
+                    "not {2}".format(servo, len(values), count))
+            sid = servo.servo_id if isinstance(servo, Servo) else servo
+            if self._unchanged(sid, regs, values, force):
+                continue
+            data = bytearray(length)
+            for reg, value in zip(regs, values):
+                reg.pack_into(data, reg.address - address, value)
+            items.append((sid, data))
+            written.append((sid, values))
+        if not items:
+            log.debug("[sync_write_block] registers unchanged")
+            return True
+
+        log.debug("[sync_write_block] registers:{0} servos:{1}".format(
+            [reg.name for reg in regs], len(items)))
         with self.lock:
-            group_num = groupSyncWrite(
-                self.port_num, self.protocol_version,
-                dxl_control[register]['address'],
-                dxl_control[register]['comm_bytes']
-            )
-            log.info("[sync_write] reg:'{0}' value:{1}".format(
-                register, value))
-            log.info("[sync_write] servo_list:{0}".format(servo_list))
+            status = self.backend.sync_write(address, length, items)
+            self._written((sid for sid, _ in items), address, length)
+            self._shadow_written(
+                written, regs, status.comm_result == COMM_SUCCESS)
 
-            for servo in servo_list:
-                if isinstance(servo, Servo):
-                    sid = servo.servo_id
-                else:
-                    sid = servo
-
-                add_parm = groupSyncWriteAddParam(
-                    group_num, sid,
-                    value,
-                    dxl_control[register]['comm_bytes']
-                )
-
-                if add_parm is False:
-                    log.error(
-                        "[sync_write] ERROR servo_id:{0} add register:{1}", sid)
-                    return False
-                else:
-                    log.debug("[sync_write] added param to sync write")
+            if status.comm_result != COMM_SUCCESS:
+                log.error("[sync_write_block] Comm unsuccessful:{0}".format(
+                    comm_result_text(status.comm_result)))
+                return False
+
+        return True
+
+
+@contextlib.contextmanager
+def _no_priority():
+    yield
+
+
+class BulkReadPlan(object):
+    """
+    A compiled bulk read, see `ServoProtocol.prepare_bulk_read`.
+
+    After each `run` the lists `values`, `status` and `errors` hold, in block
+    order, the value read, the dict of status bit states and None or a
+    description of the failure; `ts` holds the time of the run.
+    """
 
-            groupSyncWriteTxPacket(group_num)
+    def __init__(self, sp, read_blocks, group=None):
+        """
+
+        :param sp: the ServoProtocol to read with
+        :param read_blocks: blocks in the `bulk_read` format
+        :param group: True to read with back-to-back READ_DATA transactions,
+            False to use the backend's BULK_READ. By default servos are
+            read as a group when they have no BULK_READ instruction or the
+            backend cannot send one.
+        """
+        super(BulkReadPlan, self).__init__()
+        self.sp = sp
+        self.blocks = [
+            (block['servo_id'], block['register'],
+             sp.registers[block['register']])
+            for block in read_blocks['blocks']
+        ]
+        count = len(self.blocks)
+        self.values = [None] * count
+        self.status = [{}] * count
+        self.errors = [None] * count
+        self.ts = None
+
+        if group is None:
+            group = not sp.uses_bulk_read
+        self._bulk = None
+        self._reads = None
+        if group:
+            per_servo = collections.OrderedDict()
+            for index, (sid, _, reg) in enumerate(self.blocks):
+                per_servo.setdefault(sid, list()).append((index, reg))
+            self._reads = list()
+            for sid, wanted in per_servo.items():
+                plan = sp.registers.plan_reads(reg for _, reg in wanted)
+                for address, length, members in plan:
+                    offsets = dict(members)
+                    targets = [(index, reg, offsets[reg])
+                               for index, reg in wanted if reg in offsets]
+                    self._reads.append((
+                        sp.backend.prepare_read(sid, address, length),
+                        targets))
+        else:
+            self._bulk = sp.backend.prepare_bulk_read(
+                [(sid, reg.address, reg.size) for sid, _, reg in self.blocks])
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def _store(self, status, targets):
+        values, errors, bits = self.values, self.errors, self.status
+        state = self.sp._result_to_status(status.error) \
+            if status.error else {}
+        if not status.has_params:
+            if status.comm_result != COMM_SUCCESS:
+                error = comm_result_text(status.comm_result)
+            else:
+                error = "status without data, error:{0}".format(status.error)
+            for index, _, _ in targets:
+                values[index] = None
+                errors[index] = error
+                bits[index] = state
+            return
+        cache, shadow = self.sp.cache, self.sp.shadow
+        for index, reg, offset in targets:
+            sid = self.blocks[index][0]
+            values[index] = reg.decode(status.params, offset)
+            errors[index] = None
+            bits[index] = state
+            if cache is not None:
+                cache.put(sid, reg, values[index])
+            if shadow is not None:
+                shadow.put(sid, reg, values[index])
+
+    def run(self):
+        """
+        Read every block.
 
-            last_result = getLastTxRxResult(
-                self.port_num, self.protocol_version
-            )
-            if last_result != COMM_SUCCESS:
-                printTxRxResult(self.protocol_version, last_result)
-                log.error(
-                    "[sync_write] Comm unsuccessful:{0}".format(last_result))
+        :return: a new list of the values read, in block order. A value is
+            None when its read failed.
+        """
+        sp = self.sp
+        with sp.lock:
+            if self._bulk is None:
+                for index, (read, targets) in enumerate(self._reads):
+                    if index:
+                        sp.handoff()
+                    self._store(read(), targets)
             else:
-                result = True
+                for index, status in enumerate(self._bulk()):
+                    reg = self.blocks[index][2]
+                    self._store(status, ((index, reg, 0),))
+        self.ts = datetime.datetime.now().isoformat()
+        return list(self.values)
 
-        return result
+    def response(self, strict=False):
+        """
+        Run the plan and return the result in the `group_read` format.
+
+        :param strict: raise IOError on the first failed block instead of
+            reporting it
+        """
+        self.run()
+        response = {"blocks": []}
+        for index, (sid, register, _) in enumerate(self.blocks):
+            error = self.errors[index]
+            if error is not None:
+                err = "[bulk_read] servo_id:{0} register:'{1}' {2}".format(
+                    sid, register, error)
+                log.error(err)
+                if strict:
+                    raise IOError(err)
+            response['blocks'].append({
+                "servo_id": sid, "register": register,
+                "value": self.values[index], "ts": self.ts,
+                "status": self.status[index], "error": error
+            })
+        return response
+
+
+class GroupReadPlan(object):
+    """
+    Prepared reads of the same registers on the servos of a ServoGroup,
+    one BulkReadPlan per bus, run at the same time on the buses that have a
+    worker.
+    """
+
+    def __init__(self, buses, registers):
+        """
+
+        :param buses: the (ServoProtocol, [(group index, servo id), ...])
+            list of `ServoGroup._buses`
+        :param registers: the names of the registers to read on every servo
+        """
+        super(GroupReadPlan, self).__init__()
+        self.buses = buses
+        self.registers = list(registers)
+        self.size = sum(len(servos) for sp, servos in buses)
+        self.plans = [
+            sp.prepare_bulk_read({"blocks": [
+                {"servo_id": sid, "register": register}
+                for i, sid in servos for register in self.registers
+            ]})
+            for sp, servos in buses
+        ]
+
+    def run(self):
+        """
+        :return: a new list of the values, the registers of each servo in
+            turn in group order, None where a read failed
+        """
+        n = len(self.registers)
+        results = ServoGroup._fan_out([
+            (sp, plan.run, ()) for (sp, servos), plan in
+            zip(self.buses, self.plans)])
+        if len(results) == 1:
+            return results[0]
+        values = [None] * (self.size * n)
+        for (sp, servos), read in zip(self.buses, results):
+            for j, (i, sid) in enumerate(servos):
+                values[i * n:(i + 1) * n] = read[j * n:(j + 1) * n]
+        return values
+
+
+class SyncWritePlan(object):
+    """
+    A compiled sync write, see `ServoProtocol.prepare_sync_write`.
+    """
+
+    def __init__(self, sp, register, servo_ids):
+        super(SyncWritePlan, self).__init__()
+        if isinstance(register, (list, tuple)):
+            regs = sorted((sp.registers[r] for r in register),
+                          key=lambda reg: reg.address)
+            if sp.registers.span(regs[0], len(regs)) != regs:
+                raise ValueError(
+                    "[SyncWritePlan] registers:{0} are not contiguous".format(
+                        [reg.name for reg in regs]))
+            self.block = True
+        else:
+            regs = [sp.registers[register]]
+            self.block = False
+        for reg in regs:
+            if not reg.writable:
+                raise IOError(
+                    "register:'{0}' cannot be written".format(reg.name))
+        self.sp = sp
+        self.registers = regs
+        self.register = regs[0]
+        self.size = regs[-1].end - regs[0].address
+        self.servo_ids = [
+            servo.servo_id if isinstance(servo, Servo) else servo
+            for servo in servo_ids
+        ]
+        self._handle = sp.backend.prepare_sync_write(
+            self.register.address, self.size, self.servo_ids)
+
+    def __len__(self):
+        return len(self.servo_ids)
+
+    def _pack(self, row):
+        # the registers' bytes as one little-endian value
+        packed = 0
+        shift = 0
+        for reg, value in zip(self.registers, row):
+            reg.validate(value)
+            packed |= value << shift
+            shift += 8 * reg.size
+        return packed
+
+    def run(self, values, force=False):
+        """
+        :param values: a sequence of values in servo order, or one value
+            written to every servo. For a plan of several registers every
+            value is a sequence with one value per register, in address
+            order.
+        :param force: write to every servo even if the shadow register file
+            shows it already holds its value
+        :return: True if the instruction was sent, False if not
+        """
+        if not isinstance(values, (list, tuple)) or (
+                self.block and not isinstance(values[0], (list, tuple))):
+            values = [values] * len(self.servo_ids)
+        elif len(values) != len(self.servo_ids):
+            raise ValueError(
+                "[SyncWritePlan.run] {0} values for {1} servos".format(
+                    len(values), len(self.servo_ids)))
+        if self.block:
+            rows = values
+            values = [self._pack(row) for row in rows]
+        else:
+            validate = self.register.validate
+            for value in values:
+                validate(value)
+            rows = [(value,) for value in values]
+
+        sp = self.sp
+        regs = self.registers
+        if sp.shadow is not None and not force:
+            changed = [
+                (sid, row) for sid, row in zip(self.servo_ids, rows)
+                if not sp._unchanged(sid, regs, row, False)
+            ]
+            if not changed:
+                return True
+            if len(changed) < len(self.servo_ids):
+                # the compiled packet holds every servo, send only the
+                # changed ones in a packet of their own
+                return sp.sync_write_block(regs[0], changed, force=True)
+
+        with sp.lock:
+            status = self._handle.send(values)
+            sp._written(self.servo_ids, self.register.address, self.size)
+            sp._shadow_written(
+                zip(self.servo_ids, rows), regs,
+                status.comm_result == COMM_SUCCESS)
+
+        if status.comm_result != COMM_SUCCESS:
+            log.error("[SyncWritePlan.run] Comm unsuccessful:{0}".format(
+                comm_result_text(status.comm_result)))
+            return False
+        return True
 
 
 def read_all_servo_registers(cli, servo_type='AX-12'):
-    with ServoProtocol(servo_type=servo_type) as sp:
-        s = Servo(sp=sp, servo_id=cli.servo_id)
-        for register in sorted(dxl_control):
-            value = s[register]
+    with ServoProtocol(servo_type=servo_type) as sp, \
+            sp.priority(DIAGNOSTICS):
+        result = sp.read_registers(cli.servo_id, sorted(sp.registers))
+        for register, value in result['values'].items():
             log.info("Registry entry:'{0}' has value: {1}".format(
                 register, value))
-            stat = s.get_status()
-            if stat:
-                log.info("Registry entry:'{0}' read has status: {1}".format(
-                    register, stat))
+        if result['status']:
+            log.info("Registry read has status: {0}".format(
+                result['status']))
 
 
 def wheel_test(cli):
@@ -973,9 +1480,9 @@ def wheel_test(cli):
         s = Servo(sp, servo_id=cli.servo_id)
         s.wheel_mode()
         s.wheel_speed(512)
-        time.sleep(15)
+        sp.clock.sleep(15)
         s.wheel_speed(512, cw=False)
-        time.sleep(15)
+        sp.clock.sleep(15)
         s.wheel_speed(0)
 
 
@@ -985,9 +1492,9 @@ def blink_led(cli):
         while i < 15:
             s = Servo(sp=sp, servo_id=cli.servo_id)
             s.write("LED", ON)
-            time.sleep(1)
+            sp.clock.sleep(1)
             s.write("LED", OFF)
-            time.sleep(1)
+            sp.clock.sleep(1)
             i += 1
 
 
@@ -1033,10 +1540,12 @@ def write_register(cli):
 def to_goal(cli):
     with ServoProtocol() as sp:
         if cli.sg is not None:
+            goals = collections.OrderedDict()
             for servo_goal in cli.sg:
                 log.info('Servo goal:{0}'.format(servo_goal))
-                s = Servo(sp=sp, servo_id=servo_goal[0])
-                s.write('goal_position', servo_goal[1])
+                goals[servo_goal[0]] = servo_goal[1]
+            # every servo starts moving on the same packet
+            sp.sync_write('goal_position', goals)
         else:
             log.info("Servo: 1 goal: 0")
             s = Servo(sp=sp, servo_id=1)
@@ -1073,6 +1582,57 @@ def torque_enable(cli):
             cli.servo_id, cli.torque))
 
 
+def bench(cli):
+    from .bench import format_report, run_benchmarks, write_report
+
+    options = dict()
+    if cli.backend == 'emulator':
+        options['servo_ids'] = range(1, max(cli.sizes) + 1)
+        options['realtime'] = cli.realtime
+    with ServoProtocol(backend=cli.backend, baud_rate=cli.baud_rate,
+                       **options) as sp:
+        report = run_benchmarks(
+            sp, operations=cli.operation, sizes=cli.sizes,
+            iterations=cli.iterations)
+
+    log.info("Benchmark results:\n{0}".format(format_report(report)))
+    if cli.output:
+        write_report(report, cli.output)
+        log.info("Benchmark results written to:{0}".format(cli.output))
+
+
+def tune(cli):
+    from .tune import format_report, tune as tune_bus
+
+    options = dict()
+    if cli.backend == 'emulator':
+        options['servo_ids'] = cli.sid
+        options['realtime'] = True
+    with ServoProtocol(backend=cli.backend, baud_rate=cli.baud_rate,
+                       **options) as sp:
+        report = tune_bus(
+            sp, cli.sid, return_delay=cli.return_delay,
+            baud_rate=cli.to_baud, iterations=cli.iterations)
+
+    log.info("Tuning results:\n{0}".format(format_report(report)))
+
+
+def scan(cli):
+    from .pool import ServoBusPool
+    from .scan import DEFAULT_BAUD_RATES, scan_pool
+
+    devices = cli.device or [DEVICENAME.decode('utf-8')]
+    buses = dict((device, dict(device=device)) for device in devices)
+    with ServoBusPool(buses, backend=cli.backend) as pool:
+        found = scan_pool(pool, baud_rates=cli.baud or DEFAULT_BAUD_RATES)
+
+    for device, servos in found.items():
+        for servo in servos:
+            log.info("Device:{0} servo:{1} baud_rate:{2} model_number:{3} "
+                     "firmware_version:{4}".format(device, *servo))
+        log.info("Device:{0} found {1} servos".format(device, len(servos)))
+
+
 if __name__ == '__main__':
     handler = logging.StreamHandler()
     formatter = logging.Formatter(
@@ -1185,6 +1745,73 @@ if __name__ == '__main__':
         help="A servo_id. [one or more arguments]")
     write_register_parser.set_defaults(func=write_register)
 
+    bench_parser = subparsers.add_parser(
+        'bench',
+        description='Measure transaction and group operation throughput.')
+    bench_parser.add_argument(
+        '--backend', default=None,
+        help="The bus backend, e.g. 'emulator' for a simulated bus.")
+    bench_parser.add_argument(
+        '--baud-rate', dest='baud_rate', default=BAUDRATE_PERM, type=int,
+        help="The bus baud rate.")
+    bench_parser.add_argument(
+        '--sizes', nargs='+', type=int,
+        default=[1, 2, 4, 8, 16, 32, 64, 128, 253],
+        help="The servo group sizes, IDs are consecutive from 1.")
+    bench_parser.add_argument(
+        '--operation', action='append',
+        help="An operation to run. [one or more arguments, default all]")
+    bench_parser.add_argument(
+        '--iterations', default=100, type=int,
+        help="The number of calls measured per operation and size.")
+    bench_parser.add_argument(
+        '--no-realtime', dest='realtime', action='store_false',
+        help="Do not simulate wire timing with the 'emulator' backend.")
+    bench_parser.add_argument(
+        '-o', '--output',
+        help="Write the JSON results to this path, '-' for stdout.")
+    bench_parser.set_defaults(func=bench)
+
+    tune_parser = subparsers.add_parser(
+        'tune',
+        description='Lower return_delay and migrate the baud rate of a bus, '
+                    'reporting round trip latency before and after.')
+    tune_parser.add_argument(
+        '--sid', action='append', type=int, required=True,
+        help="A servo_id. [one or more arguments]")
+    tune_parser.add_argument(
+        '--backend', default=None,
+        help="The bus backend, e.g. 'emulator' for a simulated bus.")
+    tune_parser.add_argument(
+        '--baud-rate', dest='baud_rate', default=BAUDRATE_PERM, type=int,
+        help="The baud rate the bus runs at now.")
+    tune_parser.add_argument(
+        '--to-baud', dest='to_baud', default=None, type=int,
+        help="Migrate every servo and the host to this baud rate.")
+    tune_parser.add_argument(
+        '--return-delay', dest='return_delay', default=0, type=int,
+        help="The return_delay to set, in units of 2 usec.")
+    tune_parser.add_argument(
+        '--iterations', default=20, type=int,
+        help="The round trips timed per servo.")
+    tune_parser.set_defaults(func=tune)
+
+    scan_parser = subparsers.add_parser(
+        'scan',
+        description='Find the servos on one or more buses, scanned in '
+                    'parallel, at several baud rates.')
+    scan_parser.add_argument(
+        '--device', action='append',
+        help="The path of a bus port. [one or more arguments]")
+    scan_parser.add_argument(
+        '--backend', default=None,
+        help="The bus backend, e.g. 'emulator' for a simulated bus.")
+    scan_parser.add_argument(
+        '--baud', action='append', type=int,
+        help="A baud rate to search. [one or more arguments, default "
+             "1000000, 500000, 115200 and 57600]")
+    scan_parser.set_defaults(func=scan)
+
     args = parser.parse_args()
     if args.debug:
         log.setLevel(logging.DEBUG)
@@ -4,14 +4,20 @@ servode
 
 """
 import os
+import re
 from setuptools import setup
-from servode import __version__
 
 
 def open_file(fname):
     return open(os.path.join(os.path.dirname(__file__), fname))
 
 
+# read the version without importing servode and its bus backends
+__version__ = re.search(
+    r"^__version__ = '([^']+)'", open_file("servode.py").read(), re.M
+).group(1)
+
+
 setup(
     name='servode',
     version=__version__,
@@ -25,6 +31,8 @@ setup(
     zip_safe=False,
     include_package_data=True,
     packages=["servode"],
+    package_data={"servode": ["tables/*.json"]},
+    extras_require={"numpy": ["numpy"]},
     keywords='servo robot robotics',
     classifiers=[
         'Intended Audience :: Developers',
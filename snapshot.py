@@ -0,0 +1,238 @@
+"""
+Persisted bus topology and EEPROM snapshots.
+
+A `Snapshot` records the servos found on one bus and the EEPROM registers
+of each, model numbers, angle, voltage and temperature limits,
+status_return_level and the rest, in a versioned JSON file with a hash of
+its content. `warm_start` loads the snapshot of a bus and checks it against
+the servos with a single READ_DATA of the EEPROM area per servo. If the file
+is missing, damaged, from another version or another bus, or any value on
+any servo differs, the snapshot is taken again from the values read and
+saved::
+
+    with ServoProtocol(cache=True) as sp:
+        snap = sp.warm_start('bus0.json', range(1, 19))
+        if not snap.warm:
+            log.info("full refresh: {0}".format(snap.reason))
+        limits = snap.servos[1]['cw_angle_limit']
+
+The values of a snapshot are put in the ServoProtocol's read cache and
+shadow register file, so later reads of EEPROM registers need no bus
+traffic.
+"""
+import os
+import json
+import hashlib
+import logging
+import datetime
+import collections
+
+log = logging.getLogger('servode')
+
+SNAPSHOT_VERSION = 1
+EEPROM = 'EEPROM'
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def eeprom_registers(table):
+    """
+    :return: the readable EEPROM Registers of a RegisterTable
+    """
+    return [reg for reg in table.values()
+            if reg.addr_type == EEPROM and reg.readable]
+
+
+class Snapshot(object):
+    """
+    The servos of one bus and the EEPROM register values of each. `warm` is
+    True when the snapshot was loaded and matched every servo, and `reason`
+    tells why a full refresh was needed.
+    """
+
+    def __init__(self, servo_type, servos=None, device=None, baud_rate=None,
+                 saved=None):
+        """
+
+        :param servo_type: the servo type the register values are for
+        :param servos: an OrderedDict of servo id to an OrderedDict of
+            register name to value
+        :param device: the path of the bus port
+        :param baud_rate: the bus baud rate
+        :param saved: when the snapshot was saved, an ISO 8601 string
+        """
+        super(Snapshot, self).__init__()
+        self.servo_type = servo_type
+        self.servos = servos or collections.OrderedDict()
+        self.device = device
+        self.baud_rate = baud_rate
+        self.saved = saved
+        self.warm = False
+        self.reason = None
+
+    def __repr__(self):
+        return "Snapshot({0!r}, servos={1}, device={2!r}, warm={3})".format(
+            self.servo_type, list(self.servos), self.device, self.warm)
+
+    @property
+    def content_hash(self):
+        """
+        :return: the SHA-256 of the servo type and every register value
+        """
+        content = json.dumps([self.servo_type, [
+            [sid, list(values.items())]
+            for sid, values in sorted(self.servos.items())
+        ]], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def capture(cls, sp, servo_ids):
+        """
+        Read the EEPROM of every servo.
+
+        :return: a Snapshot of the servos that answered
+        """
+        regs = eeprom_registers(sp.registers)
+        servos = collections.OrderedDict()
+        for sid in servo_ids:
+            result = sp.read_registers(sid, regs, max_age=0)
+            values = result['values']
+            if any(value == '' for value in values.values()):
+                log.warning("[Snapshot.capture] servo:{0} did not "
+                            "answer".format(sid))
+                continue
+            servos[sid] = values
+        device = sp.device
+        if isinstance(device, bytes):
+            device = device.decode('utf-8')
+        return cls(sp.servo_type, servos, device, sp.baud_rate)
+
+    def as_dict(self):
+        return collections.OrderedDict([
+            ("version", SNAPSHOT_VERSION),
+            ("servo_type", self.servo_type),
+            ("device", self.device),
+            ("baud_rate", self.baud_rate),
+            ("saved", self.saved),
+            ("hash", self.content_hash),
+            ("servos", collections.OrderedDict(
+                (str(sid), values) for sid, values in self.servos.items())),
+        ])
+
+    def save(self, path):
+        """
+        Write the snapshot to `path`, replacing it atomically.
+        """
+        self.saved = datetime.datetime.utcnow().isoformat()
+        tmp = '{0}.tmp'.format(path)
+        with open(tmp, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        _replace(tmp, path)
+        log.debug("[Snapshot.save] path:{0} servos:{1}".format(
+            path, len(self.servos)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return: the Snapshot saved at `path`
+        :raise ValueError: when the file is not a snapshot of this version or
+            its content does not match its hash
+        :raise IOError: when the file cannot be read
+        """
+        with open(path) as f:
+            data = json.load(f, object_pairs_hook=collections.OrderedDict)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("snapshot version:{0!r} is not {1}".format(
+                data.get("version"), SNAPSHOT_VERSION))
+        servos = collections.OrderedDict(
+            (int(sid), values) for sid, values in data["servos"].items())
+        snapshot = cls(data["servo_type"], servos, data.get("device"),
+                       data.get("baud_rate"), data.get("saved"))
+        if snapshot.content_hash != data.get("hash"):
+            raise ValueError("snapshot content does not match its hash")
+        return snapshot
+
+    def check(self, sp):
+        """
+        Read the EEPROM registers of every servo, with one READ_DATA over
+        the EEPROM area per servo, and compare them with the snapshot.
+
+        :return: the ids of the servos that did not answer or differ
+        """
+        regs = eeprom_registers(sp.registers)
+        differ = list()
+        for sid, values in self.servos.items():
+            read = sp.read_registers(sid, regs, max_age=0)['values']
+            if read != values:
+                differ.append(sid)
+        return differ
+
+    def prime(self, sp):
+        """
+        Put the snapshot's values in the read cache and shadow register file
+        of `sp`.
+        """
+        for sid, values in self.servos.items():
+            for name, value in values.items():
+                reg = sp.registers[name]
+                if sp.cache is not None:
+                    sp.cache.put(sid, reg, value)
+                if sp.shadow is not None:
+                    sp.shadow.put(sid, reg, value)
+
+
+def _mismatch(snapshot, sp, servo_ids):
+    """
+    :return: why `snapshot` cannot be used for `sp`, None if it can
+    """
+    device = sp.device
+    if isinstance(device, bytes):
+        device = device.decode('utf-8')
+    if snapshot.servo_type != sp.servo_type:
+        return "servo_type:{0!r} differs".format(snapshot.servo_type)
+    if snapshot.device != device:
+        return "device:{0!r} differs".format(snapshot.device)
+    if snapshot.baud_rate != sp.baud_rate:
+        return "baud_rate:{0!r} differs".format(snapshot.baud_rate)
+    if servo_ids is not None and set(snapshot.servos) != set(servo_ids):
+        return "servo ids differ"
+    differ = snapshot.check(sp)
+    if differ:
+        return "servos:{0} differ".format(differ)
+    return None
+
+
+def warm_start(sp, path, servo_ids=None):
+    """
+    Load and check the snapshot at `path`, or read every servo and save a
+    new one.
+
+    :param sp: an open ServoProtocol
+    :param path: the snapshot file of the bus
+    :param servo_ids: the servos expected on the bus, those of the snapshot
+        when None. A full refresh without a snapshot needs them.
+    :return: the Snapshot
+    """
+    try:
+        snapshot = Snapshot.load(path)
+        reason = _mismatch(snapshot, sp, servo_ids)
+    except (IOError, OSError, ValueError, KeyError) as e:
+        snapshot = None
+        reason = str(e)
+
+    if reason is None:
+        snapshot.warm = True
+        log.debug("[warm_start] path:{0} servos:{1} checked".format(
+            path, len(snapshot.servos)))
+    else:
+        log.info("[warm_start] full refresh, {0}".format(reason))
+        if servo_ids is None:
+            if snapshot is None:
+                raise ValueError("[warm_start] servo_ids are needed without "
+                                 "a snapshot at path:{0}".format(path))
+            servo_ids = list(snapshot.servos)
+        snapshot = Snapshot.capture(sp, servo_ids)
+        snapshot.reason = reason
+        snapshot.save(path)
+    snapshot.prime(sp)
+    return snapshot
@@ -0,0 +1,221 @@
+"""
+Change notifications on servo registers.
+
+Every subscription of a ServoProtocol is served by one `SubscriptionHub`,
+which samples the union of the watched registers with a single prepared bulk
+read per tick and dispatches the changes it finds. Adding a subscriber to a
+register that is already watched adds no bus traffic::
+
+    def on_change(changes):
+        for change in changes:
+            print(change.servo_id, change.register, change.value)
+
+    sub = sg.subscribe('present_load', on_change, deadband=20)
+    servo.subscribe('moving', queue=events)
+    servo.subscribe('present_temperature', on_change, threshold=70,
+                    edge=RISING)
+    ...
+    sub.cancel()
+
+Callbacks run on the hub's thread and must not block; pass a `queue` to
+consume changes on another thread.
+"""
+import logging
+import threading
+import collections
+
+from .scheduler import TELEMETRY
+from .telemetry import DEFAULT_RATE, SamplingLoop
+
+log = logging.getLogger('servode')
+
+RISING = 'rising'
+FALLING = 'falling'
+BOTH = 'both'
+EDGES = (RISING, FALLING, BOTH)
+
+Change = collections.namedtuple(
+    'Change', ['servo_id', 'register', 'value', 'previous', 'ts'])
+Change.__doc__ = """
+A register change. `previous` is the value last notified, or None for the
+first sample of a subscription created with ``initial=True``.
+"""
+
+
+class Subscription(object):
+    """
+    A watch on one register of one or more servos, see
+    `SubscriptionHub.subscribe`.
+    """
+
+    def __init__(self, hub, servo_ids, register, callback=None, queue=None,
+                 deadband=0, threshold=None, edge=None, initial=False):
+        super(Subscription, self).__init__()
+        if callback is None and queue is None:
+            raise ValueError("a callback or a queue is required")
+        if edge is not None and edge not in EDGES:
+            raise ValueError("edge:{0!r} not one of {1}".format(edge, EDGES))
+        if edge is not None and threshold is None:
+            raise ValueError("edge:{0!r} needs a threshold".format(edge))
+        if threshold is not None and edge is None:
+            edge = BOTH
+        self.hub = hub
+        self.servo_ids = list(servo_ids)
+        self.register = register
+        self.callback = callback
+        self.queue = queue
+        self.deadband = deadband
+        self.threshold = threshold
+        self.edge = edge
+        self.initial = initial
+        # servo_id: the value last notified, or last seen for edges
+        self._last = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cancel()
+
+    def cancel(self):
+        self.hub.unsubscribe(self)
+
+    def _triggered(self, previous, value):
+        if self.edge is None:
+            return abs(value - previous) > self.deadband
+        threshold = self.threshold
+        rising = previous <= threshold < value
+        falling = previous > threshold >= value
+        if self.edge == RISING:
+            return rising
+        if self.edge == FALLING:
+            return falling
+        return rising or falling
+
+    def evaluate(self, values, ts):
+        """
+        :param values: a dict of (servo_id, register) to the value sampled
+        :return: the list of changes of this tick
+        """
+        changes = list()
+        last = self._last
+        for sid in self.servo_ids:
+            value = values.get((sid, self.register))
+            if value is None:
+                continue
+            previous = last.get(sid)
+            if previous is None:
+                last[sid] = value
+                if self.initial:
+                    changes.append(
+                        Change(sid, self.register, value, None, ts))
+                continue
+            if self._triggered(previous, value):
+                changes.append(
+                    Change(sid, self.register, value, previous, ts))
+                last[sid] = value
+            elif self.edge is not None:
+                last[sid] = value
+        return changes
+
+    def dispatch(self, changes):
+        if self.queue is not None:
+            self.queue.put(changes)
+        if self.callback is not None:
+            try:
+                self.callback(changes)
+            except Exception:
+                log.exception("[Subscription.dispatch] register:'{0}' "
+                              "callback failed".format(self.register))
+
+
+class SubscriptionHub(SamplingLoop):
+    """
+    The shared sampling loop of every subscription on one ServoProtocol. It
+    starts with the first subscription and stops after the last is
+    cancelled.
+    """
+    thread_name = 'SubscriptionHub'
+
+    def __init__(self, sp, rate=DEFAULT_RATE, clock=None):
+        super(SubscriptionHub, self).__init__(rate, clock or sp.clock)
+        self.sp = sp
+        self.subscriptions = list()
+        self.errors = 0
+        self._plan = None
+        self._blocks = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, servo_ids, register, callback=None, queue=None,
+                  deadband=0, threshold=None, edge=None, initial=False):
+        """
+        Watch `register` on `servo_ids`. Each tick with changes calls
+        `callback` with, and puts on `queue`, the list of `Change` found.
+
+        :param servo_ids: the servo ids to watch
+        :param register: the name of the register to watch
+        :param callback: a callable taking a list of Change
+        :param queue: a queue to put each list of Change on
+        :param deadband: without a threshold, notify when the value moves
+            more than this from the value last notified
+        :param threshold: notify when the value crosses this level
+        :param edge: the crossings to notify with a threshold, one of
+            RISING, FALLING or BOTH (the default)
+        :param initial: also notify the first value sampled
+        :return: a Subscription
+        """
+        self.sp.registers[register]
+        subscription = Subscription(
+            self, servo_ids, register, callback, queue, deadband, threshold,
+            edge, initial)
+        with self._lock:
+            self.subscriptions.append(subscription)
+            self._plan = None
+        log.debug("[SubscriptionHub.subscribe] register:'{0}' "
+                  "servos:{1}".format(register, subscription.servo_ids))
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription not in self.subscriptions:
+                return
+            self.subscriptions.remove(subscription)
+            self._plan = None
+            empty = not self.subscriptions
+        if empty:
+            self.stop()
+
+    def _prepare(self):
+        watched = collections.OrderedDict()
+        for subscription in self.subscriptions:
+            for sid in subscription.servo_ids:
+                watched[(sid, subscription.register)] = True
+        self._blocks = list(watched)
+        self._plan = self.sp.prepare_bulk_read({"blocks": [
+            {"servo_id": sid, "register": register}
+            for sid, register in self._blocks
+        ]})
+
+    def poll_once(self):
+        """
+        Sample every watched register once and dispatch the changes.
+        """
+        with self._lock:
+            if not self.subscriptions:
+                return
+            if self._plan is None:
+                self._prepare()
+            plan = self._plan
+            blocks = self._blocks
+            subscriptions = list(self.subscriptions)
+
+        with self.sp.priority(TELEMETRY):
+            values = dict(zip(blocks, plan.run()))
+        ts = self.clock.monotonic()
+        self.ticks += 1
+        self.errors += sum(1 for error in plan.errors if error is not None)
+        for subscription in subscriptions:
+            changes = subscription.evaluate(values, ts)
+            if changes:
+                subscription.dispatch(changes)
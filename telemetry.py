@@ -0,0 +1,256 @@
+"""
+Background telemetry sampling.
+
+A `TelemetryPoller` reads a set of registers from every servo of a
+`ServoGroup` once per tick, with a single prepared bulk read, and stores the
+samples in fixed-size ring buffers backed by `array.array`: one column per
+register per servo and a shared column of monotonic timestamps. Consumers
+read the latest value or a window of samples from the buffers without
+touching the bus::
+
+    poller = TelemetryPoller(sg, ['present_position', 'present_load'],
+                             rate=50)
+    with poller:
+        ...
+        position = poller.latest('elbow', 'present_position')
+        ts, positions = poller.window('elbow', 'present_position', 100)
+
+Windows are returned as numpy arrays when numpy is installed and as lists
+otherwise.
+"""
+import array
+import logging
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .scheduler import TELEMETRY
+
+log = logging.getLogger('servode')
+
+DEFAULT_RATE = 50.0
+DEFAULT_CAPACITY = 1000
+NAN = float('nan')
+
+
+class RingBuffer(object):
+    """
+    The last `capacity` values appended, in a preallocated array.
+    """
+
+    def __init__(self, capacity, typecode='d'):
+        super(RingBuffer, self).__init__()
+        if capacity < 1:
+            raise ValueError("capacity:{0} must be positive".format(capacity))
+        self.capacity = capacity
+        self.data = array.array(typecode, [0]) * capacity
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, value):
+        self.data[self.count % self.capacity] = value
+        self.count += 1
+
+    def latest(self):
+        if not self.count:
+            return None
+        return self.data[(self.count - 1) % self.capacity]
+
+    def window(self, n=None):
+        """
+        :param n: the number of most recent values, all held by default
+        :return: the values oldest first, as a numpy array when numpy is
+            installed and a list otherwise
+        """
+        size = len(self)
+        if n is None or n > size:
+            n = size
+        end = self.count % self.capacity
+        start = end - n
+        if start >= 0:
+            values = self.data[start:end]
+        else:
+            values = self.data[start:] + self.data[:end]
+        if numpy is not None:
+            return numpy.array(values)
+        return values.tolist()
+
+
+class SamplingLoop(object):
+    """
+    Calls `poll_once` at a fixed rate on one thread. Ticks are scheduled
+    against the clock, so a slow sample does not shift later ones; ticks
+    that are missed entirely are skipped and counted as overruns.
+    """
+    thread_name = 'SamplingLoop'
+
+    def __init__(self, rate=DEFAULT_RATE, clock=None):
+        super(SamplingLoop, self).__init__()
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.ticks = 0
+        self.overruns = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def poll_once(self):
+        raise NotImplementedError()
+
+    def _run(self):
+        clock = self.clock
+        next_tick = clock.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                log.exception("[{0}] sample failed".format(self.thread_name))
+            next_tick += self.period
+            delay = next_tick - clock.monotonic()
+            if delay < 0:
+                # skip the ticks already missed instead of bursting
+                self.overruns += 1
+                missed = int(-delay / self.period) + 1
+                next_tick += missed * self.period
+                delay = next_tick - clock.monotonic()
+            # wake at once when stopped instead of after the period
+            clock.wait(self._stop, max(delay, 0.0))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=self.thread_name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+class TelemetryPoller(SamplingLoop):
+    """
+    Samples registers of a ServoGroup at a fixed rate on one thread.
+    """
+    thread_name = 'TelemetryPoller'
+
+    def __init__(self, group, registers, rate=DEFAULT_RATE,
+                 capacity=DEFAULT_CAPACITY, clock=None):
+        """
+
+        :param group: the ServoGroup to sample, on a single bus
+        :param registers: the names of the registers to sample on every servo
+        :param rate: samples per second
+        :param capacity: the number of samples kept per column
+        :param clock: the clock ticks are timed with, the ServoProtocol's
+            clock by default
+        """
+        sp = group._single_bus('TelemetryPoller')
+        super(TelemetryPoller, self).__init__(rate, clock or sp.clock)
+        self.group = group
+        self.sp = sp
+        self.registers = list(registers)
+        self.capacity = capacity
+
+        self.servo_ids = group.servo_ids
+        self._names = dict(
+            (name, group[name].servo_id) for name in group)
+        # (servo_id, register): column index in block order
+        self._columns = dict()
+        blocks = list()
+        for sid in self.servo_ids:
+            for register in self.registers:
+                self._columns[(sid, register)] = len(blocks)
+                blocks.append({"servo_id": sid, "register": register})
+        self._plan = self.sp.prepare_bulk_read({"blocks": blocks})
+        self.timestamps = RingBuffer(capacity)
+        self.columns = [RingBuffer(capacity) for _ in blocks]
+
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _sid(self, servo):
+        if hasattr(servo, 'servo_id'):
+            return servo.servo_id
+        return self._names.get(servo, servo)
+
+    def column(self, servo, register):
+        """
+        :param servo: a group key, Servo or servo id
+        :return: the RingBuffer of `register` on `servo`
+        """
+        return self.columns[self._columns[(self._sid(servo), register)]]
+
+    def poll_once(self):
+        """
+        Sample every register once and store the values.
+
+        :return: the monotonic time of the sample
+        """
+        with self.sp.priority(TELEMETRY):
+            values = self._plan.run()
+        now = self.clock.monotonic()
+        failed = 0
+        with self._lock:
+            self.timestamps.append(now)
+            for column, value in zip(self.columns, values):
+                if value is None:
+                    failed += 1
+                    value = NAN
+                column.append(value)
+            self.ticks += 1
+            self.errors += failed
+        return now
+
+    def start(self):
+        super(TelemetryPoller, self).start()
+        log.debug("[TelemetryPoller.start] servos:{0} registers:{1}".format(
+            len(self.servo_ids), self.registers))
+
+    def latest(self, servo, register):
+        """
+        :param servo: a group key, Servo or servo id
+        :return: the most recent value of `register` on `servo`, None before
+            the first sample and NaN if the last read failed
+        """
+        return self.column(servo, register).latest()
+
+    def latest_all(self, register):
+        """
+        :return: a list of the most recent value of `register` on every
+            servo, in group order
+        """
+        with self._lock:
+            return [self.columns[self._columns[(sid, register)]].latest()
+                    for sid in self.servo_ids]
+
+    def window(self, servo, register, n=None):
+        """
+        :param servo: a group key, Servo or servo id
+        :param n: the number of most recent samples, all held by default
+        :return: (timestamps, values) oldest first
+        """
+        column = self.column(servo, register)
+        with self._lock:
+            return self.timestamps.window(n), column.window(n)
@@ -0,0 +1,18 @@
+"""
+Make the checkout importable as the ``servode`` package, whatever the name
+of its directory. Run from the checkout, ``import servode`` would find the
+servode.py module instead.
+"""
+import os
+import sys
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if not hasattr(sys.modules.get('servode'), '__path__'):
+    spec = importlib.util.spec_from_file_location(
+        'servode', os.path.join(ROOT, '__init__.py'),
+        submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['servode'] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,38 @@
+import asyncio
+
+from servode.aio import AsyncServo, AsyncServoGroup, AsyncServoProtocol
+from servode.clock import VirtualClock
+from servode.scheduler import EMERGENCY, BusScheduler
+
+
+def test_read_and_write_on_the_emulator():
+    async def main():
+        async with AsyncServoProtocol(backend='emulator', servo_ids=[1, 2],
+                                      clock=VirtualClock()) as asp:
+            group = AsyncServoGroup()
+            group['a'] = AsyncServo(asp, 1)
+            group['b'] = AsyncServo(asp, 2)
+            assert await group['a'].ping() == 12
+            await group.write_values('goal_position', [100, 200])
+            goals = await group.read('goal_position')
+            reads = await asyncio.gather(
+                group['a'].read('present_temperature'),
+                group['b'].read('goal_position'))
+            return goals, reads
+
+    goals, reads = asyncio.run(main())
+    assert goals == [100, 200]
+    assert reads[1] == 200
+
+
+def test_calls_run_at_the_loop_priority():
+    async def main():
+        async with AsyncServoProtocol(backend='emulator', servo_ids=[1],
+                                      lock=BusScheduler()) as asp:
+            seen = []
+            lock = asp.sp.lock
+            with asp.sp.priority(EMERGENCY):
+                await asp._call(lambda: seen.append(lock.current()[0]))
+            return seen
+
+    assert asyncio.run(main()) == [EMERGENCY]
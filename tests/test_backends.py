@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+from servode.backends import (
+    BACKEND_ENV, LoopbackBackend, backend_names, create_backend
+)
+from servode.servode import ServoProtocol
+
+
+def test_unknown_backend_is_refused():
+    with pytest.raises(ValueError):
+        create_backend('nonexistent')
+
+
+def test_backend_from_the_environment(monkeypatch):
+    monkeypatch.setenv(BACKEND_ENV, 'loopback')
+    assert isinstance(create_backend(), LoopbackBackend)
+
+
+def test_backend_instance_is_used_as_is():
+    backend = LoopbackBackend()
+    assert create_backend(backend) is backend
+
+
+def test_sdk_is_only_loaded_for_the_robotis_backend():
+    assert {'emulator', 'loopback', 'robotis', 'serial'} <= set(
+        backend_names())
+    with ServoProtocol(backend='loopback') as sp:
+        sp.write_register(1, 'goal_position', 100)
+        assert sp.read_register(1, 'goal_position')['value'] == 100
+    assert 'servode.dynamixel_functions' not in sys.modules
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from servode.bench import (
+    OPERATIONS, format_report, percentile, run_benchmarks, write_report
+)
+from servode.servode import Servo, ServoGroup, ServoProtocol
+
+
+@pytest.mark.parametrize('name', list(OPERATIONS))
+def test_declared_transactions_match_the_bus(name):
+    setup, transactions = OPERATIONS[name]
+    with ServoProtocol(backend='emulator', servo_ids=range(1, 9)) as sp:
+        group = ServoGroup()
+        for sid in range(1, 9):
+            group[sid] = Servo(sp, sid)
+        sent = []
+        transact = sp.backend.transport.transact
+
+        def counting(packet, param_count=0):
+            sent.append(bytes(packet))
+            return transact(packet, param_count)
+
+        # prepared plans bind the transport when they are built
+        sp.backend.transport.transact = counting
+        run = setup(sp, group)
+        del sent[:]
+        run()
+        assert len(sent) == transactions(len(group))
+
+
+def test_percentile_is_nearest_rank():
+    samples = list(range(1, 101))
+    assert percentile(samples, 0.50) == 50
+    assert percentile(samples, 0.99) == 99
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.5) is None
+
+
+def test_report_covers_every_operation_and_size(tmp_path):
+    with ServoProtocol(backend='emulator', servo_ids=range(1, 3)) as sp:
+        report = run_benchmarks(sp, sizes=(1, 2), iterations=3, warmup=1)
+    results = report["results"]
+    assert [(r["operation"], r["servos"]) for r in results] == [
+        (name, size) for size in (1, 2) for name in OPERATIONS]
+    for r in results:
+        assert r["transactions"] == 3 * OPERATIONS[r["operation"]][1](
+            r["servos"])
+        assert r["latency"]["p50"] <= r["latency"]["max"]
+    assert len(format_report(report).splitlines()) == len(results) + 1
+
+    path = str(tmp_path / 'bench.json')
+    write_report(report, path)
+    with open(path) as f:
+        assert json.load(f)["backend"] == 'emulator'
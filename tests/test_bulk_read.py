@@ -0,0 +1,66 @@
+from servode.servode import Servo, ServoGroup, ServoProtocol
+
+
+def test_bulk_read_falls_back_without_backend_support():
+    with ServoProtocol(backend='emulator', servo_type='MX',
+                       servo_ids=[1, 2]) as sp:
+        assert not sp.uses_bulk_read
+        response = sp.bulk_read({"blocks": [
+            {"servo_id": 1, "register": 'present_position'},
+            {"servo_id": 2, "register": 'present_position'},
+        ]})
+        assert [block["value"] for block in response["blocks"]] == [512, 512]
+
+        group = ServoGroup()
+        group['a'] = Servo(sp, 1)
+        group['b'] = Servo(sp, 2)
+        assert group.read('present_position') == [512, 512]
+
+
+def test_bulk_read_uses_backend_support():
+    with ServoProtocol(backend='loopback', servo_type='MX') as sp:
+        assert sp.uses_bulk_read
+        sp.write_register(3, 'goal_position', 100)
+        response = sp.bulk_read({"blocks": [
+            {"servo_id": 3, "register": 'goal_position'},
+        ]})
+        assert response["blocks"][0]["value"] == 100
+
+
+def test_prepared_bulk_read_refreshes_the_cache():
+    with ServoProtocol(backend='emulator', servo_type='MX', servo_ids=[1],
+                       cache=True, shadow=True) as sp:
+        reg = sp.registers['present_temperature']
+        sp.read_register(1, reg)
+        sp.backend.bus.servos[1].memory[reg.address] = 60
+        plan = sp.prepare_bulk_read({"blocks": [
+            {"servo_id": 1, "register": 'present_temperature'},
+        ]})
+        assert plan.run() == [60]
+        assert sp.cache.get(1, reg) == 60
+        assert sp.read_register(1, reg)['value'] == 60
+
+
+def test_group_read_reports_missing_servos_per_block():
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2]) as sp:
+        assert not sp.uses_bulk_read
+        sent = []
+        transact = sp.backend.transport.transact
+
+        def counting(packet, param_count=0):
+            sent.append(bytes(packet))
+            return transact(packet, param_count)
+
+        sp.backend.transport.transact = counting
+        response = sp.group_read({"blocks": [
+            {"servo_id": 1, "register": 'present_position'},
+            {"servo_id": 1, "register": 'present_load'},
+            {"servo_id": 3, "register": 'present_position'},
+            {"servo_id": 2, "register": 'present_position'},
+        ]})
+    blocks = response["blocks"]
+    assert [block["value"] for block in blocks] == [512, 0, None, 512]
+    assert [block["error"] is None for block in blocks] == [
+        True, True, False, True]
+    # one range read per servo
+    assert len(sent) == 3
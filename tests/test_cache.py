@@ -0,0 +1,61 @@
+from servode.clock import VirtualClock
+from servode.servode import ServoProtocol
+
+
+def cached_bus(**options):
+    sp = ServoProtocol(backend='emulator', servo_ids=[1], clock=VirtualClock(),
+                       **options)
+    sp.__enter__()
+    sent = []
+    transact = sp.backend.transport.transact
+
+    def counting(packet, param_count=0):
+        sent.append(bytes(packet))
+        return transact(packet, param_count)
+
+    sp.backend.transport.transact = counting
+    return sp, sent
+
+
+def test_volatile_registers_expire():
+    sp, sent = cached_bus(cache=True)
+    reg = sp.registers['present_position']
+    sp.read_register(1, reg)
+    sp.read_register(1, reg)
+    assert len(sent) == 1
+    sp.clock.advance(sp.cache.ttl_of(reg))
+    sp.read_register(1, reg)
+    assert len(sent) == 2
+    sp.read_register(1, reg, max_age=0)
+    assert len(sent) == 3
+    sp.__exit__(None, None, None)
+
+
+def test_eeprom_registers_are_kept_until_written():
+    sp, sent = cached_bus(cache=True)
+    assert sp.cache.ttl_of(sp.registers['cw_angle_limit']) is None
+    sp.read_register(1, 'cw_angle_limit')
+    sp.clock.advance(3600)
+    assert sp.read_register(1, 'cw_angle_limit')['value'] == 0
+    assert len(sent) == 1
+    # writing the register drops its cached value
+    sp.write_register(1, 'cw_angle_limit', 100)
+    assert sp.read_register(1, 'cw_angle_limit')['value'] == 100
+    assert len(sent) == 3
+    sp.__exit__(None, None, None)
+
+
+def test_shadow_skips_writes_of_the_value_held():
+    sp, sent = cached_bus(shadow=True)
+    sp.write_register(1, 'goal_position', 100)
+    sp.write_register(1, 'goal_position', 100)
+    assert len(sent) == 1
+    assert sp.shadow.suppressed == 1
+    sp.write_register(1, 'goal_position', 100, force=True)
+    sp.sync_write('goal_position', 100, [1])
+    assert len(sent) == 2
+    # torque_enable can change on the servo itself, it is always written
+    sp.write_register(1, 'torque_enable', 1)
+    sp.write_register(1, 'torque_enable', 1)
+    assert len(sent) == 4
+    sp.__exit__(None, None, None)
@@ -0,0 +1,19 @@
+import threading
+
+from servode.clock import VirtualClock
+
+
+def test_virtual_wait_times_out_in_virtual_time():
+    clock = VirtualClock()
+    assert not clock.wait(threading.Event(), 0.5)
+    assert abs(clock.monotonic() - 0.5) < 1e-9
+
+
+def test_virtual_wait_stops_when_the_event_is_set():
+    clock = VirtualClock()
+    event = threading.Event()
+    timer = threading.Timer(0.02, event.set)
+    timer.start()
+    assert clock.wait(event, 3600.0)
+    assert clock.monotonic() < 3600.0
+    timer.join()
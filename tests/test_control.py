@@ -0,0 +1,41 @@
+from servode.clock import VirtualClock
+from servode.control import ControlLoop
+from servode.servode import Servo, ServoGroup, ServoProtocol
+
+
+def group_on_emulator(servo_ids):
+    clock = VirtualClock()
+    sp = ServoProtocol(backend='emulator', servo_ids=servo_ids, clock=clock)
+    group = ServoGroup()
+    for sid in servo_ids:
+        group[sid] = Servo(sp, sid)
+    return sp, group
+
+
+def test_run_counts_failed_ticks():
+    sp, group = group_on_emulator([1, 2])
+
+    def compute(sensed, now):
+        raise ValueError("no estimate")
+
+    with sp:
+        loop = ControlLoop(group, compute, sense=['present_position'],
+                           actuate='goal_position', rate=100)
+        loop.run(ticks=5)
+    assert loop.ticks == 0
+    assert loop.errors == 5
+
+
+def test_run_actuates_every_tick():
+    sp, group = group_on_emulator([1, 2])
+
+    def compute(sensed, now):
+        return [p - 10 for p in sensed['present_position']]
+
+    with sp:
+        loop = ControlLoop(group, compute, sense=['present_position'],
+                           actuate='goal_position', rate=100)
+        loop.run(ticks=3)
+        assert loop.ticks == 3
+        assert group.read('goal_position') == [502, 502]
+
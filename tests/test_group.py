@@ -0,0 +1,90 @@
+import pytest
+
+from servode.pool import ServoBusPool
+from servode.servode import Servo, ServoGroup, ServoProtocol
+
+
+def test_read_returns_a_new_list():
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2]) as sp:
+        group = ServoGroup()
+        group['a'] = Servo(sp, 1)
+        group['b'] = Servo(sp, 2)
+        before = group.read('goal_position')
+        group.write_values('goal_position', [100, 200])
+        after = group.read('goal_position')
+        assert before is not after
+        assert before == [512, 512]
+        assert after == [100, 200]
+
+
+def test_read_across_buses():
+    buses = {'left': dict(servo_ids=[1]), 'right': dict(servo_ids=[1])}
+    with ServoBusPool(buses, backend='emulator') as pool:
+        group = ServoGroup()
+        group['left'] = pool.servo('left', 1)
+        group['right'] = pool.servo('right', 1)
+        group.write_values('goal_position', [100, 200])
+        assert group.read('goal_position') == [100, 200]
+
+
+def test_fan_out_keeps_the_caller_priority():
+    from servode.scheduler import BusScheduler, EMERGENCY
+
+    buses = {'left': dict(servo_ids=[1], lock=BusScheduler()),
+             'right': dict(servo_ids=[1], lock=BusScheduler())}
+    with ServoBusPool(buses, backend='emulator') as pool:
+        seen = []
+
+        def priority(sp):
+            seen.append(sp.lock.current()[0])
+
+        calls = [(sp, priority, (sp,)) for sp in pool.buses.values()]
+        with pool['left'].priority(EMERGENCY):
+            with pool['right'].priority(EMERGENCY, deadline=0.5):
+                ServoGroup._fan_out(calls)
+        assert seen == [EMERGENCY, EMERGENCY]
+
+
+def test_single_bus_helpers_refuse_a_group_of_several_buses():
+    from servode.control import ControlLoop
+    from servode.telemetry import TelemetryPoller
+
+    buses = {'left': dict(servo_ids=[1]), 'right': dict(servo_ids=[1])}
+    with ServoBusPool(buses, backend='emulator') as pool:
+        group = ServoGroup()
+        group['left'] = pool.servo('left', 1)
+        group['right'] = pool.servo('right', 1)
+        with pytest.raises(ValueError):
+            group.subscribe('present_position', lambda *args: None)
+        with pytest.raises(ValueError):
+            TelemetryPoller(group, ['present_position'])
+        with pytest.raises(ValueError):
+            ControlLoop(group, lambda *args: None,
+                        sense=['present_position'], actuate='goal_position')
+
+
+def test_write_block_sends_one_sync_write():
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2]) as sp:
+        group = ServoGroup()
+        group['a'] = Servo(sp, 1)
+        group['b'] = Servo(sp, 2)
+        sent = []
+        transact = sp.backend.transport.transact
+
+        def counting(packet, param_count=0):
+            sent.append(bytes(packet))
+            return transact(packet, param_count)
+
+        sp.backend.transport.transact = counting
+        assert group.write_block({'goal_position': [100, 200],
+                                  'moving_speed': [50, 60]})
+        # SYNC_WRITE of 4 bytes from goal_position (30), then per servo its
+        # id and both registers little endian
+        body = bytes([0xFE, 14, 0x83, 30, 4,
+                      1, 100, 0, 50, 0,
+                      2, 200, 0, 60, 0])
+        assert sent == [b'\xff\xff' + body + bytes([~sum(body) & 0xFF])]
+        assert group.read('moving_speed') == [50, 60]
+        with pytest.raises(ValueError):
+            group.write_block({'goal_position': [1, 2],
+                               'torque_limit': [3, 4]})
@@ -0,0 +1,46 @@
+from servode.clock import VirtualClock
+from servode.servode import Servo, ServoGroup, ServoProtocol
+
+
+def moving_group(servo_ids, external_load=0.0):
+    clock = VirtualClock()
+    sp = ServoProtocol(backend='emulator', servo_ids=servo_ids, motion=True,
+                       clock=clock)
+    sp.__enter__()
+    for servo in sp.backend.bus.servos.values():
+        servo.external_load = external_load
+    group = ServoGroup()
+    for sid in servo_ids:
+        group[sid] = Servo(sp, sid)
+    group.write('torque_enable', 1)
+    return sp, group
+
+
+def test_slow_move_arrives():
+    sp, group = moving_group([1, 2])
+    group.write_values('moving_speed', [15, 10])
+    handle = group.goal_position([400, 600], block=True, timeout=60)
+    assert handle.ok
+    assert handle.stalled == []
+    assert handle.arrived == [1, 2]
+    # over a second at 10 * 0.111 rpm, far longer than the stall time
+    assert handle.elapsed > 1.0
+    sp.__exit__(None, None, None)
+
+
+def test_blocked_servo_stalls():
+    sp, group = moving_group([1], external_load=1.0)
+    handle = group.goal_position([100], block=True, timeout=60)
+    assert not handle.ok
+    assert handle.stalled == [1]
+    assert not handle.timed_out
+    sp.__exit__(None, None, None)
+
+
+def test_background_move_is_waited_on():
+    sp, group = moving_group([1, 2])
+    handle = group.goal_position([400, 600], background=True)
+    assert handle.wait()
+    assert handle.ok
+    sp.__exit__(None, None, None)
+
@@ -0,0 +1,134 @@
+import pytest
+
+from servode.packet import (
+    BROADCAST_ID, COMM_RX_CORRUPT, COMM_SUCCESS, PacketCodec, PacketError,
+    SyncWritePacket, checksum, find_header, pack_value, parse_instruction,
+    parse_status, unpack_value
+)
+
+
+def test_encode_ping():
+    assert bytes(PacketCodec().ping(1)) == b'\xff\xff\x01\x02\x01\xfb'
+
+
+def test_encode_read_data():
+    # the e-manual example: read the internal temperature of servo 1
+    packet = PacketCodec().read_data(1, 0x2B, 1)
+    assert bytes(packet) == b'\xff\xff\x01\x04\x02\x2b\x01\xcc'
+
+
+def test_encode_write_value():
+    packet = PacketCodec().write_value(0xFE, 0x03, 1, 1)
+    assert bytes(packet) == b'\xff\xff\xfe\x04\x03\x03\x01\xf6'
+
+
+def test_encode_sync_write():
+    # the e-manual example: goal_position and moving_speed of four servos
+    rows = [(0, b'\x10\x00\x50\x01'), (1, b'\x20\x02\x60\x03'),
+            (2, b'\x30\x00\x70\x01'), (3, b'\x20\x02\x80\x03')]
+    expected = bytes(bytearray([
+        0xFF, 0xFF, 0xFE, 0x18, 0x83, 0x1E, 0x04,
+        0x00, 0x10, 0x00, 0x50, 0x01, 0x01, 0x20, 0x02, 0x60, 0x03,
+        0x02, 0x30, 0x00, 0x70, 0x01, 0x03, 0x20, 0x02, 0x80, 0x03,
+        0x12]))
+    assert bytes(PacketCodec().sync_write(0x1E, 4, rows)) == expected
+
+
+def test_sync_write_packet_matches_codec():
+    packet = SyncWritePacket(0x1E, 2, [1, 2, 3])
+    values = [100, 200, 1023]
+    expected = PacketCodec().sync_write_values(
+        0x1E, 2, list(zip([1, 2, 3], values)))
+    assert bytes(packet.fill(values)) == bytes(expected)
+
+
+def test_encode_rejects_bad_input():
+    codec = PacketCodec()
+    with pytest.raises(PacketError):
+        codec.ping(0xFF)
+    with pytest.raises(PacketError):
+        codec.write_value(1, 30, 0x10000, 2)
+    with pytest.raises(PacketError):
+        codec.sync_write(30, 2, [(1, b'\x00')])
+    with pytest.raises(PacketError):
+        codec.write_data(1, 0, b'\x00' * 253)
+
+
+def test_checksum():
+    buf = bytearray(b'\xff\xff\x01\x02\x00\x20')
+    assert checksum(buf, 2, 5) == 0xFC
+    # the sum wraps at 8 bits before it is inverted
+    assert checksum(bytearray(b'\xff\xff\x02'), 0, 3) == 0xFF
+
+
+def test_pack_and_unpack_values():
+    buf = bytearray(4)
+    assert pack_value(buf, 0, 0x1234, 2) == 2
+    assert buf[:2] == bytearray(b'\x34\x12')
+    assert unpack_value(buf, 0, 2) == 0x1234
+    pack_value(buf, 0, 0x01020304, 4)
+    assert unpack_value(buf, 0, 4) == 0x01020304
+    with pytest.raises(PacketError):
+        pack_value(buf, 0, -1, 1)
+
+
+def test_find_header():
+    assert find_header(bytearray(b'\x00\x01\xff\xff\x01')) == 2
+    # a run of 0xFF resolves to the last pair
+    assert find_header(bytearray(b'\xff\xff\xff\x01')) == 1
+    assert find_header(bytearray(b'\x00\xff\x00\xff')) == -1
+
+
+def test_parse_status():
+    buf = bytearray(b'\xff\xff\x01\x03\x00\x20\xdb')
+    status = parse_status(buf)
+    assert status.comm_result == COMM_SUCCESS
+    assert status.servo_id == 1
+    assert status.error == 0
+    assert status.value == 0x20
+    assert status.ok
+
+
+def test_parse_status_skips_noise():
+    buf = bytearray(b'\x00\x13\xff\x7f\xff\xff\x01\x03\x00\x20\xdb')
+    status = parse_status(buf)
+    assert status.comm_result == COMM_SUCCESS
+    assert status.value == 0x20
+
+
+def test_parse_status_error_bits():
+    buf = bytearray(b'\xff\xff\x01\x02\x24\xd8')
+    status = parse_status(buf)
+    assert status.comm_result == COMM_SUCCESS
+    assert not status.ok
+    bits = status.error_status()
+    assert bits['overheat_error'] and bits['overload_error']
+    assert not bits['input_volt_error']
+
+
+def test_parse_status_truncated():
+    buf = bytearray(b'\xff\xff\x01\x03\x00\x20\xdb')
+    assert parse_status(buf, 6).comm_result == COMM_RX_CORRUPT
+    assert parse_status(buf, 3).comm_result == COMM_RX_CORRUPT
+    assert parse_status(bytearray()).comm_result == COMM_RX_CORRUPT
+
+
+def test_parse_status_corrupt():
+    buf = bytearray(b'\xff\xff\x01\x03\x00\x20\xda')
+    status = parse_status(buf)
+    assert status.comm_result == COMM_RX_CORRUPT
+    assert status.params is None
+    # a length byte below the minimum
+    assert parse_status(
+        bytearray(b'\xff\xff\x01\x01\x00\xfd')).comm_result == COMM_RX_CORRUPT
+
+
+def test_parse_instruction_round_trip():
+    packet = bytearray(PacketCodec().write_value(BROADCAST_ID, 30, 512, 2))
+    inst = parse_instruction(packet)
+    assert inst.servo_id == BROADCAST_ID
+    assert inst.instruction == 0x03
+    assert bytes(inst.params) == b'\x1e\x00\x02'
+    assert inst.end == len(packet)
+    packet[-1] ^= 0xFF
+    assert parse_instruction(packet) is None
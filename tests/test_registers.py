@@ -0,0 +1,52 @@
+import argparse
+
+from servode.emulator import EmulatedTransport
+from servode.servode import (
+    Servo, ServoProtocol, read_all_servo_registers
+)
+
+
+def counting(monkeypatch):
+    """
+    Count the packets every EmulatedTransport sends.
+    """
+    sent = []
+    transact = EmulatedTransport.transact
+
+    def count(self, packet, param_count=0):
+        sent.append(bytes(packet))
+        return transact(self, packet, param_count)
+
+    monkeypatch.setattr(EmulatedTransport, 'transact', count)
+    return sent
+
+
+def test_contiguous_registers_are_read_together():
+    with ServoProtocol(backend='emulator', servo_ids=[1]) as sp:
+        names = ['present_position', 'present_speed', 'present_load',
+                 'present_voltage', 'present_temperature']
+        plan = sp.registers.plan_reads(names)
+        assert len(plan) == 1
+        address, length, members = plan[0]
+        assert (address, length) == (36, 8)
+        assert [reg.name for reg, _ in members] == names
+
+
+def test_read_many_is_one_transaction(monkeypatch):
+    sent = counting(monkeypatch)
+    with ServoProtocol(backend='emulator', servo_ids=[1]) as sp:
+        servo = Servo(sp, 1)
+        values = servo.read_many(['present_temperature', 'present_position',
+                                  'present_load'])
+    assert list(values) == ['present_temperature', 'present_position',
+                            'present_load']
+    assert values['present_position'] == 512
+    assert len(sent) == 1
+
+
+def test_all_registers_cli_reads_the_table_in_two_transactions(
+        monkeypatch):
+    monkeypatch.setenv('SERVODE_BACKEND', 'emulator')
+    sent = counting(monkeypatch)
+    read_all_servo_registers(argparse.Namespace(servo_id=1))
+    assert 1 <= len(sent) <= 2
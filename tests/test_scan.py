@@ -0,0 +1,29 @@
+from servode.emulator import ADDR_BAUD_RATE
+from servode.scan import Found, probe_timeout, scan
+from servode.servode import ServoProtocol
+
+
+def test_probe_timeout_is_the_wire_time_and_margins():
+    # 8 byte READ_DATA and 9 byte status of 10 bits at 1 Mbps
+    assert abs(probe_timeout(1000000, 3, 0.0005, 0.001) - 0.00167) < 1e-9
+
+
+def test_scan_finds_servos_at_every_rate():
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2, 7]) as sp:
+        servos = sp.backend.bus.servos
+        servos[2].memory[ADDR_BAUD_RATE] = 34
+        servos[7].memory[ADDR_BAUD_RATE] = 16
+        sent = []
+        transact = sp.backend.transport.transact
+
+        def counting(packet, param_count=0):
+            sent.append(bytes(packet))
+            return transact(packet, param_count)
+
+        sp.backend.transport.transact = counting
+        found = scan(sp, servo_ids=range(10))
+        assert found == [Found(1, 1000000, 12, 24), Found(2, 57600, 12, 24),
+                         Found(7, 115200, 12, 24)]
+        # a servo found at one rate is not probed at the next
+        assert len(sent) == 10 + 9 + 9 + 8
+        assert sp.backend.transport.baud_rate == sp.baud_rate == 1000000
@@ -0,0 +1,118 @@
+import time
+import threading
+
+from servode.packet import INST_WRITE
+import pytest
+
+from servode.scheduler import (
+    DEFER, DIAGNOSTICS, DROP, EMERGENCY, MOTION, TELEMETRY, BusScheduler,
+    DeadlineExpired
+)
+from servode.servode import ServoProtocol
+
+
+def queue_behind(scheduler, requests):
+    """
+    Queue one thread per (name, priority, deadline, expired) while the bus
+    is held, then release it.
+
+    :return: the names in the order the bus was granted, and the names of
+        the requests dropped
+    """
+    granted = []
+    dropped = []
+
+    def request(name, priority, deadline, expired):
+        try:
+            with scheduler.using(priority, deadline, expired), scheduler:
+                granted.append(name)
+        except DeadlineExpired:
+            dropped.append(name)
+
+    scheduler.acquire(DIAGNOSTICS)
+    threads = []
+    for args in requests:
+        thread = threading.Thread(target=request, args=args)
+        thread.start()
+        threads.append(thread)
+        while scheduler.queued < len(threads):
+            time.sleep(0.001)
+    time.sleep(0.05)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    return granted, dropped
+
+
+def test_bus_is_granted_by_priority_class():
+    scheduler = BusScheduler()
+    granted, dropped = queue_behind(scheduler, [
+        ('telemetry', TELEMETRY, None, DROP),
+        ('motion', MOTION, None, DROP),
+        ('emergency', EMERGENCY, None, DROP),
+        ('motion again', MOTION, None, DROP),
+    ])
+    assert granted == ['emergency', 'motion', 'motion again', 'telemetry']
+    stats = scheduler.stats()
+    assert stats['motion']['requests'] == 2
+    assert stats['motion']['waited'] == 2
+
+
+def test_expired_requests_are_dropped_or_deferred():
+    scheduler = BusScheduler()
+    granted, dropped = queue_behind(scheduler, [
+        ('dropped', EMERGENCY, 0.01, DROP),
+        ('deferred', EMERGENCY, 0.01, DEFER),
+        ('diagnostics', DIAGNOSTICS, None, DROP),
+    ])
+    assert dropped == ['dropped']
+    assert granted == ['diagnostics', 'deferred']
+    stats = scheduler.stats()['emergency']
+    assert (stats['dropped'], stats['deferred']) == (1, 1)
+    with pytest.raises(RuntimeError):
+        scheduler.release()
+
+
+def slow_bus(sp, delay=0.01):
+    """
+    Make every transaction of `sp` take `delay` seconds and record the
+    instruction of each.
+    """
+    sent = []
+    started = threading.Event()
+    transact = sp.backend.transport.transact
+
+    def slow(packet, param_count=0):
+        sent.append(bytes(packet)[4])
+        started.set()
+        time.sleep(delay)
+        return transact(packet, param_count)
+
+    sp.backend.transport.transact = slow
+    return sent, started
+
+
+def test_emergency_write_does_not_wait_for_a_sweep():
+    servo_ids = list(range(1, 11))
+    with ServoProtocol(backend='emulator', servo_ids=servo_ids,
+                       lock=BusScheduler()) as sp:
+        sent, started = slow_bus(sp)
+        plan = sp.prepare_bulk_read({"blocks": [
+            {"servo_id": sid, "register": 'present_position'}
+            for sid in servo_ids]})
+
+        def sweep():
+            with sp.priority(TELEMETRY):
+                plan.run()
+
+        thread = threading.Thread(target=sweep)
+        thread.start()
+        started.wait(1.0)
+        with sp.priority(EMERGENCY):
+            sp.write_register(1, 'torque_enable', 0)
+        thread.join()
+
+        assert len(sent) == len(servo_ids) + 1
+        # the write went out after at most the read in progress
+        assert sent.index(INST_WRITE) <= 1
+        assert plan.values == [512] * len(servo_ids)
@@ -0,0 +1,44 @@
+from servode.servode import ServoProtocol
+
+
+def test_warm_start_detects_changed_eeprom(tmp_path):
+    path = str(tmp_path / 'bus.json')
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2], cache=True,
+                       shadow=True) as sp:
+        snapshot = sp.warm_start(path, [1, 2])
+        assert not snapshot.warm
+
+        reads = []
+        read = sp.backend.read
+
+        def counting_read(sid, address, length):
+            reads.append((sid, address, length))
+            return read(sid, address, length)
+
+        sp.backend.read = counting_read
+        snapshot = sp.warm_start(path, [1, 2])
+        assert snapshot.warm
+        # one READ_DATA over the EEPROM area per servo
+        assert [sid for sid, _, _ in reads] == [1, 2]
+        assert reads[0][1] == 0
+
+        sp.write_register(1, 'cw_angle_limit', 100)
+        snapshot = sp.warm_start(path, [1, 2])
+        assert not snapshot.warm
+        assert snapshot.reason == "servos:[1] differ"
+        assert sp.read_register(1, 'cw_angle_limit')['value'] == 100
+
+        snapshot = sp.warm_start(path, [1, 2])
+        assert snapshot.warm
+        assert snapshot.servos[1]['cw_angle_limit'] == 100
+
+
+def test_warm_start_refreshes_a_corrupt_file(tmp_path):
+    path = tmp_path / 'bus.json'
+    with ServoProtocol(backend='emulator', servo_ids=[1]) as sp:
+        sp.warm_start(str(path), [1])
+        path.write_text(path.read_text().replace('"ID": 1', '"ID": 5'))
+        snapshot = sp.warm_start(str(path), [1])
+        assert not snapshot.warm
+        assert 'hash' in snapshot.reason
+        assert snapshot.servos[1]['ID'] == 1
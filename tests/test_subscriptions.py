@@ -0,0 +1,64 @@
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from servode.servode import Servo, ServoProtocol
+from servode.subscriptions import FALLING, RISING, Subscription
+
+
+def values_of(*values):
+    return [{(1, 'present_load'): value} for value in values]
+
+
+def notified(subscription, *values):
+    """
+    :return: the (value, previous) of every change `subscription` finds in
+        consecutive samples of `values`
+    """
+    found = list()
+    for ts, sample in enumerate(values_of(*values)):
+        found.extend((change.value, change.previous)
+                     for change in subscription.evaluate(sample, ts))
+    return found
+
+
+def test_deadband_is_measured_from_the_value_notified():
+    sub = Subscription(None, [1], 'present_load', callback=print,
+                       deadband=20)
+    assert notified(sub, 100, 110, 119, 121, 125, 105) == [
+        (121, 100)]
+
+
+def test_threshold_edges():
+    rising = Subscription(None, [1], 'present_load', callback=print,
+                          threshold=70, edge=RISING)
+    assert notified(rising, 60, 80, 60, 90) == [(80, 60), (90, 60)]
+    falling = Subscription(None, [1], 'present_load', callback=print,
+                           threshold=70, edge=FALLING)
+    assert notified(falling, 60, 80, 60, 90) == [(60, 80)]
+
+
+def test_initial_value_is_notified():
+    sub = Subscription(None, [1], 'present_load', callback=print,
+                       initial=True)
+    assert notified(sub, 100, 100) == [(100, None)]
+
+
+def test_changes_on_the_bus_reach_the_queue():
+    with ServoProtocol(backend='emulator', servo_ids=[1]) as sp:
+        servo = Servo(sp, 1)
+        reg = sp.registers['present_temperature']
+        changes = queue.Queue()
+        sub = servo.subscribe('present_temperature', queue=changes,
+                              threshold=70, edge=RISING)
+        deadline = time.time() + 2.0
+        while sp.subscriptions.ticks == 0 and time.time() < deadline:
+            time.sleep(0.005)
+        sp.backend.bus.servos[1].memory[reg.address] = 80
+        change, = changes.get(timeout=2.0)
+        sub.cancel()
+        assert (change.servo_id, change.value, change.previous) == (1, 80, 32)
+        assert not sp.subscriptions.running
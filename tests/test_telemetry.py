@@ -0,0 +1,30 @@
+import time
+
+import pytest
+
+from servode.control import ControlLoop
+from servode.servode import Servo, ServoGroup, ServoProtocol
+from servode.telemetry import TelemetryPoller
+
+
+def poller(group):
+    return TelemetryPoller(group, ['present_position'], rate=0.2)
+
+
+def control_loop(group):
+    return ControlLoop(group, lambda sensed, now: None,
+                       sense=['present_position'], rate=0.2)
+
+
+@pytest.mark.parametrize('make_loop', [poller, control_loop])
+def test_stop_does_not_wait_for_the_period(make_loop):
+    with ServoProtocol(backend='emulator', servo_ids=[1]) as sp:
+        group = ServoGroup()
+        group['a'] = Servo(sp, 1)
+        loop = make_loop(group)
+        loop.start()
+        time.sleep(0.05)
+        start = time.time()
+        loop.stop()
+        assert time.time() - start < 1.0
+        assert not loop.running
@@ -0,0 +1,24 @@
+from servode.clock import VirtualClock
+from servode.servode import Servo, ServoGroup, ServoProtocol
+from servode.trajectory import LINEAR, Trajectory, TrajectoryStreamer
+
+
+def test_stream_restores_moving_speed():
+    clock = VirtualClock()
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2], motion=True,
+                       clock=clock) as sp:
+        group = ServoGroup()
+        group['a'] = Servo(sp, 1)
+        group['b'] = Servo(sp, 2)
+        group.write('torque_enable', 1)
+        group.write_values('moving_speed', [200, 0])
+
+        # the last frames hold still, at the lowest speed
+        trajectory = Trajectory([[512, 512], [600, 400], [600, 400]],
+                                durations=[0.5, 0.2], profile=LINEAR,
+                                rate=50)
+        assert list(trajectory.speeds[-1]) == [1, 1]
+        report = TrajectoryStreamer(group, trajectory).run()
+        assert report.errors == 0
+        assert group.read('moving_speed') == [200, 0]
+        assert group.read('goal_position') == [600, 400]
@@ -0,0 +1,153 @@
+import os
+import time
+import select
+import threading
+
+import pytest
+
+from servode.emulator import PtyBus, VirtualBus
+from servode.packet import (
+    BROADCAST_ID, COMM_RX_CORRUPT, COMM_RX_TIMEOUT, COMM_SUCCESS, PacketCodec,
+    parse_instruction
+)
+from servode.transport import SerialTransport
+
+STATUS_TEMPERATURE = b'\xff\xff\x01\x03\x00\x20\xdb'
+
+
+class Responder(object):
+    """
+    The device end of a pty pair: answers every instruction packet with
+    the bytes `reply` returns for it.
+    """
+
+    def __init__(self, reply):
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.reply = reply
+        self.received = list()
+        self._running = True
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        buf = bytearray()
+        while self._running:
+            if not select.select([self.master], [], [], 0.01)[0]:
+                continue
+            buf += os.read(self.master, 256)
+            inst = parse_instruction(bytes(buf))
+            if inst is None:
+                continue
+            packet = bytes(buf[:inst.end])
+            del buf[:inst.end]
+            self.received.append(packet)
+            reply = self.reply(packet)
+            if reply:
+                os.write(self.master, reply)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.fixture
+def link(request):
+    responders = list()
+    transports = list()
+
+    def connect(reply, **options):
+        responder = Responder(reply)
+        responders.append(responder)
+        transport = SerialTransport(responder.device, 1000000, **options)
+        transport.open()
+        transports.append(transport)
+        return responder, transport
+
+    yield connect
+    for transport in transports:
+        transport.close()
+    for responder in responders:
+        responder.close()
+
+
+def test_transact_round_trip(link):
+    responder, transport = link(lambda packet: STATUS_TEMPERATURE)
+    packet = PacketCodec().read_data(1, 0x2B, 1)
+    status = transport.transact(packet, 1)
+    assert status.comm_result == COMM_SUCCESS
+    assert status.servo_id == 1
+    assert status.value == 0x20
+    assert responder.received == [bytes(packet)]
+    assert transport.tx_bytes == 8
+    assert transport.rx_bytes == 7
+
+
+def test_transact_skips_noise_and_corrupt_packets(link):
+    corrupt = STATUS_TEMPERATURE[:-1] + b'\x00'
+    responder, transport = link(
+        lambda packet: b'\x00\xff\x13' + corrupt + STATUS_TEMPERATURE)
+    status = transport.transact(PacketCodec().read_data(1, 0x2B, 1), 1)
+    assert status.comm_result == COMM_SUCCESS
+    assert status.value == 0x20
+
+
+def test_transact_wrong_length_is_corrupt(link):
+    responder, transport = link(lambda packet: STATUS_TEMPERATURE)
+    status = transport.transact(PacketCodec().read_data(1, 0x2B, 2), 2)
+    assert status.comm_result == COMM_RX_CORRUPT
+
+
+def test_transact_keeps_error_bits_without_params(link):
+    # a range error answered with no parameters
+    responder, transport = link(lambda packet: b'\xff\xff\x01\x02\x08\xf4')
+    status = transport.transact(PacketCodec().read_data(1, 0x2B, 1), 1)
+    assert status.comm_result == COMM_SUCCESS
+    assert status.error == 8
+    assert not status.has_params
+
+
+def test_transact_times_out(link):
+    responder, transport = link(lambda packet: None, latency=0.02)
+    packet = PacketCodec().ping(1)
+    start = time.time()
+    status = transport.transact(packet, 0)
+    elapsed = time.time() - start
+    assert status.comm_result == COMM_RX_TIMEOUT
+    assert responder.received == [bytes(packet)]
+    assert 0.02 <= elapsed < 0.5
+
+
+def test_transact_truncated_status(link):
+    responder, transport = link(
+        lambda packet: STATUS_TEMPERATURE[:4], latency=0.02)
+    status = transport.transact(PacketCodec().read_data(1, 0x2B, 1), 1)
+    assert status.comm_result == COMM_RX_CORRUPT
+
+
+def test_broadcast_does_not_wait(link):
+    responder, transport = link(lambda packet: None, latency=1.0)
+    start = time.time()
+    status = transport.transact(
+        PacketCodec().write_value(BROADCAST_ID, 25, 1, 1))
+    assert status.comm_result == COMM_SUCCESS
+    assert time.time() - start < 0.5
+
+
+def test_virtual_bus_behind_a_pty():
+    with PtyBus(VirtualBus([1, 2]), realtime=False) as bus:
+        transport = SerialTransport(bus.device, 1000000)
+        transport.open()
+        try:
+            codec = PacketCodec()
+            status = transport.transact(codec.read_data(2, 0, 3), 3)
+            assert status.comm_result == COMM_SUCCESS
+            assert status.servo_id == 2
+            assert bytes(status.params) == b'\x0c\x00\x18'
+            assert transport.transact(codec.ping(3)).comm_result == \
+                COMM_RX_TIMEOUT
+        finally:
+            transport.close()
@@ -0,0 +1,29 @@
+import pytest
+
+from servode.clock import VirtualClock
+from servode.servode import ServoProtocol
+from servode.tune import baud_value, format_report, tune
+
+
+def test_baud_values():
+    assert baud_value(1000000) == 1
+    assert baud_value(57600) == 34
+    with pytest.raises(ValueError):
+        baud_value(300)
+
+
+def test_tune_lowers_return_delay_and_moves_the_bus():
+    with ServoProtocol(backend='emulator', servo_ids=[1, 2],
+                       clock=VirtualClock(), realtime=True) as sp:
+        report = tune(sp, [1, 2], return_delay=0, baud_rate=500000,
+                      iterations=3, checks=2)
+        assert report["return_delay"] == {
+            1: {"before": 250, "after": 0}, 2: {"before": 250, "after": 0}}
+        assert report["baud"]["migrated"]
+        assert sp.baud_rate == 500000
+        assert sp.read_register(1, 'return_delay', max_age=0)['value'] == 0
+        before, after = report["before"], report["after"]
+        assert (before["failed"], after["failed"]) == (0, 0)
+        # the 500 usec return delay is gone, the wire time doubled
+        assert after["p50"] < before["p50"] - 250e-6
+        assert len(format_report(report).splitlines()) == 4
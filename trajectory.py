@@ -0,0 +1,328 @@
+"""
+Precomputed multi-servo trajectories, streamed at a fixed rate.
+
+A `Trajectory` interpolates the goal position of every servo of a group
+between waypoints ahead of time, for every tick at the streaming rate, and
+derives the moving_speed that carries each servo to its next goal in one
+tick. A `TrajectoryStreamer` then sends one SYNC_WRITE of ``goal_position``
+and ``moving_speed`` per tick from a prepared plan, so no interpolation runs
+on the timing path, and puts back the moving_speed of every servo when the
+stream ends::
+
+    traj = Trajectory([[512, 512], [200, 800], [512, 512]],
+                      durations=[1.0, 0.5], profile=TRAPEZOID, rate=100)
+    report = TrajectoryStreamer(sg, traj).run()
+    print(report.missed, report.max_jitter)
+
+The interpolation is vectorised with numpy when it is installed and done
+element by element otherwise.
+"""
+import logging
+import threading
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .registers import SPEED_UNIT_RPM, UNITS_PER_RPM
+
+log = logging.getLogger('servode')
+
+LINEAR = 'linear'
+CUBIC = 'cubic'
+TRAPEZOID = 'trapezoid'
+DEFAULT_RATE = 100.0
+# the fraction of a trapezoid segment spent accelerating, and decelerating
+ACCEL_FRACTION = 0.25
+
+# the position units per second of one moving_speed unit
+SPEED_UNIT = SPEED_UNIT_RPM * UNITS_PER_RPM
+MAX_SPEED = 1023
+
+StreamReport = collections.namedtuple(
+    'StreamReport',
+    ['ticks', 'missed', 'errors', 'elapsed', 'mean_jitter', 'max_jitter'])
+StreamReport.__doc__ = """
+The timing of a streamed trajectory. `missed` counts the ticks skipped to
+catch up after falling a whole period behind, the jitter is how late each
+tick was sent after its scheduled time, in seconds.
+"""
+
+
+def _where(condition, a, b):
+    if numpy is not None:
+        return numpy.where(condition, a, b)
+    return a if condition else b
+
+
+def _linear(s, accel):
+    return s
+
+
+def _cubic(s, accel):
+    # ease in and out, with zero velocity at both waypoints
+    return s * s * (3.0 - 2.0 * s)
+
+
+def _trapezoid(s, accel):
+    # constant acceleration, cruise, constant deceleration
+    peak = 1.0 / (1.0 - accel)
+    rest = 1.0 - s
+    return _where(
+        s < accel, peak * s * s / (2.0 * accel),
+        _where(s > 1.0 - accel, 1.0 - peak * rest * rest / (2.0 * accel),
+               peak * (s - accel / 2.0)))
+
+
+PROFILES = {
+    LINEAR: _linear,
+    CUBIC: _cubic,
+    TRAPEZOID: _trapezoid,
+}
+
+
+class Trajectory(object):
+    """
+    The goal positions and speeds of a group of servos for every tick of a
+    move through a list of waypoints. `positions` and `speeds` are arrays of
+    one row per tick and one column per servo, numpy arrays when numpy is
+    installed and lists of lists otherwise.
+    """
+
+    def __init__(self, waypoints, durations, profile=CUBIC,
+                 rate=DEFAULT_RATE, accel=ACCEL_FRACTION):
+        """
+
+        :param waypoints: a list of goal positions in servo order, the first
+            being where the servos start from
+        :param durations: the seconds each move between two waypoints takes
+        :param profile: LINEAR, CUBIC or TRAPEZOID
+        :param rate: ticks per second
+        :param accel: the fraction of each TRAPEZOID move spent accelerating
+        """
+        super(Trajectory, self).__init__()
+        if profile not in PROFILES:
+            raise ValueError("profile:{0!r} not one of {1}".format(
+                profile, sorted(PROFILES)))
+        if len(waypoints) < 2:
+            raise ValueError("a trajectory needs at least two waypoints")
+        if len(durations) != len(waypoints) - 1:
+            raise ValueError("{0} durations for {1} waypoints".format(
+                len(durations), len(waypoints)))
+        if not 0 < accel <= 0.5:
+            raise ValueError("accel:{0} must be in (0, 0.5]".format(accel))
+        servos = len(waypoints[0])
+        for waypoint in waypoints:
+            if len(waypoint) != servos:
+                raise ValueError(
+                    "waypoints must all have {0} positions".format(servos))
+        self.waypoints = [list(waypoint) for waypoint in waypoints]
+        self.durations = list(durations)
+        self.profile = profile
+        self.rate = float(rate)
+        self.period = 1.0 / rate
+        self.accel = accel
+        self.servos = servos
+
+        if numpy is not None:
+            self._interpolate_numpy()
+        else:
+            self._interpolate()
+        log.debug("[Trajectory] profile:{0} servos:{1} ticks:{2}".format(
+            profile, servos, len(self)))
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        return len(self) * self.period
+
+    def _steps(self, duration):
+        return max(1, int(round(duration * self.rate)))
+
+    def _interpolate_numpy(self):
+        shape = PROFILES[self.profile]
+        points = numpy.asarray(self.waypoints, dtype=float)
+        segments = list()
+        for k, duration in enumerate(self.durations):
+            steps = self._steps(duration)
+            s = numpy.arange(1, steps + 1, dtype=float) / steps
+            f = shape(s, self.accel)
+            segments.append(
+                points[k] + numpy.outer(f, points[k + 1] - points[k]))
+        positions = numpy.rint(numpy.vstack(segments)).astype(int)
+        previous = numpy.vstack([points[:1], positions[:-1]])
+        speeds = numpy.rint(
+            numpy.abs(positions - previous) * self.rate / SPEED_UNIT)
+        self.positions = positions
+        self.speeds = numpy.clip(speeds, 1, MAX_SPEED).astype(int)
+        self.frames = [
+            list(zip(p, s)) for p, s in
+            zip(self.positions.tolist(), self.speeds.tolist())]
+
+    def _interpolate(self):
+        shape = PROFILES[self.profile]
+        positions = list()
+        speeds = list()
+        previous = [int(round(p)) for p in self.waypoints[0]]
+        for k, duration in enumerate(self.durations):
+            steps = self._steps(duration)
+            start, end = self.waypoints[k], self.waypoints[k + 1]
+            for i in range(1, steps + 1):
+                f = shape(float(i) / steps, self.accel)
+                row = [int(round(a + (b - a) * f)) for a, b in zip(start, end)]
+                speeds.append([
+                    min(max(int(round(abs(p - q) * self.rate / SPEED_UNIT)),
+                            1), MAX_SPEED)
+                    for p, q in zip(row, previous)])
+                positions.append(row)
+                previous = row
+        self.positions = positions
+        self.speeds = speeds
+        self.frames = [
+            list(zip(p, s)) for p, s in zip(positions, speeds)]
+
+
+class TrajectoryStreamer(object):
+    """
+    Sends a Trajectory to a ServoGroup, one SYNC_WRITE per tick. Ticks are
+    scheduled against the clock from the start of the stream; when the
+    stream falls a whole period behind, the stale frames are skipped and
+    counted as missed so the servos stay on the trajectory's timeline.
+    """
+
+    def __init__(self, group, trajectory, clock=None, restore_speed=True):
+        """
+
+        :param group: the ServoGroup to move, on a single bus, its first
+            `trajectory.servos` servos in order
+        :param trajectory: the Trajectory to stream
+        :param clock: the clock ticks are timed with, the ServoProtocol's
+            clock by default
+        :param restore_speed: read the moving_speed of every servo before
+            the stream and write it back after, instead of leaving the
+            servos at the speed of the last frame
+        """
+        super(TrajectoryStreamer, self).__init__()
+        if trajectory.servos > len(group):
+            raise ValueError(
+                "trajectory of {0} servos for a group of {1}".format(
+                    trajectory.servos, len(group)))
+        self.sp = group._single_bus('TrajectoryStreamer')
+        self.clock = clock or self.sp.clock
+        self.trajectory = trajectory
+        self.servo_ids = group.servo_ids[:trajectory.servos]
+        self._plan = self.sp.prepare_sync_write(
+            ['goal_position', 'moving_speed'], self.servo_ids)
+        self._speeds = None
+        if restore_speed:
+            self._speeds = self.sp.prepare_bulk_read({"blocks": [
+                {"servo_id": sid, "register": 'moving_speed'}
+                for sid in self.servo_ids]})
+        self.jitter = list()
+        self.missed = 0
+        self.errors = 0
+        self.report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def run(self):
+        """
+        Stream the trajectory on the calling thread.
+
+        :return: a StreamReport
+        """
+        clock = self.clock
+        period = self.trajectory.period
+        frames = self.trajectory.frames
+        last = len(frames) - 1
+        plan = self._plan
+        jitter = self.jitter
+        del jitter[:]
+        self.missed = 0
+        self.errors = 0
+        if self._thread is None:
+            self._stop.clear()
+        speeds = None
+        if self._speeds is not None:
+            speeds = self._speeds.run()
+
+        start = clock.monotonic()
+        i = 0
+        try:
+            while i <= last and not self._stop.is_set():
+                late = clock.monotonic() - (start + i * period)
+                if late >= period and i < last:
+                    skip = min(int(late / period), last - i)
+                    self.missed += skip
+                    i += skip
+                    late -= skip * period
+                jitter.append(late)
+                if not plan.run(frames[i], force=True):
+                    self.errors += 1
+                i += 1
+                delay = start + i * period - clock.monotonic()
+                if delay > 0:
+                    clock.wait(self._stop, delay)
+        finally:
+            if speeds is not None:
+                self._restore(speeds)
+
+        elapsed = clock.monotonic() - start
+        self.report = StreamReport(
+            len(jitter), self.missed, self.errors, elapsed,
+            sum(jitter) / len(jitter) if jitter else 0.0,
+            max(jitter) if jitter else 0.0)
+        log.debug("[TrajectoryStreamer.run] {0}".format(self.report))
+        return self.report
+
+    def _restore(self, speeds):
+        restore = dict(
+            (sid, speed) for sid, speed in zip(self.servo_ids, speeds)
+            if speed is not None)
+        if len(restore) < len(self.servo_ids):
+            log.warning("[TrajectoryStreamer] moving_speed not restored on "
+                        "servo_ids:{0}".format(
+                            [sid for sid in self.servo_ids
+                             if sid not in restore]))
+        if restore and not self.sp.sync_write(
+                'moving_speed', restore, force=True):
+            self.errors += 1
+
+    def start(self):
+        """
+        Stream the trajectory on a background thread.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name='TrajectoryStreamer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        :return: the StreamReport, None if the stream has not ended
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.report
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
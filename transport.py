@@ -0,0 +1,332 @@
+"""
+Low-latency serial transport for Dynamixel buses on Linux/POSIX ttys.
+
+The tty is put into raw mode with VMIN=0/VTIME=0 so that reads never block
+in the kernel; instead every read waits on ``poll``/``select`` with a
+timeout derived from the baud rate and the number of bytes on the wire.
+Status packets are read straight into a preallocated buffer and parsed in
+place by the packet codec.
+"""
+import io
+import os
+import time
+import array
+import errno
+import fcntl
+import select
+import termios
+import logging
+
+from .packet import (
+    BROADCAST_ID, COMM_RX_CORRUPT, COMM_RX_TIMEOUT, COMM_SUCCESS,
+    COMM_TX_FAIL, MAX_PACKET_LEN, PACKET_OVERHEAD, checksum, comm_status,
+    find_header, parse_status, status_length
+)
+
+log = logging.getLogger('servode')
+
+# bits on the wire for every byte: start + 8 data + stop
+BITS_PER_BYTE = 10
+# default return delay of an AX-12, 250 * 2 usec
+DEFAULT_RETURN_DELAY = 0.0005
+# allowance for the USB-serial adapter and the host scheduler
+DEFAULT_LATENCY = 0.002
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# from linux/serial.h
+ASYNC_LOW_LATENCY = 1 << 13
+_SERIAL_FLAGS_INDEX = 4
+
+
+def byte_time(baud_rate):
+    """
+    :return: the time in seconds to transmit one byte at `baud_rate`
+    """
+    return float(BITS_PER_BYTE) / baud_rate
+
+
+def baud_constant(baud_rate):
+    """
+    :return: the termios speed constant for `baud_rate`
+    """
+    name = 'B{0}'.format(baud_rate)
+    if not hasattr(termios, name):
+        raise ValueError("Unsupported baud_rate:{0}".format(baud_rate))
+    return getattr(termios, name)
+
+
+def set_low_latency(fd):
+    """
+    Set ASYNC_LOW_LATENCY on a serial driver, which on FTDI adapters drops
+    the USB latency timer to 1ms. Best effort; ptys and some drivers do not
+    support TIOCGSERIAL.
+
+    :return: True if the flag was set
+    """
+    get_serial = getattr(termios, 'TIOCGSERIAL', 0x541E)
+    set_serial = getattr(termios, 'TIOCSSERIAL', 0x541F)
+    buf = array.array('i', [0] * 32)
+    try:
+        fcntl.ioctl(fd, get_serial, buf)
+        buf[_SERIAL_FLAGS_INDEX] |= ASYNC_LOW_LATENCY
+        fcntl.ioctl(fd, set_serial, buf)
+    except (IOError, OSError) as e:
+        log.debug("[set_low_latency] not supported:{0}".format(e))
+        return False
+    return True
+
+
+class SerialTransport(object):
+    """
+    A half-duplex Dynamixel bus on a tty.
+    """
+
+    def __init__(self, device, baud_rate, return_delay=DEFAULT_RETURN_DELAY,
+                 latency=DEFAULT_LATENCY, low_latency=True):
+        """
+
+        :param device: the path of the tty, e.g. '/dev/ttyUSB0'
+        :param baud_rate: the bus baud rate
+        :param return_delay: the longest return delay, in seconds, of any
+            servo on the bus
+        :param latency: fixed allowance, in seconds, added to every timeout
+            for the adapter and host scheduling
+        :param low_latency: request ASYNC_LOW_LATENCY from the driver
+        """
+        super(SerialTransport, self).__init__()
+        if isinstance(device, bytes):
+            device = device.decode('utf-8')
+        self.device = device
+        self.baud_rate = baud_rate
+        self.return_delay = return_delay
+        self.latency = latency
+        self.low_latency = low_latency
+        # a fixed status timeout in seconds, overriding timeout_for
+        self.timeout = None
+        self.fd = None
+        self.rx = bytearray(MAX_PACKET_LEN * 2)
+        self._rx_view = memoryview(self.rx)
+        self._file = None
+        self._poll = None
+        self._byte_time = byte_time(baud_rate)
+        # bytes moved on the bus, for measuring bus utilisation
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+
+    def open(self):
+        if self.fd is not None:
+            return True
+        fd = os.open(self.device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._configure(fd, self.baud_rate)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+        self._file = io.FileIO(fd, 'r+b', closefd=False)
+        if hasattr(select, 'poll'):
+            self._poll = select.poll()
+            self._poll.register(fd, select.POLLIN)
+        if self.low_latency:
+            set_low_latency(fd)
+        log.debug("[SerialTransport.open] device:{0} baud_rate:{1}".format(
+            self.device, self.baud_rate))
+        return True
+
+    def close(self):
+        if self.fd is None:
+            return
+        if self._poll is not None:
+            self._poll.unregister(self.fd)
+            self._poll = None
+        self._file = None
+        os.close(self.fd)
+        self.fd = None
+
+    def fileno(self):
+        return self.fd
+
+    def _configure(self, fd, baud_rate):
+        speed = baud_constant(baud_rate)
+        attrs = termios.tcgetattr(fd)
+        attrs[0] = 0  # iflag
+        attrs[1] = 0  # oflag
+        attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL  # cflag
+        attrs[3] = 0  # lflag
+        attrs[4] = speed
+        attrs[5] = speed
+        attrs[6][termios.VMIN] = 0
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+    def set_baud_rate(self, baud_rate):
+        if self.fd is not None:
+            self._configure(self.fd, baud_rate)
+        self.baud_rate = baud_rate
+        self._byte_time = byte_time(baud_rate)
+        return True
+
+    def timeout_for(self, tx_len, rx_len):
+        """
+        :return: the time in seconds to wait for a status packet of
+            `rx_len` bytes after sending `tx_len` bytes
+        """
+        if self.timeout is not None:
+            return self.timeout
+        return ((tx_len + rx_len) * self._byte_time +
+                self.return_delay + self.latency)
+
+    def flush_input(self):
+        if self.fd is not None:
+            termios.tcflush(self.fd, termios.TCIFLUSH)
+
+    def write(self, packet):
+        """
+        Write an encoded packet. Stale input is discarded first so that a
+        late reply to an earlier packet cannot be taken for the next one.
+
+        :return: a comm result
+        """
+        self.flush_input()
+        view = memoryview(packet)
+        total = len(view)
+        sent = 0
+        while sent < total:
+            try:
+                sent += os.write(self.fd, view[sent:])
+            except (IOError, OSError) as e:
+                if e.errno != errno.EAGAIN:
+                    log.error("[SerialTransport.write] error:{0}".format(e))
+                    return COMM_TX_FAIL
+                timeout = self.timeout_for(total - sent, 0)
+                if not select.select([], [self.fd], [], timeout)[1]:
+                    return COMM_TX_FAIL
+        return COMM_SUCCESS
+
+    def _wait(self, timeout):
+        if timeout <= 0:
+            return False
+        if self._poll is not None:
+            return len(self._poll.poll(timeout * 1000.0)) > 0
+        return len(select.select([self.fd], [], [], timeout)[0]) > 0
+
+    def _read_some(self, start, timeout):
+        """
+        Wait up to `timeout` seconds and read whatever is available into the
+        receive buffer at `start`.
+
+        :return: the number of bytes read, 0 on timeout
+        """
+        if not self._wait(timeout):
+            return 0
+        return self.read_available(start)
+
+    def read_available(self, start):
+        """
+        Read whatever is available, without waiting, into the receive buffer
+        at `start`.
+
+        :return: the number of bytes read
+        """
+        return self._file.readinto(self._rx_view[start:]) or 0
+
+    def scan(self, have, expected):
+        """
+        Look for a status packet in the first `have` bytes of the receive
+        buffer. Bytes before the 0xFF 0xFF header and packets that fail their
+        checksum are dropped.
+
+        :param have: the number of bytes in the receive buffer
+        :param expected: the expected length of the status packet
+        :return: (status, have, want) where status is a `Status` once a
+            packet is complete and None while more bytes are needed, have is
+            the number of bytes left in the buffer and want the number of
+            bytes needed to complete the packet
+        """
+        rx = self.rx
+        while True:
+            start = find_header(rx, 0, have)
+            if start > 0 or (start < 0 and have > 1):
+                # drop noise ahead of the header, keeping a trailing 0xFF
+                # that may be the first half of the next header
+                keep = start if start > 0 else have - (rx[have - 1] == 0xFF)
+                rx[0:have - keep] = rx[keep:have]
+                have -= keep
+                continue
+
+            if start == 0 and have >= 4:
+                pkt_len = rx[3] + 4
+                if pkt_len < PACKET_OVERHEAD or pkt_len > MAX_PACKET_LEN:
+                    rx[0:have - 1] = rx[1:have]
+                    have -= 1
+                    continue
+                if have >= pkt_len:
+                    chk_pos = pkt_len - 1
+                    if checksum(rx, 2, chk_pos) != rx[chk_pos]:
+                        log.debug("[read_status] checksum mismatch, resync")
+                        rx[0:have - 1] = rx[1:have]
+                        have -= 1
+                        continue
+                    status = parse_status(rx, pkt_len)
+                    if pkt_len != expected and not (
+                            status.error and pkt_len == PACKET_OVERHEAD):
+                        # a servo in error may answer without parameters,
+                        # keep its error bits
+                        status = comm_status(COMM_RX_CORRUPT, status.servo_id)
+                    return status, have, pkt_len
+                return None, have, pkt_len
+            return None, have, expected
+
+    def read_status(self, param_count, timeout):
+        """
+        Read one status packet with `param_count` parameters. Bytes before
+        the 0xFF 0xFF header and packets that fail their checksum are
+        dropped, and reading continues with the next header.
+
+        :param param_count: the expected number of parameters
+        :param timeout: the total time in seconds to wait
+        :return: a `Status`
+        """
+        deadline = _clock() + timeout
+        expected = status_length(param_count)
+        have = 0
+        while True:
+            status, have, want = self.scan(have, expected)
+            if status is not None:
+                return status
+
+            remaining = deadline - _clock()
+            if remaining <= 0:
+                break
+            n = self._read_some(
+                have, max(remaining, (want - have) * self._byte_time))
+            if n == 0:
+                break
+            have += n
+
+        if have == 0:
+            return comm_status(COMM_RX_TIMEOUT)
+        return comm_status(COMM_RX_CORRUPT)
+
+    def transact(self, packet, param_count=0):
+        """
+        Send an instruction packet and, unless it is broadcast, read the
+        status packet that answers it.
+
+        :param packet: the encoded instruction packet
+        :param param_count: the expected number of status parameters
+        :return: a `Status`
+        """
+        result = self.write(packet)
+        if result != COMM_SUCCESS:
+            return comm_status(result)
+        self.tx_bytes += len(packet)
+        if packet[2] == BROADCAST_ID:
+            return comm_status(COMM_SUCCESS, BROADCAST_ID)
+        status = self.read_status(
+            param_count,
+            self.timeout_for(len(packet), status_length(param_count)))
+        if status.params is not None:
+            self.rx_bytes += status_length(len(status.params))
+        return status
@@ -0,0 +1,252 @@
+"""
+Bus latency tuning: return_delay and baud rate.
+
+Small transactions on an AX-12 bus are dominated by the servos' return
+delay, 500 usec out of the box, and by the baud rate. `tune` measures the
+round trip to every servo, lowers return_delay on every servo that still
+answers reliably at the lower value, optionally moves the whole bus to a new
+baud rate, and measures again::
+
+    with ServoProtocol(baud_rate=57600) as sp:
+        report = tune(sp, range(1, 19), return_delay=0, baud_rate=1000000)
+    print(format_report(report))
+
+Every change is verified with a run of round trips to each servo. A servo
+that fails keeps its previous return_delay, and a baud migration that loses
+any servo is rolled back on every servo to the previous rate. Results are
+plain dicts, like those of `bench`.
+"""
+import logging
+import collections
+
+from .bench import percentile
+from .packet import COMM_SUCCESS
+
+log = logging.getLogger('servode')
+
+DEFAULT_ITERATIONS = 20
+# round trips that must all succeed for a servo to pass verification
+DEFAULT_CHECKS = 10
+# the clock error a servo tolerates between its rate and the host's
+BAUD_TOLERANCE = 0.03
+
+
+def baud_value(baud_rate):
+    """
+    :return: the `baud_rate` register value selecting `baud_rate`
+    :raise ValueError: when no register value is within tolerance
+    """
+    value = int(round(2000000.0 / baud_rate - 1))
+    if not 0 <= value <= 254:
+        raise ValueError("baud_rate:{0} out of range".format(baud_rate))
+    actual = 2000000.0 / (value + 1)
+    if abs(actual - baud_rate) > BAUD_TOLERANCE * baud_rate:
+        raise ValueError(
+            "baud_rate:{0} not available, nearest is {1:.0f}".format(
+                baud_rate, actual))
+    return value
+
+
+def _round_trip(sp, sid, address):
+    """
+    :return: the seconds of one 1 byte READ_DATA round trip, None when the
+        servo did not answer
+    """
+    clock = sp.clock
+    with sp.lock:
+        start = clock.monotonic()
+        status = sp.backend.read(sid, address, 1)
+        elapsed = clock.monotonic() - start
+    if status.comm_result != COMM_SUCCESS:
+        return None
+    return elapsed
+
+
+def _verify(sp, sid, checks=DEFAULT_CHECKS):
+    address = sp.registers['ID'].address
+    for _ in range(checks):
+        if _round_trip(sp, sid, address) is None:
+            return False
+    return True
+
+
+def measure_latency(sp, servo_ids, iterations=DEFAULT_ITERATIONS):
+    """
+    Time 1 byte reads from every servo.
+
+    :return: a dict with the p50 and max round trip in seconds over all
+        servos, the count of failed round trips, and the same per servo
+    """
+    address = sp.registers['ID'].address
+    servos = collections.OrderedDict()
+    every = list()
+    failed = 0
+    for sid in servo_ids:
+        times = list()
+        for _ in range(iterations):
+            elapsed = _round_trip(sp, sid, address)
+            if elapsed is None:
+                failed += 1
+            else:
+                times.append(elapsed)
+        every.extend(times)
+        servos[sid] = collections.OrderedDict([
+            ("p50", percentile(sorted(times), 0.50)),
+            ("max", max(times) if times else None),
+            ("failed", iterations - len(times)),
+        ])
+    return collections.OrderedDict([
+        ("baud_rate", sp.baud_rate),
+        ("p50", percentile(sorted(every), 0.50)),
+        ("max", max(every) if every else None),
+        ("failed", failed),
+        ("servos", servos),
+    ])
+
+
+def tune_return_delay(sp, servo_ids, return_delay=0, checks=DEFAULT_CHECKS):
+    """
+    Lower return_delay on every servo with one SYNC_WRITE and verify each
+    servo at the new value, restoring the previous value of those that fail.
+
+    :param return_delay: the register value to set, in units of 2 usec
+    :return: a dict of servo id to {"before", "after"} register values
+    """
+    before = collections.OrderedDict()
+    for sid in servo_ids:
+        result = sp.read_register(sid, 'return_delay', max_age=0)
+        if result.get('value') == '':
+            raise IOError("[tune_return_delay] servo:{0} did not "
+                          "answer".format(sid))
+        before[sid] = result['value']
+    lower = [sid for sid, value in before.items() if value > return_delay]
+    if lower:
+        sp.sync_write('return_delay', return_delay, lower, force=True)
+
+    report = collections.OrderedDict()
+    for sid, value in before.items():
+        after = value
+        if sid in lower:
+            if _verify(sp, sid, checks):
+                after = return_delay
+            else:
+                log.warning("[tune_return_delay] servo:{0} failed at "
+                            "return_delay:{1}, restoring {2}".format(
+                                sid, return_delay, value))
+                sp.write_register(sid, 'return_delay', value, force=True)
+        report[sid] = collections.OrderedDict(
+            [("before", value), ("after", after)])
+    return report
+
+
+def _set_host_rate(sp, baud_rate):
+    if not sp.backend.set_baud_rate(baud_rate):
+        raise IOError("[migrate_baud] failed to set the host to "
+                      "baud_rate:{0}".format(baud_rate))
+    sp.baud_rate = baud_rate
+
+
+def migrate_baud(sp, servo_ids, baud_rate, checks=DEFAULT_CHECKS):
+    """
+    Move every servo and the host to `baud_rate`, and verify every servo
+    answers at it. If any does not, the servos that moved are written back to
+    their previous baud_rate value and the host returns to its previous rate.
+
+    :return: a dict of the rates, whether the migration was kept, the servos
+        that failed verification and those lost after a rollback
+    """
+    value = baud_value(baud_rate)
+    previous_rate = sp.baud_rate
+    previous = collections.OrderedDict()
+    for sid in servo_ids:
+        if not _verify(sp, sid, 1):
+            raise IOError("[migrate_baud] servo:{0} did not answer at "
+                          "baud_rate:{1}".format(sid, previous_rate))
+        previous[sid] = sp.read_register(sid, 'baud_rate', max_age=0)['value']
+
+    report = collections.OrderedDict([
+        ("from", previous_rate),
+        ("to", baud_rate),
+        ("migrated", False),
+        ("failed", list()),
+        ("lost", list()),
+    ])
+    # no status packets answer a SYNC_WRITE, so no reply is lost to the
+    # servos switching rate mid transaction
+    sp.sync_write('baud_rate', value, list(previous), force=True)
+    _set_host_rate(sp, baud_rate)
+    for sid in previous:
+        sp.invalidate(sid)
+    failed = [sid for sid in previous if not _verify(sp, sid, checks)]
+    if not failed:
+        report["migrated"] = True
+        log.info("[migrate_baud] {0} servos moved to baud_rate:{1}".format(
+            len(previous), baud_rate))
+        return report
+
+    log.warning("[migrate_baud] servos:{0} failed at baud_rate:{1}, "
+                "rolling back".format(failed, baud_rate))
+    report["failed"] = failed
+    moved = [sid for sid in previous if sid not in failed]
+    for sid in moved:
+        sp.write_register(sid, 'baud_rate', previous[sid], force=True)
+    _set_host_rate(sp, previous_rate)
+    for sid in previous:
+        sp.invalidate(sid)
+    report["lost"] = [sid for sid in previous if not _verify(sp, sid, checks)]
+    if report["lost"]:
+        log.error("[migrate_baud] servos:{0} lost after rollback".format(
+            report["lost"]))
+    return report
+
+
+def tune(sp, servo_ids, return_delay=0, baud_rate=None,
+         iterations=DEFAULT_ITERATIONS, checks=DEFAULT_CHECKS):
+    """
+    Measure, lower return_delay, migrate to `baud_rate` when given, and
+    measure again.
+
+    :return: a dict of the "before" and "after" latency, and the
+        "return_delay" and "baud" reports
+    """
+    servo_ids = list(servo_ids)
+    report = collections.OrderedDict()
+    report["before"] = measure_latency(sp, servo_ids, iterations)
+    if return_delay is not None:
+        report["return_delay"] = tune_return_delay(
+            sp, servo_ids, return_delay, checks)
+    if baud_rate is not None and baud_rate != sp.baud_rate:
+        report["baud"] = migrate_baud(sp, servo_ids, baud_rate, checks)
+    report["after"] = measure_latency(sp, servo_ids, iterations)
+    return report
+
+
+def _usec(seconds):
+    if seconds is None:
+        return '-'
+    return '{0:.1f}'.format(seconds * 1e6)
+
+
+def format_report(report):
+    """
+    :return: the report of `tune` as a table of per servo latency in usec
+    """
+    before, after = report["before"], report["after"]
+    delays = report.get("return_delay", dict())
+    lines = ['{0:>5} {1:>12} {2:>12} {3:>12}'.format(
+        'id', 'return_delay', 'p50 before', 'p50 after')]
+    for sid, stats in before["servos"].items():
+        delay = delays.get(sid)
+        delay = '-' if delay is None else '{0} -> {1}'.format(
+            delay["before"], delay["after"])
+        lines.append('{0:>5} {1:>12} {2:>12} {3:>12}'.format(
+            sid, delay, _usec(stats["p50"]),
+            _usec(after["servos"][sid]["p50"])))
+    lines.append('baud_rate {0} -> {1}, p50 {2} -> {3} usec'.format(
+        before["baud_rate"], after["baud_rate"], _usec(before["p50"]),
+        _usec(after["p50"])))
+    baud = report.get("baud")
+    if baud is not None and not baud["migrated"]:
+        lines.append('baud migration rolled back, failed:{0} lost:{1}'.format(
+            baud["failed"], baud["lost"]))
+    return '\n'.join(lines)